@@ -0,0 +1,126 @@
+# Replay a peak-hour alert stream (flapping online/offline devices, repeated
+# geofence crossings) through the AlertCoalescer with a simulated clock and
+# report how many sendText calls, digest lines and per-recipient pacing each
+# digest window saves compared with one message per alert, and how long the
+# first alert of each message waited (a recipient's first alert is sent at
+# once, only follow-ups wait for the window).
+#
+# Usage: python -m dev.bench_alert_digest [--alerts 20000] [--users 300] [--minutes 60]
+
+import argparse
+import random
+import statistics
+from collections import Counter
+from typing import List
+
+from src.orin_wa_report.core.api.alert_render import (
+    AlertCoalescer,
+    AlertRecord,
+    NotificationTemplates,
+    render_digest_messages,
+)
+
+NOTIFICATION_SETTING = {
+    "prompt_default": "Notifikasi ORIN! Kendaraan anda ({device_name}) {message}",
+    "prompt_digest": "Notifikasi ORIN! {count} peringatan baru untuk kendaraan anda:",
+    "prompt_digest_item": "- ({device_name}) {message}",
+}
+FLAPPING = ["notif_online", "notif_offline", "notif_geofence_inside", "notif_geofence_outside"]
+# Seconds between two sends to the same chat (SendScheduler recipient_rate=1)
+RECIPIENT_INTERVAL = 1.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_stream(alerts: int, users: int, seconds: float) -> List[tuple]:
+    """(timestamp, record) pairs, 80% of alerts from 10% of flapping devices."""
+    stream = []
+    for alert_id in range(1, alerts + 1):
+        if random.random() < 0.8:
+            user_id = random.randrange(max(1, users // 10))
+            device_id = user_id * 10 + random.randrange(2)
+            alert_type = random.choice(FLAPPING)
+        else:
+            user_id = random.randrange(users)
+            device_id = user_id * 10 + random.randrange(10)
+            alert_type = "notif_speed_alert"
+        record = AlertRecord(
+            id=alert_id,
+            user_id=user_id,
+            alert_type=alert_type,
+            device_name=f"Truk {device_id}",
+            message=alert_type.replace("notif_", "").replace("_", " "),
+            wa_number=f"62812{user_id:07d}",
+            wa_lid=f"1281{user_id:010d}",
+            device_id=device_id,
+        )
+        stream.append((random.uniform(0, seconds), record))
+    stream.sort(key=lambda item: item[0])
+    return stream
+
+
+def replay(stream, window: float, dedupe: bool, templates: NotificationTemplates):
+    clock = FakeClock()
+    coalescer = AlertCoalescer(window_seconds=window, dedupe=dedupe, clock=clock)
+    messages = []
+    covered = 0
+    arrived, delays = {}, []
+    # the dispatch loop hands over one batch per second
+    batch, tick = [], 1.0
+    for ts, record in stream + [(stream[-1][0] + window + 2, None)]:
+        while ts >= tick:
+            clock.now = tick
+            coalescer.add(batch)
+            groups = coalescer.flush_due()
+            delays += [tick - arrived[min(group.ids)] for group in groups]
+            covered += sum(len(group.ids) for group in groups)
+            messages += render_digest_messages(groups, templates)
+            batch, tick = [], tick + 1.0
+        if record is not None:
+            batch.append(record)
+            arrived[record.id] = ts
+    assert covered == len(stream) and len(coalescer) == 0, (covered, len(coalescer))
+
+    # worst case per-recipient pacing: the busiest chat's queue at 1 msg/s
+    per_recipient = Counter(message["to"] for message in messages)
+    lines = sum(message["message"].count("\n") + 1 for message in messages)
+    delays.sort()
+    return (
+        len(messages), lines, per_recipient.most_common(1)[0][1] * RECIPIENT_INTERVAL,
+        statistics.median(delays), delays[int(len(delays) * 0.99)],
+    )
+
+
+def main(alerts: int, users: int, minutes: float):
+    random.seed(7)
+    templates = NotificationTemplates(NOTIFICATION_SETTING)
+    stream = make_stream(alerts, users, minutes * 60)
+
+    baseline, baseline_lines, baseline_pacing, p50, p99 = replay(stream, 0, False, templates)
+    assert baseline == alerts
+    print(f"alerts={alerts} users={users} over {minutes:.0f} min, first-alert delay includes the 1 s dispatch tick")
+    print(f"{'window':>8} {'dedupe':>7} {'sendText':>9} {'reduction':>10} {'lines':>7} {'busiest chat pacing':>20} "
+          f"{'first-alert delay p50/p99':>26}")
+    print(f"{0:>8} {'-':>7} {baseline:>9} {'1.0x':>10} {baseline_lines:>7} {baseline_pacing:>19.0f}s {p50:>19.1f}s/{p99:.1f}s")
+    for window in (10, 30, 60):
+        for dedupe in (False, True):
+            sent, lines, pacing, p50, p99 = replay(stream, window, dedupe, templates)
+            print(
+                f"{window:>8} {str(dedupe):>7} {sent:>9} {baseline / sent:>9.1f}x {lines:>7} {pacing:>19.0f}s "
+                f"{p50:>19.1f}s/{p99:.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--minutes", type=float, default=60)
+    args = parser.parse_args()
+    main(args.alerts, args.users, args.minutes)
@@ -0,0 +1,237 @@
+# Benchmark end-to-end alert latency (alert row created -> batch handed to the
+# dispatch pipeline) for every alert source against a local fake DB gateway.
+# Checks that an idle poller backed off to max_interval still returns by the
+# caller's timeout (a digest falling due), and that the push source refuses
+# rows beyond max_pending instead of making the ingest request wait. Pushed
+# rows go through the inbox of a temporary AlertOutboxDB, and a new source
+# on the same inbox picks up rows accepted but not yet dispatched.
+#
+# Usage: python -m dev.bench_alert_latency [--seconds 30] [--rate 50] [--burst 3000]
+
+import argparse
+import asyncio
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+from src.orin_wa_report.core import db
+from src.orin_wa_report.core.api.alert_source import (
+    AlertSource,
+    PollingAlertSource,
+    PushAlertSource,
+)
+from src.orin_wa_report.core.db import AlertOutboxDB
+
+HOST = "127.0.0.1"
+PORT = 18085
+GATEWAY_URL = f"http://{HOST}:{PORT}/mysql/devsites_orin_dev"
+
+
+# -----------------------------
+# Fake DB gateway
+# -----------------------------
+class FakeAlertTable:
+    def __init__(self):
+        self.rows: List[Dict] = []
+        self.created_at: Dict[int, float] = {}
+
+    def insert(self, count: int = 1) -> List[Dict]:
+        inserted = []
+        for _ in range(count):
+            alert_id = len(self.rows) + 1
+            row = {
+                "id": alert_id,
+                "user_id": alert_id % 50,
+                "device_id": alert_id % 300,
+                "alert_type": "notif_speed_alert",
+                "message": "Overspeed 99km/h",
+                "wa_number": "6281234567890",
+                "wa_lid": "12816215965755",
+                "wa_notif": 1,
+                "wa_verified": 1,
+                "device_name": "Truk Gesit",
+            }
+            self.rows.append(row)
+            self.created_at[alert_id] = time.perf_counter()
+            inserted.append(row)
+        return inserted
+
+
+def create_fake_gateway(state: Dict) -> FastAPI:
+    gateway = FastAPI()
+
+    @gateway.post("/mysql/devsites_orin_dev")
+    async def query(request: Request):
+        table: FakeAlertTable = state["table"]
+        data = await request.json()
+        sql: str = data.get("query", "")
+        if "ORDER BY id DESC LIMIT 1" in sql:
+            return {"rows": [{"id": len(table.rows)}] if table.rows else []}
+        last_id = int(data.get("params", {}).get("id") or 0)
+        limit = int(re.search(r"LIMIT\s+(\d+)", sql).group(1))
+        return {"rows": table.rows[last_id:last_id + limit]}
+
+    return gateway
+
+
+class LegacyPollingAlertSource(PollingAlertSource):
+    """The old periodic_send_notifications behaviour: one page every 6 seconds."""
+    name = "legacy"
+
+    async def next_batch(self) -> List[Dict]:
+        await asyncio.sleep(6)
+        if self.last_id is None:
+            self.last_id = await self._fetch_last_id()
+            return []
+        return self._advance(await self._fetch_page())
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+async def run_source(
+    source: AlertSource,
+    table: FakeAlertTable,
+    seconds: float,
+    rate: float,
+    burst: int,
+) -> List[float]:
+    latencies: List[float] = []
+    table.insert(1)  # something for the cursor to start from
+    if not isinstance(source, PushAlertSource):
+        source.last_id = len(table.rows)
+    stop = asyncio.Event()
+
+    async def producer():
+        # steady trickle with one burst in the middle of the run
+        started = time.perf_counter()
+        burst_done = False
+        while time.perf_counter() - started < seconds:
+            rows = table.insert(1)
+            if not burst_done and time.perf_counter() - started > seconds / 2:
+                rows += table.insert(burst)
+                burst_done = True
+            if isinstance(source, PushAlertSource):
+                await source.push(rows)
+            await asyncio.sleep(1 / rate)
+        stop.set()
+
+    async def consumer():
+        # The push source's cursor is an inbox seq, track the alert ids seen
+        expected_last, last_seen = None, len(table.rows)
+        while True:
+            if stop.is_set() and expected_last is None:
+                expected_last = len(table.rows)
+            if expected_last is not None and last_seen >= expected_last:
+                return
+            rows = await source.get_batch(timeout=1)
+            now = time.perf_counter()
+            latencies.extend(now - table.created_at[int(row["id"])] for row in rows)
+            last_seen = max([last_seen] + [int(row["id"]) for row in rows])
+
+    await asyncio.gather(producer(), consumer())
+    assert len(latencies) == len(table.rows) - 1, (len(latencies), len(table.rows))
+    return latencies
+
+
+def report(name: str, latencies: List[float]):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:<10} alerts={len(latencies):<7} p50={p50:9.1f} ms  p99={p99:9.1f} ms")
+
+
+async def main(seconds: float, rate: float, burst: int):
+    state = {"table": FakeAlertTable()}
+    server = uvicorn.Server(uvicorn.Config(
+        create_fake_gateway(state), host=HOST, port=PORT, log_level="warning"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    tmp = tempfile.TemporaryDirectory()
+    outbox = db.ALERT_OUTBOX_DB = AlertOutboxDB(Path(tmp.name) / "outbox.db")
+    await outbox.initialize()
+    try:
+        for source in (
+            LegacyPollingAlertSource(url=GATEWAY_URL),
+            PollingAlertSource(url=GATEWAY_URL),
+            PushAlertSource(),
+        ):
+            table = state["table"] = FakeAlertTable()
+            latencies = await run_source(source, table, seconds, rate, burst)
+            report(source.name, latencies)
+        await check_polling_timeout(state)
+    finally:
+        server.should_exit = True
+        await server_task
+    await check_push_backpressure()
+    await outbox.close()
+    db.ALERT_OUTBOX_DB = None
+    tmp.cleanup()
+
+
+async def check_polling_timeout(state: Dict):
+    state["table"] = FakeAlertTable()
+    source = PollingAlertSource(url=GATEWAY_URL, min_interval=0.1, max_interval=2.0)
+    source.last_id = 0
+    while source._delay < source.max_interval:
+        assert await source.next_batch() == []
+    started = time.perf_counter()
+    assert await source.get_batch(timeout=0.2) == []
+    early = time.perf_counter() - started
+    assert early < 0.5, early
+    state["table"].insert(1)
+    started = time.perf_counter()
+    rows = await source.get_batch(timeout=5)
+    waited = time.perf_counter() - started
+    assert len(rows) == 1 and 1.5 < waited < 2.2, (rows, waited)
+    print(f"polling source: idle at {source.max_interval:.0f}s backoff, returned by a 0.2s timeout after "
+          f"{early * 1000:.0f} ms, next poll kept its schedule ({early + waited:.1f}s)")
+
+
+async def check_push_backpressure():
+    outbox = await db.get_alert_outbox_db()
+    source = PushAlertSource(max_pending=100)
+    source.last_id = await outbox.inbox_head()
+    rows = [{"id": i} for i in range(1, 61)]
+    assert await source.push(rows) == 60
+    try:
+        await asyncio.wait_for(source.push([{"id": 61 + i} for i in range(60)]), timeout=1)
+        raise AssertionError("expected QueueFull")
+    except asyncio.QueueFull:
+        pass
+    try:
+        await source.push([{"id": i} for i in range(101)])
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+    assert source.pending() == 60 and len(await source.next_batch()) == 60 and source.pending() == 0
+    assert await source.push([{"id": 61 + i} for i in range(100)]) == 100
+    print("push source: full queue refused at once, room again after the dispatcher takes the batch")
+
+    # Restart: the dispatcher stored the cursor after the first 60 rows, the
+    # 100 accepted after that are still in the inbox
+    await outbox.set_cursor(source.name, source.last_id)
+    restarted = PushAlertSource(max_pending=100)
+    restarted.last_id = await outbox.get_cursor(restarted.name)
+    rows = await restarted.get_batch(timeout=1)
+    assert [row["id"] for row in rows] == list(range(61, 161)), rows
+    assert restarted.pending() == 0
+    print("push source: accepted rows not yet dispatched are read again after a restart")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--rate", type=float, default=50, help="alerts per second")
+    parser.add_argument("--burst", type=int, default=3000, help="alerts inserted at once mid-run")
+    args = parser.parse_args()
+    asyncio.run(main(args.seconds, args.rate, args.burst))
@@ -0,0 +1,117 @@
+# Microbenchmark of the alert message building step: the old pandas
+# DataFrame + iterrows + asyncio.gather path against the dispatch path,
+# AlertRecord records through the AlertCoalescer (no digest window, one
+# message per alert) and precompiled NotificationTemplates, for
+# 1k/10k/100k row batches.
+#
+# Usage: python -m dev.bench_alert_render [--sizes 1000 10000 100000]
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from src.orin_wa_report.core.api.alert_render import (
+    AlertCoalescer,
+    AlertRecord,
+    NotificationTemplates,
+    render_digest_messages,
+)
+
+NOTIFICATION_SETTING = {
+    "allowed_alert_type": "notif_speed_alert;notif_geofence_inside;notif_geofence_outside",
+    "prompt_default": "Notifikasi ORIN! Kendaraan anda ({device_name}) {message}",
+    "prompt_notif_speed_alert": "Peringatan kecepatan! {device_name}: {message}",
+}
+ALERT_TYPES = ["notif_speed_alert", "notif_geofence_inside", "notif_geofence_outside"]
+
+
+def make_rows(size: int) -> List[Dict]:
+    return [
+        {
+            "id": i,
+            "user_id": random.randrange(500),
+            "device_id": random.randrange(5000),
+            "alert_type": random.choice(ALERT_TYPES),
+            "message": "Overspeed 99km/h",
+            "created_at": "2025-01-01 00:00:00",
+            "wa_number": "6281234567890",
+            "wa_lid": "12816215965755",
+            "wa_notif": 1,
+            "wa_verified": 1,
+            "device_name": "Truk Gesit",
+        }
+        for i in range(size)
+    ]
+
+
+async def legacy_build(rows: List[Dict]) -> List[Dict]:
+    import pandas as pd
+
+    async def build_notification_message(notification_setting, row_data):
+        alert_type_key = f"prompt_{row_data['alert_type']}"
+        if alert_type_key in notification_setting.keys():
+            template = notification_setting.get(alert_type_key)
+        else:
+            template = notification_setting.get("prompt_default")
+        return template.format(device_name=row_data["device_name"], message=row_data["message"])
+
+    allowed_alert_type = NOTIFICATION_SETTING["allowed_alert_type"].split(sep=";")
+    df_notif = pd.DataFrame(rows)
+    rows_to_process = [
+        row for _, row in df_notif.iterrows() if row["alert_type"] in allowed_alert_type
+    ]
+    contents = await asyncio.gather(*[
+        build_notification_message(NOTIFICATION_SETTING, row) for row in rows_to_process
+    ])
+    return [
+        {
+            "to": f"{row['wa_number']}@c.us",
+            "to_fallback": f"{row['wa_lid']}@lid",
+            "message": content,
+        }
+        for row, content in zip(rows_to_process, contents)
+    ]
+
+
+def current_build(rows: List[Dict], templates: NotificationTemplates) -> List[Dict]:
+    coalescer = AlertCoalescer(window_seconds=0)
+    coalescer.add(AlertRecord.from_row(row) for row in rows)
+    return render_digest_messages(coalescer.flush_due(), templates)
+
+
+async def main(sizes: List[int]):
+    random.seed(7)
+    try:
+        started = time.perf_counter()
+        import pandas  # noqa: F401
+        print(f"pandas import: {(time.perf_counter() - started) * 1000:.1f} ms")
+        has_pandas = True
+    except ImportError:
+        print("pandas not installed, only the current path is measured")
+        has_pandas = False
+
+    templates = NotificationTemplates(NOTIFICATION_SETTING, version=1)
+    for size in sizes:
+        rows = make_rows(size)
+
+        started = time.perf_counter()
+        current = current_build(rows, templates)
+        current_ms = (time.perf_counter() - started) * 1000
+
+        line = f"rows={size:<7} records+coalescer+templates={current_ms:9.1f} ms"
+        if has_pandas:
+            started = time.perf_counter()
+            legacy = await legacy_build(rows)
+            legacy_ms = (time.perf_counter() - started) * 1000
+            assert [m["message"] for m in legacy] == [m["message"] for m in current]
+            line += f"  pandas+iterrows+gather={legacy_ms:9.1f} ms  speedup={legacy_ms / current_ms:5.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes))
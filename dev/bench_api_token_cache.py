@@ -0,0 +1,100 @@
+# Bearer token resolution with and without the API token cache against the
+# SQLite stand-in gateway: gateway requests and latency for a mobile-app
+# style load (a few hundred users re-opening screens), plus checks for
+# single-flight, negative caching and invalidation.
+#
+# Usage: python -m dev.bench_api_token_cache [--lookups 5000] [--users 200] [--concurrency 50]
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List
+
+from dev.fake_sqlite_gateway import FakeSQLiteGateway
+from src.orin_wa_report.core import utils
+from src.orin_wa_report.core.cache import AsyncTTLCache
+from src.orin_wa_report.core.utils import (
+    DBGateway,
+    get_user_id_from_api_token,
+    invalidate_api_token,
+    invalidate_api_tokens_of_user,
+)
+
+
+async def run_load(base_url: str, tokens: List[str], lookups: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await get_user_id_from_api_token(base_url, random.choice(tokens), derive_parent_id=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[one() for _ in range(lookups)])
+    return latencies
+
+
+async def main(lookups: int, users: int, concurrency: int):
+    random.seed(3)
+    gateway = FakeSQLiteGateway()
+    await gateway.start()
+    utils._DB_GATEWAY = DBGateway(db_base_url=gateway.base_url)
+    user_ids = {f"tok-{i}": gateway.insert("users", name=f"User {i}", api_token=f"tok-{i}") for i in range(users)}
+    tokens = list(user_ids)
+
+    for label, cache in (
+        ("no cache", AsyncTTLCache(ttl=0, negative_ttl=0)),
+        ("cache", AsyncTTLCache(max_size=10000, ttl=300, negative_ttl=30)),
+    ):
+        utils._API_TOKEN_CACHE = cache
+        before = gateway.requests
+        started = time.perf_counter()
+        latencies = sorted(await run_load(gateway.base_url, tokens, lookups, concurrency))
+        elapsed = time.perf_counter() - started
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"{label:<9} {lookups} lookups: {gateway.requests - before:5} gateway requests  "
+              f"p50={statistics.median(latencies):6.2f} ms  p99={p99:6.2f} ms  {lookups / elapsed:7.0f} lookups/s")
+    print(f"cache metrics: {cache.metrics()}")
+
+    # Single-flight: a burst for one cold token is one gateway request
+    cache = utils._API_TOKEN_CACHE = AsyncTTLCache()
+    before = gateway.requests
+    results = await asyncio.gather(*[get_user_id_from_api_token(gateway.base_url, "tok-0") for _ in range(100)])
+    assert set(results) == {user_ids["tok-0"]} and gateway.requests - before == 1, gateway.requests - before
+    assert cache.coalesced == 99, cache.metrics()
+
+    # Negative caching: unknown tokens fail without asking the gateway again
+    before = gateway.requests
+    for _ in range(10):
+        try:
+            await get_user_id_from_api_token(gateway.base_url, "tok-unknown")
+            raise AssertionError("expected RuntimeError")
+        except RuntimeError:
+            pass
+    assert gateway.requests - before == 1 and cache.negative_hits == 9, cache.metrics()
+
+    # Invalidation, as unsubscribe_user and delete_user do
+    await get_user_id_from_api_token(gateway.base_url, "tok-1")
+    assert invalidate_api_token("tok-0") and invalidate_api_tokens_of_user(user_ids["tok-1"]) == 1
+    gateway.db.execute("UPDATE users SET api_token = NULL WHERE id = :id", {"id": user_ids["tok-1"]})
+    try:
+        await get_user_id_from_api_token(gateway.base_url, "tok-1")
+        raise AssertionError("deleted user still resolves")
+    except RuntimeError:
+        pass
+    print("single-flight, negative caching and invalidation ok")
+
+    await utils._DB_GATEWAY.close()
+    await gateway.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.lookups, args.users, args.concurrency))
@@ -0,0 +1,140 @@
+# Bulk send jobs end to end against the fake OpenWA server: the in-process
+# BulkSender (what the alert loop uses) and POST /send-messages with polling
+# and SSE progress. A share of the recipients only exists as @lid so the
+# fallback counter moves. Then sends outbox rows from a temporary
+# AlertOutboxDB and checks that their results land in a few batched
+# transactions rather than one commit per message, also when a write fails.
+#
+# Usage: python -m dev.bench_bulk_send [--messages 300] [--invalid 0.2]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+# The app imports modules that read these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from dev.fake_openwa_server import FakeOpenWAServer
+from src.orin_wa_report.core import bulk_send, clients, db
+from src.orin_wa_report.core.api.app import app
+from src.orin_wa_report.core.bulk_send import BulkSender
+from src.orin_wa_report.core.db import AlertOutboxDB
+from src.orin_wa_report.core.openwa import AsyncSocketClient
+from src.orin_wa_report.core.send_scheduler import SendScheduler
+
+
+def make_messages(count: int, invalid: float):
+    return [
+        {
+            "to": f"{'invalid' if random.random() < invalid else '62'}{i}@c.us",
+            "to_fallback": f"1281{i}@lid",
+            "message": f"Notifikasi ORIN! alert {i}",
+        }
+        for i in range(count)
+    ]
+
+
+async def main(messages: int, invalid: float):
+    random.seed(7)
+    server = FakeOpenWAServer(max_delay=0.01)
+    await server.start()
+    client = AsyncSocketClient(server.url)
+    await client.connect()
+    clients.openwa_client = client
+
+    # Loose limits, this measures the send path rather than the pacing
+    bulk_sender = bulk_send._BULK_SENDER = BulkSender(scheduler=SendScheduler(
+        global_rate=500, global_burst=50, recipient_rate=50, recipient_burst=10,
+    ))
+
+    # In-process, as periodic_send_notifications does
+    batch = make_messages(messages, invalid)
+    started = time.perf_counter()
+    job = bulk_sender.submit(batch, source="alerts")
+    submit_ms = (time.perf_counter() - started) * 1000
+    async for snapshot in bulk_sender.watch(job.id, interval=0.5):
+        if snapshot["remaining"] % 50:
+            continue
+        print(f"  in-process {snapshot['status']:<7} sent={snapshot['sent']:<4} "
+              f"failed={snapshot['failed']:<3} fallback={snapshot['fallback_to_lid']:<3} "
+              f"remaining={snapshot['remaining']:<4} {snapshot['throughput_per_second']} msg/s")
+    expected_fallback = sum(1 for msg in batch if msg["to"].startswith("invalid"))
+    final = job.snapshot()
+    assert final["sent"] == messages and final["failed"] == 0, final
+    assert final["fallback_to_lid"] == expected_fallback, final
+    print(f"in-process submit of {messages} messages: {submit_ms:.1f} ms")
+
+    # Over HTTP: job id, polling and SSE
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as http:
+        started = time.perf_counter()
+        response = await http.post("/send-messages", json={"messages": make_messages(messages, invalid)})
+        post_ms = (time.perf_counter() - started) * 1000
+        job_id = response.json()["job_id"]
+        print(f"HTTP POST /send-messages of {messages} messages: {post_ms:.1f} ms, job {job_id}")
+
+        events = 0
+        async with http.stream("GET", f"/send-messages/{job_id}/events") as stream:
+            async for line in stream.aiter_lines():
+                if line.startswith("data: "):
+                    events += 1
+                    last = json.loads(line[len("data: "):])
+        polled = (await http.get(f"/send-messages/{job_id}")).json()
+        assert last == polled and polled["status"] == "done", (last, polled)
+        print(f"SSE delivered {events} progress events, final: {json.dumps(polled)}")
+
+    await outbox_results(bulk_sender, messages, invalid)
+
+    await bulk_sender.scheduler.stop()
+    await client.disconnect()
+    await server.stop()
+
+
+async def outbox_results(bulk_sender: BulkSender, messages: int, invalid: float):
+    """
+    Outbox rows are confirmed in batches, a failed write is retried on the
+    next flush, and close() writes the rest.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = db.ALERT_OUTBOX_DB = AlertOutboxDB(Path(tmp) / "outbox.db")
+        await outbox.initialize()
+        transactions, failures = 0, 1
+        mark_results = outbox.mark_results
+
+        async def counted(results):
+            nonlocal transactions, failures
+            transactions += 1
+            if failures:
+                failures -= 1
+                raise sqlite3.OperationalError("database is locked")
+            await mark_results(results)
+        outbox.mark_results = counted
+
+        stored = await outbox.enqueue(make_messages(messages, invalid), source="bench", last_id=messages)
+        job = bulk_sender.submit(stored, source="outbox")
+        async for _ in bulk_sender.watch(job.id, interval=0.5):
+            pass
+        await bulk_sender.close()
+        stats = await outbox.get_stats()
+        assert stats == {"sent": messages}, stats
+        assert transactions <= messages // bulk_sender.flush_size + 5, transactions
+        print(f"outbox: {messages} results written in {transactions} transactions, the first one failed and was retried")
+        await outbox.close()
+        db.ALERT_OUTBOX_DB = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--invalid", type=float, default=0.2, help="share of recipients that need the @lid fallback")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.invalid))
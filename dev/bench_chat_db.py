@@ -0,0 +1,105 @@
+# Inbound message throughput of ChatDB at 1, 10 and 100 concurrent chats.
+# Each message does the DB work chat_response and SessionManager do today:
+# config check, session lookup and activity bump, store the user message,
+# load history, store the reply, bump activity again. Runs once with the
+# previous execution model (one connection behind an asyncio.Lock on the
+# default executor, a commit per operation) and once with the writer
+# thread + read-only reader pool.
+#
+# Usage: python -m dev.bench_chat_db [--messages 20] [--chats 1,10,100] [--batch-window 0.0]
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent.handler import ChatDB
+
+
+class SerializedChatDB(ChatDB):
+    """The previous model: every operation behind one lock, committed on its own."""
+    async def initialize(self):
+        await super().initialize()
+        self._legacy_conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._legacy_lock = asyncio.Lock()
+
+    def _legacy_call(self, fn):
+        result = fn(self._legacy_conn)
+        self._legacy_conn.commit()
+        return result
+
+    async def _write(self, fn):
+        async with self._legacy_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, self._legacy_call, fn)
+
+    _read = _write
+
+    async def close(self):
+        self._legacy_conn.close()
+        await super().close()
+
+
+async def inbound_message(db: ChatDB, phone: str, session_id: str, i: int):
+    await db.get_config(phone, "disable_agent", create_if_not_exists=True)
+    await db.get_session(session_id)
+    await db.update_session_activity(session_id)
+    await db.add_message(session_id, sender="user", body=f"pesan {i} dari {phone}")
+    await db.get_messages_for_session(session_id, limit=20)
+    await db.add_message(session_id, sender="bot", body=f"balasan {i} untuk {phone}")
+    await db.update_session_activity(session_id)
+
+
+async def run(db_class, chats: int, messages: int, batch_window: float) -> dict:
+    db = db_class(Path(tempfile.mkdtemp()) / "chat_sessions.db", batch_window=batch_window)
+    await db.initialize()
+    phones = [f"62812{i:08d}" for i in range(chats)]
+    session_ids = [await db.create_session(phone, f"User {phone}") for phone in phones]
+    latencies: List[float] = []
+
+    async def chat(phone: str, session_id: str):
+        for i in range(messages):
+            started = time.perf_counter()
+            await inbound_message(db, phone, session_id, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[chat(phone, session_id) for phone, session_id in zip(phones, session_ids)])
+    elapsed = time.perf_counter() - started
+    stored = await db._read(lambda conn: conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+    assert stored == chats * messages * 2, stored
+    metrics = db.metrics()
+    await db.close()
+    latencies.sort()
+    return {
+        "rate": chats * messages / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "writes_per_commit": metrics["writes_per_commit"],
+    }
+
+
+async def main(messages: int, chat_counts: List[int], batch_window: float):
+    for chats in chat_counts:
+        for label, db_class in (("lock+commit", SerializedChatDB), ("writer", ChatDB)):
+            result = await run(db_class, chats, messages, batch_window)
+            batching = f"  {result['writes_per_commit']} writes/commit" if db_class is ChatDB else ""
+            print(f"{chats:3} chats {label:<11} {result['rate']:7.0f} msg/s  "
+                  f"p50={result['p50']:6.2f} ms  p99={result['p99']:7.2f} ms{batching}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20, help="messages per chat")
+    parser.add_argument("--chats", default="1,10,100", help="comma separated concurrent chat counts")
+    parser.add_argument("--batch-window", type=float, default=0.0, help="seconds the writer waits for more writes")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, [int(n) for n in args.chats.split(",")], args.batch_window))
@@ -0,0 +1,138 @@
+# ChatDB compound operations against the previous multi-step versions:
+# executor hops (awaited _read/_write calls) and SQL statements per call,
+# and calls per second with many chats at once, for
+#   - get_config(create_if_not_exists=True) on a phone's first message
+#   - get_config on the following messages
+#   - add_chat_to_latest_session (dashboard replies stored in the chat)
+#   - update_config(create_if_not_exists=True) (agent on/off toggle)
+#
+# Usage: python -m dev.bench_chat_db_ops [--chats 200] [--rounds 5]
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent.handler import ChatDB
+
+DML = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+class CountingChatDB(ChatDB):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hops = 0
+        self.statements = 0
+
+    def _trace(self, sql: str):
+        if sql.lstrip().upper().startswith(DML):
+            self.statements += 1
+
+    async def initialize(self):
+        await super().initialize()
+        self._conn.set_trace_callback(self._trace)
+
+    def _reader_conn(self):
+        conn = super()._reader_conn()
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    async def _read(self, fn):
+        self.hops += 1
+        return await super()._read(fn)
+
+    async def _write(self, fn):
+        self.hops += 1
+        return await super()._write(fn)
+
+
+class LegacyChatDB(CountingChatDB):
+    """The previous versions: separate hops, select-then-insert-then-update."""
+    async def add_chat_to_latest_session(self, phone_number: str, sender: str, message: str):
+        session = await self.get_session_by_phone(phone_number)
+        if not session:
+            return
+        await self.add_message(session_id=session["id"], sender=sender, body=message)
+        await self.update_session_activity(session["id"])
+
+    async def get_config(self, phone: str, key: str, create_if_not_exists: bool = False):
+        def _get(conn):
+            row = conn.execute(f"SELECT {key} FROM config WHERE phone = ?", (phone,)).fetchone()
+            return bool(row[0]) if row else None
+        value = await self._read(_get)
+        if value is None and create_if_not_exists:
+            await self._write(lambda conn: self._create_default_config_row(conn, phone))
+            return False
+        return value
+
+    async def update_config(self, phone: str, values: dict, create_if_not_exists: bool = False):
+        update_keys = [k for k in values if k in self.valid_config_keys]
+        def _update(conn):
+            row_exists = conn.execute("SELECT id FROM config WHERE phone = ?", (phone,)).fetchone()
+            if not row_exists and create_if_not_exists:
+                self._create_default_config_row(conn, phone)
+            elif not row_exists:
+                return
+            sql = f"UPDATE config SET {', '.join(f'{key} = ?' for key in update_keys)} WHERE phone = ?"
+            conn.execute(sql, [values[key] for key in update_keys] + [phone])
+        await self._write(_update)
+
+
+async def measure(db: CountingChatDB, label: str, calls):
+    """Run the coroutines from `calls` concurrently, print hops, statements and rate."""
+    hops, statements = db.hops, db.statements
+    started = time.perf_counter()
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - started
+    n = len(calls)
+    print(f"  {label:<28} {(db.hops - hops) / n:4.1f} hops  {(db.statements - statements) / n:4.1f} statements  "
+          f"{n / elapsed:7.0f} calls/s")
+
+
+async def run(db_class, chats: int, rounds: int):
+    db = db_class(Path(tempfile.mkdtemp()) / "chat_sessions.db")
+    await db.initialize()
+    phones = [f"62812{i:08d}" for i in range(chats)]
+    for phone in phones:
+        await db._write(lambda conn, phone=phone: conn.execute(
+            "INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, ?, 'x', 0, 0, 'active')",
+            (f"s{phone}", phone),
+        ))
+
+    print(db_class.__name__)
+    await measure(db, "get_config, first message", [db.get_config(p, "disable_agent", create_if_not_exists=True) for p in phones])
+    await measure(db, "get_config, warm", [
+        db.get_config(p, "disable_agent", create_if_not_exists=True) for _ in range(rounds) for p in phones
+    ])
+    await measure(db, "add_chat_to_latest_session", [
+        db.add_chat_to_latest_session(p, "bot", f"balasan {i}") for i in range(rounds) for p in phones
+    ])
+    await measure(db, "update_config, upsert", [
+        db.update_config(p, {"disable_agent": bool(i % 2)}, create_if_not_exists=True) for i in range(rounds) for p in phones
+    ])
+
+    stored = await db._read(lambda conn: conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+    bumped = await db._read(lambda conn: conn.execute("SELECT COUNT(*) FROM sessions WHERE last_activity > 0").fetchone()[0])
+    disabled = await db._read(lambda conn: conn.execute("SELECT COUNT(*) FROM config WHERE disable_agent").fetchone()[0])
+    assert stored == chats * rounds and bumped == chats, (stored, bumped)
+    assert disabled == (chats if rounds % 2 == 0 else 0), disabled
+    await db.close()
+
+
+async def main(chats: int, rounds: int):
+    await run(LegacyChatDB, chats, rounds)
+    await run(CountingChatDB, chats, rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5, help="calls per chat for the warm operations")
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.rounds))
@@ -0,0 +1,113 @@
+# Message history reads on long sessions. One chat with a session of
+# 10k messages and four older sessions of 2k each:
+#   - chat context: the previous "first 20 ascending, keep the last 10"
+#     against tail(session_id, 10), checking which messages each returns
+#   - /chat_history_by_session: the whole session against keyset pages
+#   - /chat_history: one query per session against the single JOIN, one
+#     request at a time and 50 at once
+# Also prints the query plan of tail() to show it walks the index backwards.
+#
+# Usage: python -m dev.bench_chat_history [--messages 10000] [--repeat 200]
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent.chat_storage import SENDER_IDS
+from src.orin_wa_report.core.agent.handler import ChatDB
+
+PHONE = "6281200000001"
+
+
+async def timed(repeat: int, fn):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = await fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+async def populate(db: ChatDB, messages: int):
+    now = int(time.time())
+    sizes = [2000, 2000, 2000, 2000, messages]
+    session_ids = []
+    for n, size in enumerate(sizes):
+        started = now - (len(sizes) - n) * 86400
+        session_id = await db.create_session(PHONE, "x", started_at=started)
+        # two messages per second, so timestamps tie and the id has to order them
+        rows = [(session_id, SENDER_IDS["user" if i % 2 == 0 else "bot"], f"pesan {i}", started + i // 2, None, f"{session_id}-{i}")
+                for i in range(size)]
+        await db._write(lambda conn, rows=rows: conn.executemany(db.INSERT_MESSAGE_SQL, rows))
+        session_ids.append(session_id)
+    return session_ids
+
+
+async def main(messages: int, repeat: int):
+    db = ChatDB(Path(tempfile.mkdtemp()) / "chat_sessions.db")
+    await db.initialize()
+    session_ids = await populate(db, messages)
+    current = session_ids[-1]
+
+    plan = await db._read(lambda conn: conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT {db.MESSAGE_COLUMNS} FROM messages WHERE session_pk = {db.SESSION_PK} "
+        "ORDER BY timestamp DESC, id DESC LIMIT ?", (current, 10)
+    ).fetchall())
+    print("tail plan:", "; ".join(row[-1] for row in plan))
+
+    # Chat context window
+    elapsed_old, old = await timed(repeat, lambda: db.get_messages_for_session(current, limit=20))
+    elapsed_new, new = await timed(repeat, lambda: db.tail(current, 10))
+    print(f"context  first 20 asc: {elapsed_old:6.2f} ms, last body {old[-1]['body']!r}")
+    print(f"context  tail(10):     {elapsed_new:6.2f} ms, last body {new[-1]['body']!r}")
+    assert new[-1]["body"] == f"pesan {messages - 1}" and len(new) == 10, new[-1]
+
+    # Session history: everything at once against pages of 100
+    elapsed_old, whole = await timed(max(1, repeat // 20), lambda: db.get_messages_for_session(current, limit=messages))
+    elapsed_new, (page, cursor) = await timed(repeat, lambda: db.get_messages_page(current, limit=100))
+    print(f"session  whole ({len(whole)}): {elapsed_old:6.2f} ms")
+    print(f"session  page of 100:  {elapsed_new:6.2f} ms")
+    seen = [m["id"] for m in page]
+    started = time.perf_counter()
+    pages = 1
+    while cursor:
+        page, cursor = await db.get_messages_page(current, limit=100, before=cursor)
+        seen = [m["id"] for m in page] + seen
+        pages += 1
+    walked = (time.perf_counter() - started) * 1000
+    assert seen == [f"{current}-{i}" for i in range(messages)], "pages skipped or repeated messages"
+    print(f"session  {pages} pages walked in {walked:.0f} ms, every message once and in order")
+
+    # Chat history across sessions: N+1 against one JOIN
+    async def n_plus_one():
+        sessions = await db.get_sessions_by_phone(PHONE, limit=5)
+        return [(s["id"], await db.get_messages_for_session(s["id"])) for s in sessions]
+
+    elapsed_old, old = await timed(repeat, n_plus_one)
+    elapsed_new, (new, next_cursor) = await timed(repeat, lambda: db.get_history_for_phone(PHONE, sessions=5))
+    print(f"history  N+1 (6 reads): {elapsed_old:6.2f} ms, newest session ends at {old[-1][1][-1]['body']!r}")
+    print(f"history  JOIN (1 read): {elapsed_new:6.2f} ms, newest session ends at {new[-1][1][-1]['body']!r}")
+    for label, fn in (("N+1", n_plus_one), ("JOIN", lambda: db.get_history_for_phone(PHONE, sessions=5))):
+        started = time.perf_counter()
+        await asyncio.gather(*[fn() for _ in range(50)])
+        print(f"history  {label:<4} 50 at once: {(time.perf_counter() - started) * 1000:6.1f} ms")
+    assert [s for s, _ in new] == session_ids and next_cursor is None
+    assert new[-1][1][-1]["body"] == f"pesan {messages - 1}" and all(len(m) == 100 for _, m in new)
+    older, older_cursor = await db.get_history_for_phone(PHONE, sessions=2)
+    rest, rest_cursor = await db.get_history_for_phone(PHONE, sessions=5, before=older_cursor)
+    assert [s for s, _ in rest + older] == session_ids and rest_cursor is None
+    print("history  session cursor pages ok")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000, help="messages in the current session")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.repeat))
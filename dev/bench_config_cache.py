@@ -0,0 +1,83 @@
+# The disable_agent check chat_response makes on every inbound message:
+# latency of get_config served from ChatDB's config cache against the same
+# read going to SQLite each time. Then checks that update_config writes
+# through, that a handover's timed disable expires on its own, and that the
+# expiry is still there after the DB is closed and reopened (a restart).
+#
+# Usage: python -m dev.bench_config_cache [--phones 1000] [--checks 20000]
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent.handler import ChatDB
+from src.orin_wa_report.core.cache import AsyncTTLCache
+
+
+async def check_latency(db: ChatDB, phones: List[str], checks: int) -> List[float]:
+    latencies = []
+    for _ in range(checks):
+        phone = random.choice(phones)
+        started = time.perf_counter()
+        await db.get_config(phone, "disable_agent", create_if_not_exists=True)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return latencies
+
+
+async def main(phones: int, checks: int):
+    random.seed(7)
+    path = Path(tempfile.mkdtemp()) / "chat_sessions.db"
+    db = ChatDB(path)
+    await db.initialize()
+    numbers = [f"62812{i:08d}" for i in range(phones)]
+    for phone in numbers:
+        await db.get_config(phone, "disable_agent", create_if_not_exists=True)
+
+    for label, cache in (("sqlite read", AsyncTTLCache(ttl=0, negative_ttl=0)), ("config cache", db._config_cache)):
+        db._config_cache = cache
+        latencies = await check_latency(db, numbers, checks)
+        print(f"{label:<12}: p50={statistics.median(latencies):6.1f} us  p99={latencies[int(len(latencies) * 0.99)]:7.1f} us")
+
+    # Write-through: the next check sees the update without going to SQLite
+    phone = numbers[0]
+    await db.update_config(phone, {"disable_agent": True}, create_if_not_exists=True)
+    assert await db.get_config(phone, "disable_agent") is True
+    await db.update_config(phone, {"disable_agent": False})
+    assert await db.get_config(phone, "disable_agent") is False
+    print("update_config writes through ok")
+
+    # Handover: disabled with an expiry, back on once it passes
+    await db.update_config(phone, {"disable_agent": True}, create_if_not_exists=True, expires_at=int(time.time()) + 2)
+    assert await db.get_config(phone, "disable_agent") is True
+    restarted_phone = numbers[1]
+    await db.update_config(restarted_phone, {"disable_agent": True}, create_if_not_exists=True, expires_at=int(time.time()) + 2)
+    await db.close()
+
+    # Restart: a new ChatDB with an empty cache still knows the deadline
+    db = ChatDB(path)
+    await db.initialize()
+    assert await db.get_config(restarted_phone, "disable_agent") is True
+    await asyncio.sleep(2.1)
+    assert await db.get_config(restarted_phone, "disable_agent") is False
+    assert await db.get_config(phone, "disable_agent") is False
+    print("timed disable expires, also after a restart ok")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--phones", type=int, default=1000)
+    parser.add_argument("--checks", type=int, default=20000, help="get_config calls per run")
+    args = parser.parse_args()
+    asyncio.run(main(args.phones, args.checks))
@@ -0,0 +1,129 @@
+# /whatsapp/contacts at 1M sessions over 200k phones: the previous GROUP BY
+# over sessions against the trigger-maintained contacts table (first page,
+# a deep page, a search) and a dashboard poll answered 304 from the ETag.
+# Checks the summary matches the GROUP BY, that new activity changes the
+# ETag and reorders the list, and times building the summary for an
+# existing DB on first start.
+#
+# Usage: python -m dev.bench_contacts [--sessions 1000000] [--phones 200000]
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent.handler import ChatDB, get_chat_db
+from src.orin_wa_report.core.api.routers.client import router
+
+GROUP_BY_SQL = """
+    SELECT phone, user_name, MAX(last_activity) as last_activity
+    FROM sessions
+    GROUP BY phone
+    ORDER BY last_activity DESC
+"""
+
+
+async def timed(fn, repeat: int = 20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = await fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+async def populate(db: ChatDB, sessions: int, phones: int):
+    random.seed(7)
+    now = int(time.time())
+    started = time.perf_counter()
+    chunk = 50000
+    for offset in range(0, sessions, chunk):
+        rows = []
+        for i in range(offset, min(offset + chunk, sessions)):
+            last = now - random.randrange(0, 90 * 86400)
+            rows.append((f"s{i:09d}", f"62812{random.randrange(phones):08d}", f"User {i}", last - 600, last, "ended"))
+        await db._write(lambda conn, rows=rows: conn.executemany(
+            "INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, ?, ?, ?, ?, ?)", rows
+        ))
+    elapsed = time.perf_counter() - started
+    print(f"inserted {sessions} sessions in {elapsed:.1f} s ({sessions / elapsed:.0f}/s, triggers included)")
+
+
+async def main(sessions: int, phones: int):
+    path = Path(tempfile.mkdtemp()) / "chat_sessions.db"
+    db = ChatDB(path)
+    await db.initialize()
+    await populate(db, sessions, phones)
+
+    elapsed, grouped = await timed(lambda: db._read(lambda conn: conn.execute(GROUP_BY_SQL).fetchall()), repeat=3)
+    print(f"GROUP BY over sessions:  {elapsed:8.1f} ms for all {len(grouped)} contacts")
+    summary = await db._read(lambda conn: conn.execute(
+        "SELECT phone, user_name, last_activity FROM contacts ORDER BY last_activity DESC, phone DESC"
+    ).fetchall())
+    assert {r[0]: r[2] for r in summary} == {r[0]: r[2] for r in grouped}, "summary differs from GROUP BY"
+
+    db._contacts_snapshots.clear()
+    elapsed, (_, first, cursor) = await timed(lambda: db.get_contacts(limit=100), repeat=1)
+    print(f"contacts first page:     {elapsed:8.2f} ms")
+    for _ in range(50):
+        _, page, cursor = await db.get_contacts(limit=100, before=cursor)
+    elapsed, _ = await timed(lambda: db.get_contacts(limit=100, before=cursor), repeat=1)
+    print(f"contacts page 52:        {elapsed:8.2f} ms")
+    elapsed, (_, found, _) = await timed(lambda: db.get_contacts(limit=100, search="User 99"), repeat=1)
+    print(f"contacts search:         {elapsed:8.2f} ms ({len(found)} matches on the first page)")
+    elapsed, _ = await timed(lambda: db.get_contacts(limit=100))
+    print(f"contacts cached page:    {elapsed:8.2f} ms")
+
+    # Through the route: ETag, 304 on an unchanged list, new ETag after activity
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_chat_db] = lambda: db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/whatsapp/contacts")
+        etag = response.headers["etag"]
+        assert response.status_code == 200 and len(response.json()) == 100 and response.headers["x-next-cursor"]
+        elapsed, response = await timed(lambda: client.get("/whatsapp/contacts", headers={"If-None-Match": etag}))
+        assert response.status_code == 304
+        print(f"route poll, 304:         {elapsed:8.2f} ms")
+
+        quiet = first[-1]["phone_number"]
+        session_id = await db._read(lambda conn: conn.execute(
+            "SELECT id FROM sessions WHERE phone = ? LIMIT 1", (quiet,)
+        ).fetchone()[0])
+        await db.update_sessions_activity([(session_id, int(time.time()) + 60)])
+        response = await client.get("/whatsapp/contacts", headers={"If-None-Match": etag})
+        assert response.status_code == 200 and response.headers["etag"] != etag
+        assert response.json()[0]["phone_number"] == quiet, response.json()[0]
+        print("new activity changes the ETag and moves the contact to the top ok")
+    await db.close()
+
+    # First start on an existing DB without the summary
+    import sqlite3
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        DROP TRIGGER trg_contacts_session_insert;
+        DROP TRIGGER trg_contacts_session_activity;
+        DROP TABLE contacts;
+    """)
+    conn.close()
+    db = ChatDB(path)
+    started = time.perf_counter()
+    await db.initialize()
+    print(f"building the summary on first start: {time.perf_counter() - started:.1f} s")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--phones", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.phones))
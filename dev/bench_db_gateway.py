@@ -0,0 +1,112 @@
+# Benchmark per-query latency against a local fake DB gateway: a fresh
+# httpx.AsyncClient per query (how call sites used to talk to the gateway)
+# versus the shared, pooled DBGateway, one at a time and under concurrency.
+#
+# Usage: python -m dev.bench_db_gateway [--queries 300] [--concurrency 20]
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from src.orin_wa_report.core import utils
+from src.orin_wa_report.core.utils import DBGateway, get_user_id_from_api_token
+
+HOST = "127.0.0.1"
+PORT = 18086
+BASE_URL = f"http://{HOST}:{PORT}"
+QUERY = "SELECT id as user_id, parent_id FROM users WHERE api_token = :token AND deleted_at IS NULL LIMIT 1"
+
+
+def create_fake_gateway() -> FastAPI:
+    gateway = FastAPI()
+
+    @gateway.post("/query")
+    async def query(request: Request):
+        data = await request.json()
+        if "query" not in data:
+            # no batch form, like a gateway that only knows single statements
+            return JSONResponse({"detail": "query is required"}, status_code=422)
+        token = (data.get("params") or {}).get("token", "")
+        # Tokens starting with "sub" only exist in user_tokens, like mobile app tokens
+        if token.startswith("sub") and "FROM users" in data.get("query", ""):
+            return {"rows": []}
+        return {"rows": [{"user_id": 7, "parent_id": 0}]}
+
+    return gateway
+
+
+async def legacy_query(params):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{BASE_URL}/query", json={"query": QUERY, "params": params})
+        return response.json()
+
+
+async def measure(call: Callable[[int], Awaitable], queries: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[one(i) for i in range(queries)])
+    return latencies
+
+
+def report(label: str, latencies: List[float], elapsed: float):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<28} p50={statistics.median(latencies):7.2f} ms  p99={p99:7.2f} ms  "
+          f"{len(latencies) / elapsed:8.1f} q/s")
+
+
+async def main(queries: int, concurrency: int):
+    server = uvicorn.Server(uvicorn.Config(create_fake_gateway(), host=HOST, port=PORT, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    gateway = utils._DB_GATEWAY = DBGateway(db_base_url=BASE_URL)
+    await gateway.start()
+
+    cases = {
+        "per-call AsyncClient": lambda i: legacy_query({"token": f"t{i}"}),
+        "DBGateway": lambda i: gateway.query(QUERY, params={"token": f"t{i}"}),
+    }
+    for level in sorted({1, concurrency}):
+        print(f"{queries} queries, concurrency {level}:")
+        for label, call in cases.items():
+            await measure(call, min(queries, 20), level)  # warm up
+            started = time.perf_counter()
+            latencies = await measure(call, queries, level)
+            report(label, latencies, time.perf_counter() - started)
+
+    # The token lookup goes through the shared gateway now, two queries for user_tokens tokens
+    print(f"get_user_id_from_api_token, concurrency {concurrency}:")
+    for label, prefix in (("token in users", "tok"), ("token in user_tokens", "sub")):
+        started = time.perf_counter()
+        latencies = await measure(
+            lambda i: get_user_id_from_api_token(BASE_URL, f"{prefix}{i}"), queries, concurrency,
+        )
+        report(label, latencies, time.perf_counter() - started)
+
+    await gateway.close()
+    server.should_exit = True
+    await server_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.concurrency))
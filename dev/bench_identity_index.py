@@ -0,0 +1,108 @@
+# Phone/LID identity index on the send path: contacts that have moved to LID
+# fail every @c.us send, so each message without the index costs a failed
+# attempt before the @lid fallback. Sends the same traffic through
+# AsyncOpenWAClient without and with the index (pairs learned from inbound
+# messages), then checks the index survives a reload from identity.db and
+# that LID-only senders resolve to their phone number.
+#
+# Usage: python -m dev.bench_identity_index [--contacts 500] [--messages 4] [--migrated 0.3] [--send-latency 0.01]
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+from src.orin_wa_report.core.db import IdentityDB
+from src.orin_wa_report.core.identity import IdentityIndex, lid_jid, phone_jid
+from src.orin_wa_report.core.openwa import AsyncOpenWAClient, WAError
+
+
+class FakeSocketClient:
+    """sendText blocks like an OpenWA ack and fails on @c.us for LID-only contacts."""
+    def __init__(self, latency: float, lid_only: Set[str]):
+        self.latency = latency
+        self.lid_only = lid_only
+        self.attempts = 0
+        self.failed = 0
+
+    def sendText(self, to: str, content: str):
+        time.sleep(self.latency)
+        self.attempts += 1
+        if to in self.lid_only:
+            self.failed += 1
+            raise WAError(f"ERROR: no chat for {to}")
+        return True
+
+    def disconnect(self):
+        pass
+
+
+def inbound(phone: str, lid: str) -> Dict:
+    return {"data": {"isGroupMsg": False, "fromMe": False, "sender": {"phoneNumber": phone_jid(phone), "lid": lid_jid(lid)}}}
+
+
+async def send_all(wa_client: AsyncOpenWAClient, contacts: Dict[str, str], messages: int) -> float:
+    """`messages` alert rounds, each one message to every contact."""
+    started = time.perf_counter()
+    for _ in range(messages):
+        outbox = list(contacts.items())
+        random.shuffle(outbox)
+        await asyncio.gather(*[
+            wa_client.send_text(phone_jid(phone), "alert", fallback=lid_jid(lid)) for phone, lid in outbox
+        ])
+    return time.perf_counter() - started
+
+
+async def main(contacts_count: int, messages: int, migrated: float, send_latency: float):
+    random.seed(11)
+    contacts = {f"62812{i:08d}": f"{100000000000 + i}" for i in range(contacts_count)}
+    lid_only = {phone_jid(phone) for phone in random.sample(list(contacts), int(contacts_count * migrated))}
+    db_path = Path(tempfile.mkdtemp()) / "identity.db"
+
+    index = IdentityIndex(db=IdentityDB(db_path))
+    await index.load()
+    for phone, lid in contacts.items():
+        index.learn_from_message(inbound(phone, lid))
+
+    for label, address_book in (("no index", None), ("index", index)):
+        client = FakeSocketClient(send_latency, lid_only)
+        wa_client = AsyncOpenWAClient(client, max_workers=32, max_concurrency=32, address_book=address_book)
+        elapsed = await send_all(wa_client, contacts, messages)
+        sends = contacts_count * messages
+        print(f"{label:<9} {sends} sends: {client.attempts:5} attempts, {client.failed:5} failed first attempts, {elapsed:6.2f} s")
+        await wa_client.close()
+    # Only the first round can still miss
+    assert client.failed <= len(lid_only), client.failed
+    print(f"index metrics: {index.metrics()}")
+
+    # Persisted: a fresh index sends LID-only contacts straight to @lid
+    saved = await index.flush()
+    await index._db.close()
+    reloaded = IdentityIndex(db=IdentityDB(db_path))
+    started = time.perf_counter()
+    await reloaded.load()
+    print(f"reload: {saved} numbers saved, {len(reloaded)} loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for phone, lid in contacts.items():
+        first, _ = reloaded.order(phone_jid(phone), lid_jid(lid))
+        assert first == (lid_jid(lid) if phone_jid(phone) in lid_only else phone_jid(phone)), phone
+        assert reloaded.phone_for(lid_jid(lid)) == phone and reloaded.lid_for("0" + phone[2:]) == lid
+
+    # A LID moving to another number leaves the old number without it
+    phones: List[str] = list(contacts)
+    reloaded.learn(phones[1], contacts[phones[0]])
+    assert reloaded.lid_for(phones[0]) is None and reloaded.phone_for(contacts[phones[0]]) == phones[1]
+    await reloaded._db.close()
+    print("persistence, lookups and LID reassignment ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=4, help="alert rounds, one message per contact each")
+    parser.add_argument("--migrated", type=float, default=0.3, help="share of contacts only reachable on @lid")
+    parser.add_argument("--send-latency", type=float, default=0.01, help="seconds per OpenWA ack")
+    args = parser.parse_args()
+    asyncio.run(main(args.contacts, args.messages, args.migrated, args.send_latency))
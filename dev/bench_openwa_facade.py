@@ -0,0 +1,108 @@
+# Load test: HTTP latency of an unrelated endpoint while WhatsApp sends are
+# slow. A fake SocketClient blocks for --send-latency seconds per call, like
+# a slow OpenWA ack. The same sends run once directly on the event loop (old
+# behaviour) and once through AsyncOpenWAClient.
+#
+# Usage: python -m dev.bench_openwa_facade [--sends 40] [--send-latency 0.5] [--pings 200]
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from src.orin_wa_report.core.openwa import AsyncOpenWAClient
+
+HOST = "127.0.0.1"
+PORT = 18086
+BASE_URL = f"http://{HOST}:{PORT}"
+
+
+class FakeSocketClient:
+    """Stands in for SocketClient: every command blocks like a socket.io ack."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    def sendText(self, to: str, content: str):
+        time.sleep(self.latency)
+        self.sent += 1
+        return True
+
+    def disconnect(self):
+        pass
+
+
+def create_app(client: FakeSocketClient, wa_client: AsyncOpenWAClient) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/send/blocking")
+    async def send_blocking():
+        client.sendText("6281234567890@c.us", "hello")
+        return {"ok": True}
+
+    @app.post("/send/facade")
+    async def send_facade():
+        await wa_client.send_text("6281234567890@c.us", "hello")
+        return {"ok": True}
+
+    return app
+
+
+async def measure(http: httpx.AsyncClient, mode: str, sends: int, pings: int) -> List[float]:
+    send_tasks = [asyncio.create_task(http.post(f"{BASE_URL}/send/{mode}")) for _ in range(sends)]
+    await asyncio.sleep(0.05)
+    latencies = []
+    for _ in range(pings):
+        started = time.perf_counter()
+        await http.get(f"{BASE_URL}/ping")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*send_tasks)
+    return latencies
+
+
+def report(name: str, latencies: List[float]):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:<22} /ping p50={p50:8.1f} ms  p99={p99:8.1f} ms  max={latencies[-1] * 1000:8.1f} ms")
+
+
+async def main(sends: int, send_latency: float, pings: int):
+    client = FakeSocketClient(send_latency)
+    wa_client = AsyncOpenWAClient(client, max_workers=8, max_concurrency=8, timeout=send_latency * 10)
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(client, wa_client), host=HOST, port=PORT, log_level="warning"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        async with httpx.AsyncClient(timeout=None) as http:
+            report("idle", await measure(http, "facade", 0, pings))
+            report("blocking sendText", await measure(http, "blocking", sends, pings))
+            report("AsyncOpenWAClient", await measure(http, "facade", sends, pings))
+        print(f"sends={client.sent} send_latency={send_latency}s timeouts={wa_client.timeouts}")
+    finally:
+        server.should_exit = True
+        await server_task
+        await wa_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sends", type=int, default=40, help="concurrent sends per mode")
+    parser.add_argument("--send-latency", type=float, default=0.5, help="seconds per OpenWA call")
+    parser.add_argument("--pings", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.sends, args.send_latency, args.pings))
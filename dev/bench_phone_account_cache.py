@@ -0,0 +1,107 @@
+# Sender number -> accounts resolution on the inbound chat path against the
+# SQLite stand-in gateway (with a fixed per-request delay standing in for
+# the remote MySQL): the windowed query on every message, the cache, and the
+# cache after the startup warm-up. Also checks that the warm-up grouping
+# returns what the per-number query returns.
+#
+# Usage: python -m dev.bench_phone_account_cache [--senders 200] [--messages 8] [--delay 0.02]
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List
+
+from dev.fake_sqlite_gateway import FakeSQLiteGateway
+from src.orin_wa_report.core import utils
+from src.orin_wa_report.core.agent import accounts
+from src.orin_wa_report.core.cache import AsyncTTLCache
+from src.orin_wa_report.core.utils import DBGateway
+
+
+def populate(gateway: FakeSQLiteGateway, numbers: int) -> List[str]:
+    phone_numbers = [f"0812{i:08d}" for i in range(numbers)]
+    for i, phone_number in enumerate(phone_numbers):
+        parent_id = gateway.insert(
+            "users", name=f"Fleet {i}", api_token=f"tok-{i}", phone_number=phone_number,
+            wa_verified=int(i % 4 != 0), updated_at=f"2026-01-{1 + i % 28:02d} 10:00:00",
+        )
+        # Sub-accounts share the number; only the newest of a parent's group is kept
+        for j in range(i % 3):
+            gateway.insert(
+                "users", name=f"Fleet {i} sub {j}", api_token=f"tok-{i}-{j}", phone_number=phone_number,
+                parent_id=parent_id, updated_at=f"2026-02-{1 + j:02d} 10:00:00",
+            )
+        # Some numbers are shared by several independent accounts
+        if i % 5 == 0:
+            for j in range(4):
+                gateway.insert(
+                    "users", name=f"Other {i} {j}", api_token=f"tok-o{i}-{j}", phone_number=phone_number,
+                    updated_at=f"2026-03-{1 + j:02d} 10:00:00",
+                )
+    return phone_numbers
+
+
+async def inbound(phone_numbers: List[str], senders: int, messages: int) -> List[float]:
+    """`senders` chatty users sending `messages` each, interleaved and partly concurrent."""
+    chatty = random.sample(phone_numbers, senders)
+    inbox = [number for number in chatty for _ in range(messages)]
+    random.shuffle(inbox)
+    latencies: List[float] = []
+
+    async def one(number: str):
+        started = time.perf_counter()
+        rows = await accounts.get_phone_accounts(number)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert rows, number
+
+    for i in range(0, len(inbox), 20):
+        await asyncio.gather(*[one(number) for number in inbox[i:i + 20]])
+    return latencies
+
+
+async def main(senders: int, messages: int, delay: float):
+    random.seed(5)
+    gateway = FakeSQLiteGateway(delay=delay)
+    await gateway.start()
+    utils._DB_GATEWAY = DBGateway(db_base_url=gateway.base_url)
+    accounts.db_query_url = f"{gateway.base_url}/query"
+    phone_numbers = populate(gateway, 2000)
+    verified = [number for i, number in enumerate(phone_numbers) if i % 4 != 0]
+
+    # Warm-up grouping matches the windowed per-number query
+    cache = accounts._PHONE_ACCOUNT_CACHE = AsyncTTLCache(ttl=0, negative_ttl=0)
+    warmed = accounts.group_phone_accounts(gateway.rows(accounts.WARM_UP_QUERY))
+    assert set(warmed) == set(verified), len(warmed)
+    for number in random.sample(verified, 100):
+        expected = await accounts.get_phone_accounts(number)
+        assert [row.id for row in warmed[number]] == [row.id for row in expected], number
+
+    for label in ("no cache", "cache", "warmed cache"):
+        if label == "no cache":
+            accounts._PHONE_ACCOUNT_CACHE = AsyncTTLCache(ttl=0, negative_ttl=0)
+        else:
+            accounts._PHONE_ACCOUNT_CACHE = AsyncTTLCache(max_size=20000, ttl=300, negative_ttl=0)
+        if label == "warmed cache":
+            started = time.perf_counter()
+            count = await accounts.warm_phone_account_cache()
+            print(f"warm-up: {count} numbers in {(time.perf_counter() - started) * 1000:.0f} ms, one gateway request")
+        before = gateway.requests
+        latencies = sorted(await inbound(verified, senders, messages))
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"{label:<13} {len(latencies)} messages: {gateway.requests - before:5} gateway requests  "
+              f"p50={statistics.median(latencies):7.2f} ms  p99={p99:7.2f} ms")
+    print(f"cache metrics: {accounts._PHONE_ACCOUNT_CACHE.metrics()}")
+
+    await utils._DB_GATEWAY.close()
+    await gateway.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--senders", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=8, help="messages per sender")
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds added to every gateway request")
+    args = parser.parse_args()
+    asyncio.run(main(args.senders, args.messages, args.delay))
@@ -0,0 +1,133 @@
+# Drive the SendScheduler with a fake SocketClient and check that it keeps the
+# global and per-recipient rate caps, serves recipients round-robin so one
+# fleet owner's alert flood can't starve the others, and lets chat replies
+# jump ahead of queued bulk alerts. Then stalls one recipient's send (an
+# OpenWA call hanging until its timeout) and checks that chat replies to
+# other recipients still go out and that stop() waits for the stalled send.
+#
+# Usage: python -m dev.bench_send_scheduler [--flood 100] [--others 20]
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from src.orin_wa_report.core.send_scheduler import PRIORITY_CHAT, SendScheduler
+
+GLOBAL_RATE = 20.0
+GLOBAL_BURST = 5.0
+RECIPIENT_RATE = 4.0
+RECIPIENT_BURST = 2.0
+
+
+class FakeSocketClient:
+    """Records every sendText call with the time it was made."""
+    def __init__(self, latency: float = 0.002):
+        self.latency = latency
+        self.sent: List[Tuple[float, str, str]] = []
+
+    def sendText(self, to: str, content: str):
+        time.sleep(self.latency)
+        self.sent.append((time.monotonic(), to, content))
+        return True
+
+
+def max_in_window(timestamps: List[float], window: float) -> int:
+    best, start = 0, 0
+    for end, ts in enumerate(timestamps):
+        while ts - timestamps[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def main(flood: int, others: int):
+    client = FakeSocketClient()
+    scheduler = SendScheduler(
+        global_rate=GLOBAL_RATE,
+        global_burst=GLOBAL_BURST,
+        recipient_rate=RECIPIENT_RATE,
+        recipient_burst=RECIPIENT_BURST,
+    )
+
+    # One fleet owner floods the queue first, then everybody else gets one alert
+    futures = [
+        scheduler.submit("flood@c.us", lambda i=i: client.sendText("flood@c.us", f"alert {i}"))
+        for i in range(flood)
+    ]
+    futures += [
+        scheduler.submit(f"user{i}@c.us", lambda i=i: client.sendText(f"user{i}@c.us", "alert"))
+        for i in range(others)
+    ]
+    await asyncio.sleep(0.5)
+    chat_started = time.monotonic()
+    await scheduler.send(
+        "chat@c.us",
+        lambda: client.sendText("chat@c.us", "reply"),
+        priority=PRIORITY_CHAT,
+    )
+    chat_wait = time.monotonic() - chat_started
+    await asyncio.gather(*futures)
+    await scheduler.stop()
+
+    by_recipient: Dict[str, List[float]] = defaultdict(list)
+    for ts, to, _ in client.sent:
+        by_recipient[to].append(ts)
+    all_ts = [ts for ts, _, _ in client.sent]
+    started = all_ts[0]
+
+    # Rate caps: a one second window can hold at most rate + burst sends
+    global_peak = max_in_window(all_ts, 1.0)
+    recipient_peak = max(max_in_window(ts, 1.0) for ts in by_recipient.values())
+    assert global_peak <= GLOBAL_RATE + GLOBAL_BURST, global_peak
+    assert recipient_peak <= RECIPIENT_RATE + RECIPIENT_BURST, recipient_peak
+
+    # Fairness: the last of the other recipients is served long before the flood drains
+    others_done = max(by_recipient[f"user{i}@c.us"][0] for i in range(others)) - started
+    flood_done = by_recipient["flood@c.us"][-1] - started
+    assert others_done < flood_done / 4, (others_done, flood_done)
+
+    # Priority: the chat reply doesn't wait behind queued bulk sends
+    assert chat_wait < 1 / GLOBAL_RATE * 3, chat_wait
+
+    metrics = scheduler.metrics()
+    print(f"sent={metrics['sent']} failed={metrics['failed']} duration={all_ts[-1] - started:.1f}s")
+    print(f"global peak/s    : {global_peak} (cap {GLOBAL_RATE + GLOBAL_BURST:.0f})")
+    print(f"recipient peak/s : {recipient_peak} (cap {RECIPIENT_RATE + RECIPIENT_BURST:.0f})")
+    print(f"{others} other recipients all served after {others_done:.2f}s, flood drained after {flood_done:.2f}s")
+    print(f"chat reply waited {chat_wait * 1000:.1f} ms behind {flood} queued bulk alerts")
+    for name, queue in metrics["queues"].items():
+        print(f"{name:<5} wait p50={queue['wait_seconds_p50']}s p99={queue['wait_seconds_p99']}s")
+    assert metrics["depth"] == 0
+
+    # Per-recipient order: one send in flight per recipient
+    flood_sent = [content for _, to, content in client.sent if to == "flood@c.us"]
+    assert flood_sent == [f"alert {i}" for i in range(flood)], flood_sent[:5]
+
+    await stalled_send()
+
+
+async def stalled_send(stall: float = 2.0):
+    """A hanging send holds one slot, the others keep sending."""
+    scheduler = SendScheduler(global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, max_in_flight=4)
+    stalled = scheduler.submit("stuck@c.us", lambda: asyncio.sleep(stall, result="late"))
+    await asyncio.sleep(0.05)
+    started = time.monotonic()
+    await asyncio.gather(*[
+        scheduler.send(f"chat{i}@c.us", lambda: asyncio.sleep(0.01), priority=PRIORITY_CHAT) for i in range(5)
+    ])
+    replies = time.monotonic() - started
+    assert replies < stall / 2, replies
+    assert not stalled.done() and scheduler.metrics()["in_flight"] == 1
+    await scheduler.stop()
+    assert stalled.result() == "late"
+    print(f"5 chat replies sent in {replies * 1000:.0f} ms while one send stalled {stall:.0f}s; stop() waited for it")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flood", type=int, default=100, help="alerts queued for one recipient")
+    parser.add_argument("--others", type=int, default=20, help="recipients with one alert each")
+    args = parser.parse_args()
+    asyncio.run(main(args.flood, args.others))
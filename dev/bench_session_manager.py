@@ -0,0 +1,106 @@
+# SessionManager on the warm path: many chats each sending a stream of
+# messages (ensure_session + touch_session per message, like chat_response)
+# against a ChatDB that counts the reads and writes reaching SQLite. Then
+# checks that write-behind last_activity lands in the DB on flush and when
+# the inactivity timer ends a session (with shortened timeouts).
+#
+# Usage: python -m dev.bench_session_manager [--chats 200] [--messages 20]
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent import handler
+from src.orin_wa_report.core.agent.handler import ChatDB, SessionManager
+
+
+class CountingChatDB(ChatDB):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+        self.write_calls = 0
+
+    async def _read(self, fn):
+        self.reads += 1
+        return await super()._read(fn)
+
+    async def _write(self, fn):
+        self.write_calls += 1
+        return await super()._write(fn)
+
+
+async def main(chats: int, messages: int):
+    db = CountingChatDB(Path(tempfile.mkdtemp()) / "chat_sessions.db")
+    await db.initialize()
+    manager = SessionManager(db, flush_interval=3600)
+    manager.start()
+    phones = [f"62812{i:08d}" for i in range(chats)]
+
+    # Cold: first message of every chat reads the DB and creates the session
+    before_reads, before_writes = db.reads, db.write_calls
+    await asyncio.gather(*[manager.ensure_session(phone, f"{phone}@c.us", "x", client=None) for phone in phones])
+    print(f"cold: {chats} chats, {db.reads - before_reads} reads, {db.write_calls - before_writes} writes")
+
+    # Warm: the rest of the conversation
+    latencies: List[float] = []
+
+    async def chat(phone: str):
+        for _ in range(messages):
+            started = time.perf_counter()
+            await manager.ensure_session(phone, f"{phone}@c.us", "x", client=None)
+            await manager.touch_session(phone, client=None)
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0)
+
+    before_reads, before_writes = db.reads, db.write_calls
+    await asyncio.gather(*[chat(phone) for phone in phones])
+    reads, writes = db.reads - before_reads, db.write_calls - before_writes
+    latencies.sort()
+    print(f"warm: {chats * messages} messages, {reads} reads, {writes} writes, "
+          f"p50={statistics.median(latencies) * 1000:.0f} us  p99={latencies[int(len(latencies) * 0.99)] * 1000:.0f} us")
+    assert reads == 0 and writes == 0, (reads, writes)
+
+    # Write-behind: one write saves every touched session
+    entry = manager._sessions[phones[0]]
+    entry.last_activity += 30
+    before_writes = db.write_calls
+    saved = await manager.flush()
+    session = await db.get_session(entry.session_id)
+    assert saved == chats and db.write_calls - before_writes == 1, (saved, db.write_calls - before_writes)
+    assert session["last_activity"] == entry.last_activity, session
+    print(f"flush: {saved} sessions in one write")
+
+    # Inactivity end writes the in-memory last_activity together with the end
+    handler.INACTIVITY_WARNING_SECONDS, handler.INACTIVITY_END_SECONDS = 0.05, 0.1
+    entry = manager._sessions[phones[1]]
+    await db._write(lambda conn: conn.execute(
+        "UPDATE sessions SET last_activity = last_activity - 100 WHERE id = ?", (entry.session_id,)
+    ))
+    entry.last_activity = int(time.time()) - 1
+    manager._dirty[entry.session_id] = entry
+    manager._timers.schedule(time.time(), manager._on_inactivity_warning, entry, None)
+    await asyncio.sleep(0.3)
+    session = await db.get_session(entry.session_id)
+    assert phones[1] not in manager._sessions and session["status"] == "ended", session
+    assert session["last_activity"] == entry.last_activity, session
+    print("inactivity end saves last_activity ok")
+
+    await manager.stop()
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20, help="messages per chat after the first")
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.messages))
@@ -0,0 +1,101 @@
+# Startup recovery of SessionManager over a chat_sessions.db with 100k
+# session rows: most ended, some left active by the previous process, half
+# of those past their deadlines. Times SessionManager.recover() (one query,
+# one transaction for the expired ones, timers re-armed for the rest) and,
+# for comparison, ending as many sessions one end_session at a time.
+# Runs once with a share of the rows active and once with all of them.
+#
+# Usage: python -m dev.bench_session_recovery [--rows 100000] [--active 0.1,1.0]
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent import handler
+from src.orin_wa_report.core.agent.handler import ChatDB, SessionManager
+
+
+async def populate(db: ChatDB, rows: int, active: float) -> int:
+    """`rows` sessions over rows // 2 phones, `active` of them still marked active; returns how many should survive."""
+    now = int(time.time())
+    data = []
+    latest = {}  # phone -> (started_at, still within its deadlines) of its newest active row
+    phones = rows // 2
+    for i in range(rows):
+        phone = f"62812{i % phones:08d}"
+        if i < rows * active:
+            if i % 2:
+                started = now - random.randrange(60, handler.FORCED_SESSION_SECONDS // 2)
+                last = now - random.randrange(0, handler.INACTIVITY_WARNING_SECONDS)
+            else:
+                started = now - random.randrange(handler.FORCED_SESSION_SECONDS, 30 * 86400)
+                last = started + random.randrange(0, 600)
+            if phone not in latest or started > latest[phone][0]:
+                latest[phone] = (started, bool(i % 2))
+            data.append((f"s{i:08d}", phone, "x", started, last, "active", None))
+        else:
+            started = now - random.randrange(handler.FORCED_SESSION_SECONDS, 30 * 86400)
+            data.append((f"s{i:08d}", phone, "x", started, started + 600, "ended", started + 900))
+    await db._write(lambda conn: conn.executemany(
+        "INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status, ended_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        data,
+    ))
+    return sum(fresh for _, fresh in latest.values())
+
+
+async def count_active(db: ChatDB) -> int:
+    return await db._read(lambda conn: conn.execute("SELECT COUNT(*) FROM sessions WHERE status = 'active'").fetchone()[0])
+
+
+async def run(rows: int, active: float):
+    random.seed(7)
+    db = ChatDB(Path(tempfile.mkdtemp()) / "chat_sessions.db")
+    await db.initialize()
+    live = await populate(db, rows, active)
+
+    # Previous behaviour at best: each stale session ended on its own (then put back)
+    stale: List[str] = [row["id"] for row in await db.get_active_sessions()]
+    baseline = len(stale) - live
+    started = time.perf_counter()
+    for session_id in stale[:baseline]:
+        await db.end_session(session_id)
+    one_by_one = time.perf_counter() - started
+    await db._write(lambda conn: conn.execute(
+        "UPDATE sessions SET status = 'active', ended_at = NULL WHERE id IN (%s)" % ",".join("?" * baseline),
+        stale[:baseline],
+    ) if baseline else None)
+
+    manager = SessionManager(db, flush_interval=3600)
+    started = time.perf_counter()
+    result = await manager.recover()
+    elapsed = time.perf_counter() - started
+    remaining = await count_active(db)
+    assert result["recovered"] == live == len(manager._sessions) == remaining, (result, live, remaining)
+    assert len(manager._timers) == 2 * live, len(manager._timers)
+    print(f"{rows} rows, {result['active']:6} active: recover {elapsed * 1000:7.0f} ms "
+          f"({result['recovered']} re-registered, {result['ended']} ended in one transaction), "
+          f"ending them one by one {one_by_one * 1000:7.0f} ms")
+    await manager.stop()
+    await db.close()
+
+
+async def main(rows: int, fractions: List[float]):
+    for active in fractions:
+        await run(rows, active)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--active", default="0.1,1.0", help="comma separated shares of the rows still marked active")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, [float(f) for f in args.active.split(",")]))
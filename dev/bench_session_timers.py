@@ -0,0 +1,126 @@
+# 10k sessions with steady message traffic: cost of re-arming the
+# inactivity deadline per message with the previous pattern (cancel the
+# session's watcher task and create a new one) against SessionManager's
+# timer heap, then a scaled-down lifecycle run (timeouts in seconds instead
+# of minutes) checking that quiet sessions end on inactivity, chatty ones
+# stay open and everything is force-ended on time.
+#
+# Usage: python -m dev.bench_session_timers [--sessions 10000] [--messages 100000]
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# handler imports verify_wa, which reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core.agent import handler
+from src.orin_wa_report.core.agent.handler import ChatDB, SessionManager
+
+
+async def churn_tasks(sessions: int, messages: int):
+    """Previous pattern: two sleeping tasks per session, the inactivity one replaced on every message."""
+    async def watcher(seconds):
+        await asyncio.sleep(seconds)
+
+    inactivity = [asyncio.create_task(watcher(600)) for _ in range(sessions)]
+    forced = [asyncio.create_task(watcher(3600)) for _ in range(sessions)]
+    started = time.perf_counter()
+    for i in range(messages):
+        n = random.randrange(sessions)
+        inactivity[n].cancel()
+        inactivity[n] = asyncio.create_task(watcher(600))
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # let cancellations run like they would between messages
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    tasks = len(asyncio.all_tasks())
+    for task in inactivity + forced:
+        task.cancel()
+    await asyncio.gather(*inactivity, *forced, return_exceptions=True)
+    return elapsed, tasks
+
+
+async def churn_timers(db: ChatDB, sessions: int, messages: int):
+    manager = SessionManager(db, flush_interval=3600)
+    manager.start()
+    phones = [f"62812{i:08d}" for i in range(sessions)]
+    await asyncio.gather(*[manager.ensure_session(phone, f"{phone}@c.us", "x", client=None) for phone in phones])
+    started = time.perf_counter()
+    for i in range(messages):
+        await manager.ensure_session(random.choice(phones), "", "x", client=None)
+    elapsed = time.perf_counter() - started
+    tasks = len(asyncio.all_tasks())
+    heap = len(manager._timers)
+    await manager.stop()
+    return elapsed, tasks, heap
+
+
+async def lifecycle(db: ChatDB, sessions: int):
+    handler.INACTIVITY_WARNING_SECONDS, handler.INACTIVITY_END_SECONDS = 2, 3
+    handler.FORCED_SESSION_SECONDS, handler.FORCED_WARNING_BEFORE = 15, 1
+    manager = SessionManager(db, flush_interval=3600)
+    phones = [f"62899{i:08d}" for i in range(sessions)]
+    chatty, quiet = phones[: sessions // 2], phones[sessions // 2:]
+    await asyncio.gather(*[manager.ensure_session(phone, f"{phone}@c.us", "x", client=None) for phone in phones])
+    # Creating them takes seconds, start every inactivity clock from here
+    t0 = time.time()
+    for phone in phones:
+        await manager.touch_session(phone, client=None)
+    manager.start()
+
+    # Chatty sessions keep writing for 5 s, quiet ones never write again
+    while time.time() - t0 < 5:
+        for phone in chatty:
+            await manager.touch_session(phone, client=None)
+        await asyncio.sleep(0.25)
+    live = set(manager._sessions)
+    assert not live & set(quiet), len(live & set(quiet))
+    assert set(chatty) <= live, len(set(chatty) - live)
+    # Forced end 15 s after each started_at
+    last_started = max(entry.started_at for entry in manager._sessions.values())
+    await asyncio.sleep(max(0.0, last_started + 16 - time.time()))
+    assert not manager._sessions, len(manager._sessions)
+    ended = await db._read(lambda conn: conn.execute(
+        "SELECT COUNT(*) FROM sessions WHERE phone LIKE '62899%' AND status = 'ended'"
+    ).fetchone()[0])
+    assert ended == sessions, ended
+    print(f"lifecycle: {len(quiet)} quiet sessions ended on inactivity, {len(chatty)} chatty ones force-ended, "
+          f"{manager._timers.fired} timer callbacks")
+    await manager.stop()
+
+
+async def main(sessions: int, messages: int):
+    random.seed(7)
+    db = ChatDB(Path(tempfile.mkdtemp()) / "chat_sessions.db")
+    await db.initialize()
+
+    tracemalloc.start()
+    elapsed, tasks = await churn_tasks(sessions, messages)
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"task per session: {messages} messages in {elapsed * 1000:6.0f} ms "
+          f"({elapsed / messages * 1e6:5.1f} us each), {tasks} tasks alive, peak {peak / 1e6:5.1f} MB")
+
+    tracemalloc.reset_peak()
+    elapsed, tasks, heap = await churn_timers(db, sessions, messages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"timer heap:       {messages} messages in {elapsed * 1000:6.0f} ms "
+          f"({elapsed / messages * 1e6:5.1f} us each), {tasks} tasks alive, {heap} heap entries, peak {peak / 1e6:5.1f} MB")
+
+    await lifecycle(db, sessions)
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.messages))
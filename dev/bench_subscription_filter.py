@@ -0,0 +1,106 @@
+# Check the per-user alert subscription filter on 100k synthetic alerts and
+# compare it with the old per-row string split against user_alert_setting.
+#
+# Usage: python -m dev.bench_subscription_filter [--alerts 100000] [--users 5000]
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.orin_wa_report.core.db import SettingsDB
+
+ALERT_TYPES = [
+    "notif_speed_alert",
+    "notif_geofence_inside",
+    "notif_geofence_outside",
+    "notif_cut_off",
+    "notif_sleep",
+    "notif_online",
+    "notif_offline",
+    "expired_license",
+    "warning_expired_license",
+    "notif_unknown",
+]
+
+
+async def main(alerts: int, users: int):
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_db = SettingsDB(Path(tmp) / "settings.db")
+        await settings_db.initialize()
+
+        allowed = (await settings_db.get_notification_setting(
+            get_allowed_alert_type=True, include_required_alert_type=False,
+        )).get("value").split(sep=";")
+
+        # Every other user gets a personalised setting, the rest keep the default
+        for user_id in range(0, users, 2):
+            await settings_db.put_user_alert_setting(
+                user_id=user_id,
+                value={alert_type: random.random() < 0.5 for alert_type in allowed},
+            )
+
+        stored = {}
+        cursor = settings_db._conn.cursor()
+        cursor.execute("SELECT user_id, value FROM user_alert_setting")
+        for user_id, value in cursor.fetchall():
+            stored[user_id] = value
+
+        rows = [
+            {
+                "id": i,
+                "user_id": random.randrange(users),
+                "alert_type": random.choice(ALERT_TYPES),
+            }
+            for i in range(alerts)
+        ]
+
+        # Reference: split the stored setting string for every row
+        default_value = ";".join(allowed)
+        required = set(settings_db.required_alert_type)
+        started = time.perf_counter()
+        expected = [
+            row for row in rows
+            if row["alert_type"] in required
+            or (
+                row["alert_type"] in allowed
+                and row["alert_type"] in stored.get(row["user_id"], default_value).split(sep=";")
+            )
+        ]
+        naive_seconds = time.perf_counter() - started
+
+        subscriptions = settings_db.subscriptions
+        started = time.perf_counter()
+        filtered = [
+            row for row in rows
+            if subscriptions.allows(row["user_id"], row["alert_type"])
+        ]
+        index_seconds = time.perf_counter() - started
+
+        assert filtered == expected, "subscription index disagrees with user_alert_setting"
+
+        # Index survives a reload from disk
+        await settings_db.close()
+        reloaded = SettingsDB(Path(tmp) / "settings.db")
+        await reloaded.initialize()
+        assert all(
+            reloaded.subscriptions.allows(row["user_id"], row["alert_type"])
+            for row in filtered
+        ), "reloaded index disagrees"
+        await reloaded.close()
+
+        print(f"alerts={alerts} users={users} kept={len(filtered)}")
+        print(f"string split per row : {naive_seconds * 1000:8.1f} ms")
+        print(f"subscription index   : {index_seconds * 1000:8.1f} ms")
+        print(f"sql alert_type IN    : {settings_db.subscriptions.sql_alert_types()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.alerts, args.users))
@@ -0,0 +1,100 @@
+# Inbound messages from numbers without ORIN accounts, through the real
+# ChatBotHandler and conv_handler against the SQLite stand-in gateway:
+# spam numbers sending steadily plus one number flooding the bot. Counts
+# gateway requests with the unresolved sender cache and inbound rate limit
+# off and on, then checks that verifying a number clears it at once.
+#
+# Usage: python -m dev.bench_unresolved_senders [--spammers 100] [--messages 20] [--flood 500] [--delay 0.02]
+
+import argparse
+import asyncio
+import os
+import time
+
+# verify_wa reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from dev.fake_sqlite_gateway import FakeSQLiteGateway
+from src.orin_wa_report.core import rate_limit, utils
+from src.orin_wa_report.core.agent import accounts
+from src.orin_wa_report.core.agent.handler import register_conv_handler
+from src.orin_wa_report.core.agent.listener import ChatBotHandler
+from src.orin_wa_report.core.cache import AsyncTTLCache
+from src.orin_wa_report.core.development import verify_wa
+from src.orin_wa_report.core.openwa import AsyncSocketClient
+from src.orin_wa_report.core.rate_limit import SenderRateLimiter
+from src.orin_wa_report.core.utils import DBGateway
+
+
+class FakeClient(AsyncSocketClient):
+    """Only what ChatBotHandler needs: keeps the onAnyMessage callback."""
+    def __init__(self):
+        self.on_message = None
+
+    def onAnyMessage(self, fn):
+        self.on_message = fn
+
+
+def inbound(phone: str, lid: str, body: str = "halo") -> dict:
+    return {"data": {
+        "isGroupMsg": False, "fromMe": False, "body": body, "from": f"{lid}@lid",
+        "sender": {"phoneNumber": f"{phone}@c.us", "lid": f"{lid}@lid", "pushname": "x"},
+    }}
+
+
+async def run_traffic(client: FakeClient, spammers: int, messages: int, flood: int):
+    # Sent back to back, so past the burst the rate limit drops spam numbers too
+    for _ in range(messages):
+        await asyncio.gather(*[client.on_message(inbound(f"62899{i:07d}", f"9{i:011d}")) for i in range(spammers)])
+    # One number flooding the bot
+    await asyncio.gather(*[client.on_message(inbound("628770000001", "877000000001")) for _ in range(flood)])
+
+
+async def main(spammers: int, messages: int, flood: int, delay: float):
+    gateway = FakeSQLiteGateway(delay=delay, api_key=verify_wa.db_api_key)
+    await gateway.start()
+    utils._DB_GATEWAY = DBGateway(db_base_url=gateway.base_url)
+    accounts.db_query_url = verify_wa.db_query_url = f"{gateway.base_url}/query"
+
+    client = FakeClient()
+    register_conv_handler(ChatBotHandler(client), openai_client=None)
+    total = spammers * messages + flood
+
+    for label, unresolved_ttl, rate in (("off", 0, 0), ("on", 60, 0.5)):
+        accounts._PHONE_ACCOUNT_CACHE = AsyncTTLCache(ttl=300, negative_ttl=0)
+        accounts._UNRESOLVED_SENDER_CACHE = AsyncTTLCache(max_size=5000, ttl=unresolved_ttl, negative_ttl=0)
+        limiter = rate_limit._INBOUND_RATE_LIMITER = SenderRateLimiter(rate=rate, burst=10)
+        before = gateway.requests
+        started = time.perf_counter()
+        await run_traffic(client, spammers, messages, flood)
+        elapsed = time.perf_counter() - started
+        print(f"cache/limit {label:<3} {total} messages: {gateway.requests - before:5} gateway requests, "
+              f"{limiter.dropped:4} dropped by the rate limit, {elapsed:6.2f} s")
+    assert gateway.requests - before <= spammers + 10, gateway.requests - before
+    print(f"unresolved senders cached: {len(accounts._UNRESOLVED_SENDER_CACHE)} (numbers and LIDs)")
+
+    # A spam number registers and verifies: the next message looks it up again
+    phone, lid = "628990000000", "900000000000"
+    assert accounts.is_unresolved_sender(phone, lid)
+    user_id = gateway.insert("users", name="New", api_token="tok-new", phone_number="0" + phone[2:])
+    wa_key = await verify_wa.generate_wa_key()
+    gateway.db.execute("UPDATE users SET wa_key = :wa_key WHERE id = :id", {"wa_key": wa_key, "id": user_id})
+    await verify_wa.verify_wa_key_and_store_wa_number(wa_key=wa_key, wa_number=phone, wa_lid=lid)
+    assert not accounts.is_unresolved_sender(phone, lid) and not accounts.is_unresolved_sender(None, f"{lid}@lid")
+    rows = await accounts.get_phone_accounts("0" + phone[2:])
+    assert [row.id for row in rows] == [user_id], rows
+    print("verification clears the unresolved entry ok")
+
+    await utils._DB_GATEWAY.close()
+    await gateway.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spammers", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20, help="messages per spam number")
+    parser.add_argument("--flood", type=int, default=500, help="messages from the flooding number")
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds added to every gateway request")
+    args = parser.parse_args()
+    asyncio.run(main(args.spammers, args.messages, args.flood, args.delay))
@@ -0,0 +1,117 @@
+# Check that a restart in the middle of a digest window neither resends
+# alerts that already went out nor loses the ones held for the digest: the
+# cursor moves past held alerts, they are stored in the outbox, survive a
+# compaction of the sent rows and go back into a fresh coalescer.
+#
+# Usage: python -m dev.check_alert_restart
+
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+# api/utils imports modules that read these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from src.orin_wa_report.core import bulk_send, db
+from src.orin_wa_report.core.api import utils
+from src.orin_wa_report.core.api.alert_render import AlertCoalescer
+from src.orin_wa_report.core.api.alert_source import AlertSource
+from src.orin_wa_report.core.bulk_send import BulkSendJob
+from src.orin_wa_report.core.db import AlertOutboxDB, SettingsDB
+
+WINDOW = 30.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordingSender:
+    """Stands in for the BulkSender, keeps what would have been sent."""
+    def __init__(self):
+        self.sent: List[Dict] = []
+
+    def submit(self, messages: List[Dict], source=None) -> BulkSendJob:
+        self.sent.extend(messages)
+        return BulkSendJob(total=len(messages), source=source)
+
+
+class CheckAlertSource(AlertSource):
+    name = "check"
+
+
+def make_rows(ids) -> List[Dict]:
+    return [
+        {
+            "id": alert_id,
+            "user_id": 1,
+            "device_id": 10 + alert_id,
+            "alert_type": "notif_speed_alert",
+            "device_name": f"Truk {alert_id}",
+            "message": "Overspeed",
+            "wa_number": "6281234567890",
+            "wa_lid": "12816215965755",
+        }
+        for alert_id in ids
+    ]
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_db = db.SETTINGS_DB = SettingsDB(Path(tmp) / "settings.db")
+        await settings_db.initialize()
+        settings_db.subscriptions.set_allowed("notif_speed_alert")
+        outbox = db.ALERT_OUTBOX_DB = AlertOutboxDB(Path(tmp) / "outbox.db")
+        await outbox.initialize()
+        sender = bulk_send._BULK_SENDER = RecordingSender()
+
+        # First run: alert 1 goes out at once, 2 and 3 are held for the digest
+        clock = FakeClock()
+        source = CheckAlertSource()
+        coalescer = AlertCoalescer(window_seconds=WINDOW, clock=clock)
+        rows = source._advance(make_rows([1]))
+        await utils.dispatch_alerts(rows, source=source, coalescer=coalescer)
+        clock.now = 1.0
+        rows = source._advance(make_rows([2, 3]))
+        await utils.dispatch_alerts(rows, source=source, coalescer=coalescer)
+        assert [m["alert_id"] for m in sender.sent] == [1], sender.sent
+        assert await outbox.get_cursor(source.name) == 3
+        assert [row["id"] for row in await outbox.load_held()] == [2, 3]
+
+        # Alert 1 confirmed and compacted away before the restart
+        [stored] = await outbox.claim_pending(include_sending=True)
+        await outbox.mark_results([(stored["outbox_id"], None)])
+        assert await outbox.compact() == 1
+
+        # Restart: fresh source and coalescer, alert 4 arrives after the cursor
+        clock = FakeClock()
+        source = CheckAlertSource()
+        source.last_id = await outbox.get_cursor(source.name)
+        coalescer = AlertCoalescer(window_seconds=WINDOW, clock=clock)
+        assert await utils.restore_held_alerts(coalescer) == 2
+        rows = source._advance(make_rows([1, 2, 3, 4]))  # a source replaying old rows
+        assert [row["id"] for row in rows] == [4], rows
+        await utils.dispatch_alerts(rows, source=source, coalescer=coalescer)
+
+        alert_ids = [m["alert_id"] for m in sender.sent]
+        assert alert_ids == [1, 2], sender.sent
+        assert sender.sent[1]["message"].count("\n") == 3, sender.sent[1]  # header + alerts 2, 3, 4
+        assert await outbox.load_held() == []
+        print(f"restart inside a {WINDOW:.0f}s digest window: alert 1 sent once, "
+              f"held alerts 2-3 sent with 4 in one digest, nothing left held")
+
+        await outbox.close()
+        await settings_db.close()
+        db.ALERT_OUTBOX_DB = db.SETTINGS_DB = None
+        bulk_send._BULK_SENDER = None
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+# Exercise AsyncSocketClient against the local fake OpenWA server: many
+# concurrent acked calls on one connection, ERROR acks, call timeouts,
+# events dispatched on the running loop, and reconnecting after the server
+# goes away.
+#
+# Usage: python -m dev.check_async_socket_client [--calls 500]
+
+import argparse
+import asyncio
+import threading
+import time
+
+from dev.fake_openwa_server import FakeOpenWAServer
+from src.orin_wa_report.core.openwa import (
+    AsyncOpenWAClient,
+    AsyncSocketClient,
+    WAError,
+    WATimeoutError,
+)
+
+
+async def wait_until(predicate, timeout: float = 15.0):
+    started = time.monotonic()
+    while not predicate():
+        if time.monotonic() - started > timeout:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.05)
+
+
+async def main(calls: int):
+    server = FakeOpenWAServer(max_delay=0.2, api_key="test-key")
+    await server.start()
+    client = AsyncSocketClient(server.url, api_key="test-key", call_timeout=5, reconnect_base=0.2, reconnect_max=1.0)
+    await client.connect()
+    await wait_until(lambda: server.registered == 1)
+
+    # Multiplexed acks: results match their own call even though acks come back out of order
+    started = time.perf_counter()
+    results = await asyncio.gather(*[client.sendText(f"62{i}@c.us", f"msg {i}") for i in range(calls)])
+    elapsed = time.perf_counter() - started
+    assert results == [f"true_62{i}@c.us_msg {i}" for i in range(calls)]
+    assert client.in_flight == 0
+    print(f"{calls} concurrent sendText on one connection: {elapsed:.2f}s (each call waits up to 0.2s)")
+
+    # ERROR acks raise WAError, the facade falls back to the second address
+    try:
+        await client.sendText("invalid@c.us", "hi")
+        raise AssertionError("expected WAError")
+    except WAError:
+        pass
+    wa_client = AsyncOpenWAClient(client, max_concurrency=64, timeout=5)
+    assert await wa_client.send_text("invalid@c.us", "hi", fallback="123@lid") == "true_123@lid_hi"
+    print("ERROR ack -> WAError, lid fallback ok")
+
+    # Timeouts raise WATimeoutError without touching other calls
+    try:
+        await wa_client.call("sleep", 2, timeout=0.3)
+        raise AssertionError("expected WATimeoutError")
+    except WATimeoutError:
+        pass
+    assert await client.sendText("62@c.us", "after timeout") == "true_62@c.us_after timeout"
+    print("slow ack -> WATimeoutError")
+
+    # Events run on the loop thread, coroutine handlers included
+    loop_thread = threading.get_ident()
+    received = []
+
+    async def on_message(msg):
+        received.append((msg, threading.get_ident()))
+
+    client.onAnyMessage(on_message)
+    await client.fireEvent("onAnyMessage", {"data": {"body": "conv halo"}})
+    await wait_until(lambda: received)
+    assert received[0] == ({"data": {"body": "conv halo"}}, loop_thread)
+    print("event delivered on the event loop thread")
+
+    # Reconnect with backoff after the server restarts
+    await server.stop()
+    await wait_until(lambda: not client.io.connected)
+    await asyncio.sleep(1)
+    await server.start()
+    await wait_until(lambda: client.io.connected and server.registered == 2)
+    assert await client.sendText("62@c.us", "back") == "true_62@c.us_back"
+    print(f"reconnected after server restart (connections={server.connections})")
+
+    await wa_client.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls))
@@ -0,0 +1,176 @@
+# Check DBGateway.batch() and the flows moved onto it against the SQLite
+# stand-in gateway, once with batch support (one round trip per flow) and
+# once without (statements sent separately): token lookup, WhatsApp
+# verification and dummy user creation. Token lookups are checked with the
+# API token cache cleared (gateway requests per token) and warm (none).
+# Then batch failures against a scripted gateway: only a 404/405/422 without
+# results falls back, a 5xx or SQL error is raised without re-sending the
+# statements and without giving up batching, a short results list raises.
+#
+# Usage: python -m dev.check_db_gateway_batch
+
+import asyncio
+import functools
+import os
+
+import httpx
+
+# verify_wa reads these at import time
+os.environ.setdefault("SECRET_KEY", "dev-secret")
+os.environ.setdefault("ORIN_DB_API_KEY", "dev-key")
+
+from dev.fake_sqlite_gateway import FakeSQLiteGateway
+from src.orin_wa_report.core import utils
+from src.orin_wa_report.core.development import create_user, verify_wa
+from src.orin_wa_report.core.models import DBStatement, UserIdentityRow
+from src.orin_wa_report.core.utils import DBGateway, get_user_id_from_api_token
+
+
+async def check(batch: bool):
+    gateway = FakeSQLiteGateway(batch=batch, api_key=verify_wa.db_api_key)
+    await gateway.start()
+    db_gateway = utils._DB_GATEWAY = DBGateway(db_base_url=gateway.base_url)
+    verify_wa.db_query_url = f"{gateway.base_url}/mysql/development"
+    create_user.get_db_query_endpoint = functools.partial(utils.get_db_query_endpoint, db_base_url=gateway.base_url)
+    mode = "batch" if batch else "fallback"
+
+    parent_id = gateway.insert("users", name="Parent", api_token="tok-parent")
+    child_id = gateway.insert("users", name="Child", parent_id=parent_id, api_token="tok-child")
+    gateway.insert("user_tokens", user_id=child_id, api_token="tok-mobile", created_at="2026-01-01")
+
+    # Typed rows, results in statement order
+    before = gateway.requests
+    results = await db_gateway.batch([
+        DBStatement(query="SELECT id AS user_id, parent_id FROM users WHERE id = :id", params={"id": child_id}, row_model=UserIdentityRow),
+        DBStatement(query="SELECT COUNT(*) AS n FROM users"),
+    ])
+    assert results[0].rows == [UserIdentityRow(user_id=child_id, parent_id=parent_id)], results
+    assert results[1].rows == [{"n": 2}], results
+    assert gateway.requests - before == (1 if batch else 3), gateway.requests  # first fallback probes once
+
+    # Token lookup: users, then user_tokens. The token cache is cleared
+    # before each known token so every lookup goes to the gateway.
+    token_cache = utils.get_api_token_cache()
+    before = gateway.requests
+    for token, derive_parent_id, expected in (
+        ("tok-parent", True, parent_id),
+        ("tok-child", True, parent_id),
+        ("tok-child", False, child_id),
+        ("tok-mobile", False, child_id),
+    ):
+        token_cache.clear()
+        assert await get_user_id_from_api_token(gateway.base_url, token, derive_parent_id=derive_parent_id) == expected
+    try:
+        await get_user_id_from_api_token(gateway.base_url, "tok-unknown")
+        raise AssertionError("expected RuntimeError")
+    except RuntimeError:
+        pass
+    lookups = gateway.requests - before
+    assert lookups == (5 if batch else 10), lookups
+    print(f"[{mode}] token lookup: {lookups / 5:.0f} request(s) per token")
+
+    # Cached: the last known token and the unknown one again, no requests
+    before = gateway.requests
+    assert await get_user_id_from_api_token(gateway.base_url, "tok-mobile", derive_parent_id=False) == child_id
+    try:
+        await get_user_id_from_api_token(gateway.base_url, "tok-unknown")
+        raise AssertionError("expected RuntimeError")
+    except RuntimeError:
+        pass
+    assert gateway.requests == before, gateway.requests - before
+    token_cache.clear()
+    print(f"[{mode}] cached token lookup: 0 requests")
+
+    # Verification: another account with the number is unverified (also with
+    # a NULL wa_key), a bad key changes nothing
+    other_id = gateway.insert("users", name="Other", wa_key=None, wa_number="628111", wa_verified=1, wa_notif=1)
+    wa_key = await verify_wa.generate_wa_key()
+    gateway.db.execute("UPDATE users SET wa_key = :wa_key WHERE id = :id", {"wa_key": wa_key, "id": parent_id})
+    before = gateway.requests
+    await verify_wa.verify_wa_key_and_store_wa_number(wa_key=wa_key, wa_number="628111", wa_lid="1281")
+    # Without batch support each endpoint is probed once, then remembered
+    assert gateway.requests - before == (1 if batch else 1 + 3), gateway.requests - before
+    [parent] = gateway.rows("SELECT wa_number, wa_lid, wa_verified, wa_notif FROM users WHERE id = :id", {"id": parent_id})
+    assert parent == {"wa_number": "628111", "wa_lid": "1281", "wa_verified": 1, "wa_notif": 1}, parent
+    [other] = gateway.rows("SELECT wa_number, wa_verified FROM users WHERE id = :id", {"id": other_id})
+    assert other == {"wa_number": "", "wa_verified": 0}, other
+
+    # Verifying the same number again keeps the account verified
+    await verify_wa.verify_wa_key_and_store_wa_number(wa_key=wa_key, wa_number="628111", wa_lid="1281")
+    assert gateway.rows("SELECT wa_verified FROM users WHERE id = :id", {"id": parent_id}) == [{"wa_verified": 1}]
+
+    # A well-formed key nobody holds: the gated UPDATEs leave the other account alone
+    gateway.db.execute("UPDATE users SET wa_key = '' WHERE id = :id", {"id": parent_id})
+    gateway.db.execute("UPDATE users SET wa_number = '628222', wa_verified = 1 WHERE id = :id", {"id": other_id})
+    try:
+        await verify_wa.verify_wa_key_and_store_wa_number(wa_key=wa_key, wa_number="628222", wa_lid="")
+        raise AssertionError("expected RuntimeError")
+    except RuntimeError:
+        pass
+    assert gateway.rows("SELECT wa_verified FROM users WHERE id = :id", {"id": other_id}) == [{"wa_verified": 1}]
+    print(f"[{mode}] verification ok")
+
+    # Dummy user: the devices belong to the user inserted in the same batch
+    before = gateway.requests
+    result = await create_user.create_dummy_user(name="Batch", dummy_devices_count=3)
+    assert gateway.requests - before == (1 if batch else 1 + 2), gateway.requests - before
+    devices = gateway.rows("SELECT user_id FROM devices")
+    assert [device["user_id"] for device in devices] == [result["user_id"]] * 3, (devices, result)
+    print(f"[{mode}] dummy user {result['user_id']} with {len(devices)} devices")
+
+    await db_gateway.close()
+    await gateway.stop()
+
+
+async def check_failures():
+    answers = []  # (status, json) per request, in order
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.content)
+        status, body = answers.pop(0)
+        return httpx.Response(status, json=body)
+
+    db_gateway = DBGateway(db_base_url="http://gateway.test")
+    db_gateway._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    statements = [DBStatement(query="UPDATE users SET wa_verified = 0"), DBStatement(query="UPDATE users SET wa_verified = 1")]
+
+    async def expect_error(status, body, error):
+        answers.append((status, body))
+        before = len(seen)
+        try:
+            await db_gateway.batch(statements)
+            raise AssertionError(f"expected {error.__name__} for {status}")
+        except error:
+            pass
+        assert len(seen) - before == 1, "statements were re-sent"
+        assert db_gateway._batch_support.get(db_gateway.url) is not False, "batching was given up"
+
+    # Transient or statement errors on an endpoint not yet known to batch
+    await expect_error(503, {"detail": "unavailable"}, httpx.HTTPStatusError)
+    await expect_error(500, {"detail": "no such column"}, httpx.HTTPStatusError)
+    # Fewer results than statements
+    await expect_error(200, {"results": [{"rows": []}]}, RuntimeError)
+
+    answers.append((200, {"results": [{"rows": []}, {"rows": []}]}))
+    assert len(await db_gateway.batch(statements)) == 2
+    # Known to batch: even a 422 is an error now
+    await expect_error(422, {"detail": "bad params"}, httpx.HTTPStatusError)
+
+    # A gateway without the batch form: 422 once, then statements one by one
+    db_gateway._batch_support.clear()
+    answers += [(422, {"detail": "query is required"}), (200, {"rows": []}), (200, {"rows": []})]
+    assert len(await db_gateway.batch(statements, ordered=True)) == 2
+    assert db_gateway._batch_support[db_gateway.url] is False and not answers
+    await db_gateway.close()
+    print("batch failures: raised without re-sending, fallback only on 404/405/422 ok")
+
+
+async def main():
+    await check(batch=True)
+    await check(batch=False)
+    await check_failures()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
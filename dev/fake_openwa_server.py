@@ -0,0 +1,100 @@
+# A local socket.io server that speaks enough of the OpenWA (wa-automate)
+# socket protocol for client checks: every command event is acked with a
+# result after a configurable delay, "ERROR" results for invalid chat ids,
+# and a fireEvent command that pushes an event back to the client.
+#
+# Usage: python -m dev.fake_openwa_server [--port 18087]
+
+import argparse
+import asyncio
+import random
+from typing import Dict, List
+
+import socketio
+import uvicorn
+
+HOST = "127.0.0.1"
+PORT = 18087
+
+
+class FakeOpenWAServer:
+    """
+    Commands (payload is {"args": [...]}, like SocketClient sends):
+      sendText(to, content)      -> "true_<to>_<content>", "ERROR: ..." if `to` starts with "invalid"
+      sleep(seconds)             -> acks after `seconds`
+      fireEvent(event, data)     -> emits `event` with `data` to the caller, acks True
+      anything else              -> echoes the args back
+    Commands wait a random 0..max_delay seconds first so acks come back out of order.
+    """
+    def __init__(self, host: str = HOST, port: int = PORT, max_delay: float = 0.2, api_key: str | None = None):
+        self.host = host
+        self.port = port
+        self.max_delay = max_delay
+        self.api_key = api_key
+        self.calls: List[Dict] = []
+        self.registered = 0
+        self.connections = 0
+        self.sio = socketio.AsyncServer(async_mode="asgi")
+        self._server: uvicorn.Server | None = None
+        self._task: asyncio.Task | None = None
+
+        @self.sio.event
+        async def connect(sid, environ, auth):
+            if self.api_key and (auth or {}).get("apiKey") != self.api_key:
+                return False
+            self.connections += 1
+
+        @self.sio.on("register_ev")
+        async def register_ev(sid, *args):
+            self.registered += 1
+
+        @self.sio.on("*")
+        async def command(event, sid, data):
+            args = (data or {}).get("args", [])
+            self.calls.append({"command": event, "args": args})
+            await asyncio.sleep(random.uniform(0, self.max_delay))
+            if event == "sendText":
+                to, content = args[0], args[1]
+                if str(to).startswith("invalid"):
+                    return f"ERROR: invalid chat id {to}"
+                return f"true_{to}_{content}"
+            if event == "sleep":
+                await asyncio.sleep(float(args[0]))
+                return True
+            if event == "fireEvent":
+                await self.sio.emit(args[0], args[1], to=sid)
+                return True
+            return args
+
+    async def start(self):
+        self._server = uvicorn.Server(uvicorn.Config(
+            socketio.ASGIApp(self.sio), host=self.host, port=self.port, log_level="warning"
+        ))
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._server.force_exit = True
+            await self._task
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+
+async def main(port: int):
+    server = FakeOpenWAServer(port=port)
+    await server.start()
+    print(f"Fake OpenWA server on {server.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(main(args.port))
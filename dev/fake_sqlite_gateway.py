@@ -0,0 +1,153 @@
+# A local stand-in for the DB query gateway backed by an in-memory SQLite
+# database with the users, user_tokens and devices columns the app touches.
+# It speaks the gateway protocol ({"query", "params", "api_key"} ->
+# {"rows", "last_insert_id"}) and, unless started with batch=False, the
+# batch form ({"statements": [...]} -> {"results": [...]}) in one transaction.
+#
+# Usage: python -m dev.fake_sqlite_gateway [--port 18088] [--no-batch]
+
+import argparse
+import asyncio
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+HOST = "127.0.0.1"
+PORT = 18088
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER,
+    name TEXT, email TEXT, password TEXT,
+    created_at TEXT, updated_at TEXT, deleted_at TEXT,
+    api_token TEXT, verified INTEGER DEFAULT 0,
+    account_type TEXT, license_type TEXT,
+    google INTEGER DEFAULT 0, facebook INTEGER DEFAULT 0, has_tms INTEGER DEFAULT 0,
+    wa_key TEXT DEFAULT '', wa_notif INTEGER DEFAULT 0, wa_number TEXT DEFAULT '',
+    wa_verified INTEGER DEFAULT 0, wa_lid TEXT DEFAULT '', phone_number TEXT
+);
+CREATE TABLE user_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, api_token TEXT, created_at TEXT
+);
+CREATE TABLE devices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, device_type_id INTEGER, device_sn TEXT, device_name TEXT,
+    gsm TEXT, status TEXT, created_at TEXT, updated_at TEXT, deleted_at TEXT
+);
+"""
+
+
+class FakeSQLiteGateway:
+    """
+    `requests` counts HTTP requests and `statements` every statement run,
+    so callers can check how many round trips a flow took. Writes need
+    `api_key` when one is set, like the real gateway. `delay` adds a fixed
+    wait to every request to stand in for the network and MySQL time.
+    """
+    def __init__(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        batch: bool = True,
+        api_key: str | None = None,
+        delay: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.batch = batch
+        self.api_key = api_key
+        self.delay = delay
+        self.requests = 0
+        self.statements = 0
+        self.db = sqlite3.connect(":memory:", isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.create_function("NOW", 0, lambda: datetime.now().isoformat(sep=" ", timespec="seconds"))
+        self.db.executescript(SCHEMA)
+        self._server: uvicorn.Server | None = None
+        self._task: asyncio.Task | None = None
+
+        self.app = FastAPI()
+        self.app.add_api_route("/query", self.handle, methods=["POST"])
+        self.app.add_api_route("/mysql/{name}", self.handle, methods=["POST"])
+
+    def _run(self, query: str, params: Dict, api_key: str | None) -> Dict:
+        self.statements += 1
+        # MySQL habits the app's queries carry
+        query = re.sub(r";\s*COMMIT\s*;?\s*$", ";", query.strip(), flags=re.I)
+        if self.api_key and not query.lstrip().upper().startswith("SELECT") and api_key != self.api_key:
+            raise PermissionError("api_key required for writes")
+        cursor = self.db.execute(query, params or {})
+        rows = [dict(row) for row in cursor.fetchall()]
+        return {"rows": rows, "last_insert_id": cursor.lastrowid or None}
+
+    async def handle(self, request: Request, name: str = ""):
+        self.requests += 1
+        data = await request.json()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        api_key = data.get("api_key")
+        try:
+            if "statements" in data:
+                if not self.batch:
+                    return JSONResponse({"detail": "query is required"}, status_code=422)
+                results: List[Dict] = []
+                self.db.execute("BEGIN")
+                try:
+                    for statement in data["statements"]:
+                        results.append(self._run(statement["query"], statement.get("params"), api_key))
+                    self.db.execute("COMMIT")
+                except Exception:
+                    self.db.execute("ROLLBACK")
+                    raise
+                return {"results": results}
+            return self._run(data["query"], data.get("params"), api_key)
+        except PermissionError as e:
+            return JSONResponse({"detail": str(e)}, status_code=403)
+        except sqlite3.Error as e:
+            return JSONResponse({"detail": str(e)}, status_code=500)
+
+    def insert(self, table: str, **values) -> int:
+        columns = ", ".join(values)
+        placeholders = ", ".join(f":{column}" for column in values)
+        return self.db.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", values).lastrowid
+
+    def rows(self, query: str, params: Dict | None = None) -> List[Dict]:
+        return [dict(row) for row in self.db.execute(query, params or {}).fetchall()]
+
+    async def start(self):
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning"))
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            await self._task
+            self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+async def main(port: int, batch: bool):
+    gateway = FakeSQLiteGateway(port=port, batch=batch)
+    await gateway.start()
+    print(f"Fake SQLite gateway on {gateway.base_url} (batch={batch})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--no-batch", action="store_true", help="answer batch requests like a gateway without batch support")
+    args = parser.parse_args()
+    asyncio.run(main(args.port, not args.no_batch))
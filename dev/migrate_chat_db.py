@@ -0,0 +1,247 @@
+# Converts a chat_sessions.db with the original message layout (hex text
+# ids, sender names, "{}" metadata) to the compact one of chat_storage.py.
+# The bulk copy runs in short transactions while the bot keeps using the
+# file, the swap (remaining rows, then the old tables replaced) is one
+# transaction; without --swap it is left to ChatDB on the next start.
+# Prints rows/s, the live DB size and tail read / insert latency before
+# and after.
+#
+# --create-legacy N first writes a synthetic original-layout DB with N
+# messages at PATH; --writer keeps an old-layout writer adding sessions
+# and messages during the copy, to check nothing written meanwhile is lost.
+#
+# Usage: python -m dev.migrate_chat_db PATH [--swap] [--batch-size 5000] [--pause 0.005]
+#        [--compression zlib] [--compress-threshold 0] [--keep-uuids]
+#        [--create-legacy 1000000] [--writer]
+
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from src.orin_wa_report.core.agent.chat_storage import (
+    MessageCodec,
+    live_bytes,
+    migrate_chat_db,
+    needs_migration,
+    sender_name,
+)
+
+LEGACY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        phone TEXT NOT NULL,
+        user_name TEXT,
+        started_at INTEGER NOT NULL,
+        last_activity INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'active',
+        ended_at INTEGER,
+        metadata TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_phone ON sessions(phone);
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+    CREATE TABLE IF NOT EXISTS messages (
+        id TEXT PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        body TEXT,
+        timestamp INTEGER NOT NULL,
+        metadata TEXT,
+        FOREIGN KEY(session_id) REFERENCES sessions(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages(session_id, timestamp);
+"""
+
+LEGACY_TAIL_SQL = (
+    "SELECT id, sender, body, timestamp, metadata FROM messages WHERE session_id = ? "
+    "ORDER BY timestamp DESC, rowid DESC LIMIT 10"
+)
+COMPACT_TAIL_SQL = (
+    "SELECT id, sender, body, timestamp, metadata, uuid FROM messages "
+    "WHERE session_pk = (SELECT pk FROM sessions WHERE id = ?) ORDER BY timestamp DESC, id DESC LIMIT 10"
+)
+
+REPORT_LINE = "Laporan kendaraan B {plate}: jarak tempuh {km} km, {stops} kali berhenti, kecepatan maksimum {speed} km/j. "
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def fake_body(i: int) -> str:
+    if i % 2 == 0:
+        return random.choice(["ok", "laporan hari ini", f"berapa jarak tempuh mobil B {i % 9000} kemarin?", "terima kasih"])
+    # bot replies, every fifth a long vehicle report
+    if i % 10 == 1:
+        return "".join(
+            REPORT_LINE.format(plate=random.randrange(9000), km=random.randrange(500), stops=random.randrange(40), speed=random.randrange(140))
+            for _ in range(random.randrange(5, 30))
+        )
+    return f"Baik, berikut ringkasan untuk kendaraan B {i % 9000}: semua unit aktif dan tidak ada peringatan baru."
+
+
+def create_legacy(path: Path, messages: int, per_session: int = 40):
+    random.seed(7)
+    conn = connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    now = int(time.time()) - 90 * 86400
+    started = time.perf_counter()
+    sessions, rows = [], []
+    for n in range(0, messages, per_session):
+        session_id = uuid.uuid4().hex
+        begin = now + n * 10
+        count = min(per_session, messages - n)
+        sessions.append((session_id, f"62812{random.randrange(20000):08d}", f"User {n}", begin, begin + count * 5, "ended"))
+        rows += [
+            (uuid.uuid4().hex, session_id, "user" if i % 2 == 0 else "bot", fake_body(i), begin + i * 5, json.dumps({}))
+            for i in range(count)
+        ]
+        if len(rows) >= 50000:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, ?, ?, ?, ?, ?)", sessions)
+            conn.executemany("INSERT INTO messages (id, session_id, sender, body, timestamp, metadata) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+            sessions, rows = [], []
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, ?, ?, ?, ?, ?)", sessions)
+    conn.executemany("INSERT INTO messages (id, session_id, sender, body, timestamp, metadata) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("COMMIT")
+    conn.close()
+    print(f"created {messages} legacy messages in {time.perf_counter() - started:.1f} s")
+
+
+def legacy_writer(path: Path, stop: threading.Event, written: list, touched: dict):
+    """The old app during the copy: new sessions and messages, activity on old sessions."""
+    conn = connect(path)
+    old_sessions = [row[0] for row in conn.execute("SELECT id FROM sessions ORDER BY random() LIMIT 100")]
+    while not stop.is_set():
+        now = int(time.time())
+        session_id = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, '6281299999999', 'live', ?, ?, 'active')",
+            (session_id, now, now),
+        )
+        for i in range(5):
+            conn.execute(
+                "INSERT INTO messages (id, session_id, sender, body, timestamp, metadata) VALUES (?, ?, ?, ?, ?, '{}')",
+                (uuid.uuid4().hex, session_id, "user" if i % 2 == 0 else "bot", f"live {i}", now),
+            )
+        old = random.choice(old_sessions)
+        conn.execute("UPDATE sessions SET last_activity = ? WHERE id = ?", (now, old))
+        conn.execute("COMMIT")
+        touched[old] = now
+        written.append(session_id)
+        time.sleep(0.01)
+    conn.close()
+
+
+def tails(conn: sqlite3.Connection, sql: str, session_ids: list, decode) -> tuple:
+    """Tail reads of `session_ids`: (p50 us, p99 us, {session_id: [(sender, body, timestamp), ...]})."""
+    latencies, content = [], {}
+    for session_id in session_ids:
+        started = time.perf_counter()
+        content[session_id] = [decode(row) for row in conn.execute(sql, (session_id,)).fetchall()]
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99)], content
+
+
+def insert_rate(conn: sqlite3.Connection, sql: str, make_row, n: int = 2000) -> float:
+    """Single-message inserts per second (one savepoint, rolled back at the end)."""
+    conn.execute("SAVEPOINT rate")
+    started = time.perf_counter()
+    for i in range(n):
+        conn.execute(sql, make_row(i))
+    elapsed = time.perf_counter() - started
+    conn.execute("ROLLBACK TO rate")
+    conn.execute("RELEASE rate")
+    return n / elapsed
+
+
+def main(args):
+    path = Path(args.path)
+    if args.create_legacy:
+        if path.exists():
+            raise SystemExit(f"{path} exists, --create-legacy writes a new DB")
+        create_legacy(path, args.create_legacy)
+
+    conn = connect(path)
+    if not needs_migration(conn):
+        raise SystemExit(f"{path} already has the compact layout")
+    codec = MessageCodec(compression=args.compression, threshold=args.compress_threshold)
+    bytes_before = live_bytes(conn)
+    sample = [row[0] for row in conn.execute("SELECT id FROM sessions ORDER BY random() LIMIT 2000")]
+    p50, p99, before = tails(conn, LEGACY_TAIL_SQL, sample, lambda r: (r[1], r[2], r[3]))
+    print(f"before: {bytes_before / 2**20:8.1f} MiB live, tail p50={p50:5.1f} us p99={p99:6.1f} us, "
+          f"{insert_rate(conn, 'INSERT INTO messages (id, session_id, sender, body, timestamp, metadata) VALUES (?, ?, ?, ?, ?, ?)', lambda i: (uuid.uuid4().hex, sample[0], 'bot', 'ok', i, '{}')):6.0f} inserts/s")
+
+    stop, written, touched = threading.Event(), [], {}
+    writer = threading.Thread(target=legacy_writer, args=(path, stop, written, touched)) if args.writer else None
+    if writer:
+        writer.start()
+
+    def progress(report):
+        if report["messages"] and report["messages"] % (args.batch_size * 50) == 0:
+            print(f"  copied {report['messages']} messages")
+
+    report = migrate_chat_db(
+        conn, codec=codec, message_uuids=args.keep_uuids, batch_size=args.batch_size, pause=args.pause,
+        swap=False, progress=progress,
+    )
+    if writer:
+        stop.set()
+        writer.join()
+        print(f"old-layout writer added {len(written)} sessions during the copy")
+    print(f"online copy: {report['sessions']} sessions, {report['messages']} messages in {report['copy_seconds']} s "
+          f"({report['messages'] / max(report['copy_seconds'], 1e-9):.0f} messages/s)")
+    if not (args.swap or writer):
+        print("copy done, ChatDB swaps the tables on its next start (or rerun with --swap)")
+        return
+
+    legacy_count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    report = migrate_chat_db(conn, codec=codec, message_uuids=args.keep_uuids, batch_size=args.batch_size, swap=True)
+    print(f"swap: {report['messages']} more messages, {report['sessions_resynced']} sessions updated, "
+          f"{report['swap_seconds']} s in one transaction, {report['orphans']} orphan messages dropped")
+    migrated = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    assert migrated == legacy_count - report["orphans"], (migrated, legacy_count)
+    for session_id in written:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE session_pk = (SELECT pk FROM sessions WHERE id = ?)", (session_id,)
+        ).fetchone()[0] == 5, session_id
+    for session_id, last_activity in touched.items():
+        assert conn.execute("SELECT last_activity FROM sessions WHERE id = ?", (session_id,)).fetchone()[0] == last_activity
+
+    p50, p99, after = tails(
+        conn, COMPACT_TAIL_SQL, sample, lambda r: (sender_name(conn, r[1]), codec.decode_text(r[2]), r[3])
+    )
+    assert after == before, "tails differ after the migration"
+    print(f"after:  {live_bytes(conn) / 2**20:8.1f} MiB live, tail p50={p50:5.1f} us p99={p99:6.1f} us, "
+          f"{insert_rate(conn, 'INSERT INTO messages (session_pk, sender, body, timestamp, metadata, uuid) VALUES ((SELECT pk FROM sessions WHERE id = ?), ?, ?, ?, ?, ?)', lambda i: (sample[0], 2, 'ok', i, None, None)):6.0f} inserts/s")
+    print(f"{migrated} messages, tails of {len(sample)} sessions identical; "
+          f"{1 - report['bytes_after'] / bytes_before:.0%} smaller "
+          "(free pages are reused, VACUUM to shrink the file)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="chat_sessions.db to convert")
+    parser.add_argument("--swap", action="store_true", help="replace the old tables now, with the bot stopped")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per copy transaction")
+    parser.add_argument("--pause", type=float, default=0.005, help="seconds between copy transactions, lets the bot write")
+    parser.add_argument("--compression", default="zlib", choices=["zlib", "zstd"])
+    parser.add_argument("--compress-threshold", type=int, default=0, help="compress bodies longer than this many bytes, 0 off")
+    parser.add_argument("--keep-uuids", action="store_true", help="keep the hex message ids in messages.uuid")
+    parser.add_argument("--create-legacy", type=int, default=0, metavar="N", help="first create an original-layout DB with N messages")
+    parser.add_argument("--writer", action="store_true", help="write old-layout rows during the copy (implies --swap)")
+    main(parser.parse_args())
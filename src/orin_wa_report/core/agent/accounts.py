@@ -0,0 +1,244 @@
+"""
+Phone number -> ORIN accounts for the inbound chat path.
+
+Every inbound message needs the api_tokens of the accounts registered on the
+sender's number before the bot can answer. The lookup is a windowed query
+over `users`, so results are kept in an AsyncTTLCache keyed by the local
+phone number (08...). Concurrent messages from one number share a single
+query, entries expire after `ttl` and the least recently used numbers are
+evicted beyond `max_size`. `warm_phone_account_cache()` optionally preloads
+every number that has a wa_verified account.
+
+Senders with no account at all (spam, unregistered numbers) are kept in a
+separate, smaller cache of unresolved phone numbers and LIDs for a short
+`ttl`, so repeated messages from them skip the query. Verifying a number
+(`forget_unresolved_sender`) drops it from both caches at once.
+"""
+
+import os
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+from src.orin_wa_report.core.cache import AsyncTTLCache
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.identity import local_phone_number, normalize_phone, strip_jid
+from src.orin_wa_report.core.logger import get_logger
+from src.orin_wa_report.core.models import DBStatement, PhoneAccountRow
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+logger = get_logger(__name__, service="Agent")
+
+APP_STAGE = os.getenv("APP_STAGE", "development")
+db_query_url = get_db_query_endpoint(name=APP_STAGE)
+
+# Max 3 users per question referred
+MAX_API_TOKEN_USERS = 3
+
+PHONE_ACCOUNTS_QUERY = f"""
+SELECT
+    id,
+    name,
+    api_token,
+    wa_number
+FROM (
+    SELECT
+        id,
+        name,
+        api_token,
+        wa_number,
+        updated_at,
+        ROW_NUMBER() OVER (
+            PARTITION BY (
+                CASE
+                    WHEN parent_id IS NOT NULL AND parent_id != 0
+                    -- Group by parent_id if it exists
+                    THEN CAST(parent_id AS CHAR)
+                    -- Otherwise, group by unique ID so it isn't filtered
+                    ELSE CAST(id AS CHAR)
+                END
+            )
+            ORDER BY updated_at DESC
+        ) as row_num
+    FROM users
+    WHERE
+        (
+            phone_number = :local_phone_number
+        )
+        AND deleted_at IS NULL
+) AS filtered_users
+WHERE row_num = 1
+ORDER BY updated_at DESC
+LIMIT {MAX_API_TOKEN_USERS};
+"""
+# NOTE: TEMPORARILY REMOVE RULE TO BE VERIFIED
+# AND wa_verified = 1
+
+# Every account sharing a number with a wa_verified account, grouped like
+# PHONE_ACCOUNTS_QUERY in Python
+WARM_UP_QUERY = """
+SELECT
+    id,
+    parent_id,
+    name,
+    api_token,
+    wa_number,
+    phone_number,
+    updated_at
+FROM users
+WHERE
+    deleted_at IS NULL
+    AND phone_number IN (
+        SELECT phone_number FROM (
+            SELECT DISTINCT phone_number
+            FROM users
+            WHERE wa_verified = 1 AND deleted_at IS NULL AND phone_number IS NOT NULL AND phone_number != ''
+        ) AS verified_numbers
+    )
+"""
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_PHONE_ACCOUNT_CACHE: Optional[AsyncTTLCache] = None
+_UNRESOLVED_SENDER_CACHE: Optional[AsyncTTLCache] = None
+
+
+def get_phone_account_cache() -> AsyncTTLCache:
+    global _PHONE_ACCOUNT_CACHE
+    if _PHONE_ACCOUNT_CACHE is None:
+        phone_account_cache_config: Dict = get_config_data().get("phone_account_cache") or {}
+        _PHONE_ACCOUNT_CACHE = AsyncTTLCache(
+            max_size=phone_account_cache_config.get("max_size", 20000),
+            ttl=phone_account_cache_config.get("ttl", 300.0),
+            # Unknown numbers are not cached here, every message asks again
+            negative_ttl=0,
+        )
+    return _PHONE_ACCOUNT_CACHE
+
+
+def get_unresolved_sender_cache() -> AsyncTTLCache:
+    global _UNRESOLVED_SENDER_CACHE
+    if _UNRESOLVED_SENDER_CACHE is None:
+        unresolved_sender_config: Dict = get_config_data().get("unresolved_sender_cache") or {}
+        _UNRESOLVED_SENDER_CACHE = AsyncTTLCache(
+            max_size=unresolved_sender_config.get("max_size", 5000),
+            ttl=unresolved_sender_config.get("ttl", 60.0),
+            negative_ttl=0,
+        )
+    return _UNRESOLVED_SENDER_CACHE
+
+
+def _unresolved_sender_keys(phone_number: Optional[str], lid_number: Optional[str]) -> List[tuple]:
+    keys = []
+    phone_number = normalize_phone(phone_number)
+    if phone_number:
+        keys.append(("phone", phone_number))
+    lid_number = strip_jid(lid_number)
+    if lid_number:
+        keys.append(("lid", lid_number))
+    return keys
+
+
+def is_unresolved_sender(phone_number: Optional[str], lid_number: Optional[str]) -> bool:
+    """True if the number or LID recently turned out to have no accounts."""
+    cache = get_unresolved_sender_cache()
+    for key in _unresolved_sender_keys(phone_number, lid_number):
+        found, _ = cache.get(key)
+        if found:
+            return True
+    return False
+
+
+def mark_unresolved_sender(phone_number: Optional[str], lid_number: Optional[str]):
+    cache = get_unresolved_sender_cache()
+    for key in _unresolved_sender_keys(phone_number, lid_number):
+        cache.set(key, True)
+
+
+def forget_unresolved_sender(phone_number: Optional[str], lid_number: Optional[str]):
+    """A number was just verified: look its accounts up again on the next message."""
+    cache = get_unresolved_sender_cache()
+    for key in _unresolved_sender_keys(phone_number, lid_number):
+        cache.invalidate(key)
+    phone_number = normalize_phone(phone_number)
+    if phone_number:
+        get_phone_account_cache().invalidate(local_phone_number(phone_number))
+
+
+async def get_phone_accounts(local_phone_number: str) -> List[PhoneAccountRow]:
+    """Accounts registered on a number (at most one per parent account, newest first)."""
+    async def load() -> Optional[List[PhoneAccountRow]]:
+        result = await get_db_gateway().execute(
+            DBStatement(
+                query=PHONE_ACCOUNTS_QUERY,
+                params={"local_phone_number": str(local_phone_number)},
+                row_model=PhoneAccountRow,
+            ),
+            url=db_query_url,
+        )
+        return result.rows or None
+
+    return await get_phone_account_cache().get_or_load(local_phone_number, load) or []
+
+
+def invalidate_phone_accounts_of_user(user_id: int) -> int:
+    """Forget the cached numbers that list `user_id` among their accounts."""
+    user_id = int(user_id)
+    return get_phone_account_cache().invalidate_where(
+        lambda key, rows: rows is not None and any(row.id == user_id for row in rows)
+    )
+
+
+def _updated_at_key(value: Any) -> float:
+    """Sortable updated_at, the gateway may send ISO or RFC 1123 strings."""
+    if not value:
+        return 0.0
+    if isinstance(value, datetime):
+        return value.timestamp()
+    for parse in (datetime.fromisoformat, parsedate_to_datetime):
+        try:
+            return parse(str(value)).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return 0.0
+
+
+def group_phone_accounts(rows: List[Dict]) -> Dict[str, List[PhoneAccountRow]]:
+    """PHONE_ACCOUNTS_QUERY for many numbers at once, over WARM_UP_QUERY rows."""
+    by_number: Dict[str, Dict[str, Dict]] = {}
+    for row in rows:
+        parent_id = row.get("parent_id")
+        group = str(parent_id) if parent_id else str(row["id"])
+        newest = by_number.setdefault(row["phone_number"], {})
+        if group not in newest or _updated_at_key(row.get("updated_at")) > _updated_at_key(newest[group].get("updated_at")):
+            newest[group] = row
+    return {
+        phone_number: [
+            PhoneAccountRow(**row) for row in sorted(
+                groups.values(), key=lambda row: _updated_at_key(row.get("updated_at")), reverse=True,
+            )[:MAX_API_TOKEN_USERS]
+        ]
+        for phone_number, groups in by_number.items()
+    }
+
+
+async def warm_phone_account_cache() -> int:
+    """Preload every number with a wa_verified account, returns how many were cached."""
+    started = time.perf_counter()
+    try:
+        result = await get_db_gateway().execute(DBStatement(query=WARM_UP_QUERY), url=db_query_url)
+    except Exception as e:
+        logger.error(f"Phone account cache warm-up failed: {e}")
+        return 0
+    cache = get_phone_account_cache()
+    accounts = group_phone_accounts(result.rows)
+    for phone_number, rows in accounts.items():
+        cache.set(phone_number, rows)
+    logger.info(f"Phone account cache warmed with {len(accounts)} numbers in {time.perf_counter() - started:.2f}s")
+    return len(accounts)
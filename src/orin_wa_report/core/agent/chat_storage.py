@@ -0,0 +1,341 @@
+"""
+Compact layout of the sessions and messages tables in chat_sessions.db
+(schema version 2, kept in PRAGMA user_version) and the migration from the
+original layout.
+
+- sessions get an INTEGER `pk`, the public hex `id` stays as a unique column
+- messages are keyed by INTEGER `id`, point at sessions by `session_pk`,
+  store the sender as a small integer (senders table) and NULL instead of
+  empty metadata; the hex message id is kept in `uuid` only when asked for
+- bodies and metadata longer than a threshold can be stored compressed
+  (zlib, or zstd with the optional `zstandard` package) as a BLOB whose
+  first byte names the codec; shorter ones stay plain TEXT
+
+migrate_chat_db() copies an original-layout DB into the new tables in
+small transactions, so the app can keep reading and writing the file
+(WAL) while most of the copy runs, and resumes where it stopped. With
+`swap=True` it then copies what changed meanwhile and replaces the old
+tables in one transaction.
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="Agent")
+
+SCHEMA_VERSION = 2
+
+# Interned senders, fixed ids for the ones the bot writes
+SENDER_IDS = {"user": 1, "bot": 2}
+SENDER_NAMES = {i: name for name, i in SENDER_IDS.items()}
+
+_CODEC_ZLIB = b"\x01"
+_CODEC_ZSTD = b"\x02"
+
+SESSION_COLUMNS = "id, phone, user_name, started_at, last_activity, status, ended_at, metadata"
+
+
+def _sessions_sql(table: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            phone TEXT NOT NULL,
+            user_name TEXT,
+            started_at INTEGER NOT NULL,
+            last_activity INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            ended_at INTEGER,
+            metadata TEXT
+        );
+    """
+
+
+def _messages_sql(table: str, sessions_table: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            session_pk INTEGER NOT NULL REFERENCES {sessions_table}(pk),
+            sender INTEGER NOT NULL REFERENCES senders(id),
+            body,
+            timestamp INTEGER NOT NULL,
+            metadata,
+            uuid TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session_pk_ts ON {table}(session_pk, timestamp);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_uuid ON {table}(uuid) WHERE uuid IS NOT NULL;
+    """
+
+
+SENDERS_SQL = f"""
+    CREATE TABLE IF NOT EXISTS senders (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    INSERT OR IGNORE INTO senders (id, name) VALUES {", ".join(f"({i}, '{name}')" for name, i in SENDER_IDS.items())};
+"""
+
+SESSION_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_sessions_phone ON sessions(phone);
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+    CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(started_at) WHERE status = 'active';
+"""
+
+
+class MessageCodec:
+    """
+    Encodes message bodies and metadata for storage. Text longer than
+    `threshold` bytes (0 turns compression off) is compressed with
+    `compression` ("zlib" or "zstd") when that makes it smaller. Decoding
+    handles every codec whatever this instance writes.
+    """
+    def __init__(self, compression: str = "zlib", threshold: int = 0, level: int = 6):
+        self.threshold = threshold
+        self.compression = compression
+        self.level = level
+        self._zstd_compressor = None
+        if compression == "zstd" and threshold > 0:
+            try:
+                import zstandard
+                self._zstd_compressor = zstandard.ZstdCompressor(level=level)
+            except ImportError:
+                # zstd needs the optional zstandard package
+                logger.warning("zstd requested for chat messages but zstandard is not installed, using zlib")
+                self.compression = "zlib"
+
+    def encode_text(self, text: Optional[str]):
+        if text is None or self.threshold <= 0:
+            return text
+        raw = text.encode("utf-8")
+        if len(raw) <= self.threshold:
+            return text
+        if self._zstd_compressor is not None:
+            packed = _CODEC_ZSTD + self._zstd_compressor.compress(raw)
+        else:
+            packed = _CODEC_ZLIB + zlib.compress(raw, self.level)
+        return packed if len(packed) < len(raw) else text
+
+    @staticmethod
+    def decode_text(value) -> Optional[str]:
+        if not isinstance(value, bytes):
+            return value
+        codec, payload = value[:1], value[1:]
+        if codec == _CODEC_ZLIB:
+            return zlib.decompress(payload).decode("utf-8")
+        if codec == _CODEC_ZSTD:
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+        raise ValueError(f"Unknown message codec {codec!r}")
+
+    def encode_metadata(self, metadata: Optional[dict]):
+        """None for empty metadata, otherwise (possibly compressed) JSON."""
+        if not metadata:
+            return None
+        return self.encode_text(json.dumps(metadata))
+
+    def decode_metadata(self, value) -> Optional[dict]:
+        text = self.decode_text(value)
+        return json.loads(text) if text else None
+
+
+def intern_sender(conn: sqlite3.Connection, name: str, cache: Optional[Dict[str, int]] = None) -> int:
+    """
+    Sender id for `name`, added to the senders table the first time it is
+    seen. Only pass a `cache` when a rollback also discards it.
+    """
+    sender_id = SENDER_IDS.get(name) or (cache or {}).get(name)
+    if sender_id is None:
+        conn.execute("INSERT OR IGNORE INTO senders (name) VALUES (?)", (name,))
+        sender_id = conn.execute("SELECT id FROM senders WHERE name = ?", (name,)).fetchone()[0]
+        if cache is not None:
+            cache[name] = sender_id
+    return sender_id
+
+
+def sender_name(conn: sqlite3.Connection, sender_id: int) -> str:
+    name = SENDER_NAMES.get(sender_id)
+    if name is None:
+        row = conn.execute("SELECT name FROM senders WHERE id = ?", (sender_id,)).fetchone()
+        name = row[0] if row else str(sender_id)
+    return name
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def needs_migration(conn: sqlite3.Connection) -> bool:
+    """True for a DB whose messages table still has the original layout."""
+    return "session_id" in _columns(conn, "messages")
+
+
+def create_schema(conn: sqlite3.Connection):
+    """The version 2 sessions/senders/messages tables, for a new DB."""
+    conn.executescript(_sessions_sql("sessions") + SESSION_INDEXES_SQL + SENDERS_SQL + _messages_sql("messages", "sessions"))
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def live_bytes(conn: sqlite3.Connection) -> int:
+    """Bytes of the DB file in use, pages on the freelist excluded."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size
+
+
+def migrate_chat_db(
+    conn: sqlite3.Connection,
+    codec: Optional[MessageCodec] = None,
+    message_uuids: bool = False,
+    batch_size: int = 5000,
+    pause: float = 0.0,
+    swap: bool = True,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Copy an original-layout chat DB into the version 2 tables.
+
+    `conn` must be in autocommit mode (isolation_level=None). Every
+    `batch_size` rows are one short transaction, followed by `pause`
+    seconds so other writers get in; the position is saved, so an
+    interrupted run continues where it stopped. Messages are only ever
+    appended, so new ones are picked up by rowid; sessions also change,
+    so the swap re-copies the ones that differ. With `swap=True` the
+    remainder is copied and the old tables are replaced in one
+    transaction. Returns counts, timings and the live DB size before and
+    after (after only once swapped).
+    """
+    codec = codec or MessageCodec()
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"bytes_before": live_bytes(conn), "sessions": 0, "messages": 0, "orphans": 0}
+    senders: Dict[str, int] = {}
+
+    conn.executescript(
+        _sessions_sql("sessions_v2")
+        + SENDERS_SQL
+        + _messages_sql("messages_v2", "sessions_v2")
+        + """
+        CREATE TABLE IF NOT EXISTS chat_db_migration (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            sessions_rowid INTEGER NOT NULL,
+            messages_rowid INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO chat_db_migration (id, sessions_rowid, messages_rowid) VALUES (0, 0, 0);
+        """
+    )
+    upsert_session = (
+        f"INSERT INTO sessions_v2 ({SESSION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET user_name = excluded.user_name, last_activity = excluded.last_activity, "
+        "status = excluded.status, ended_at = excluded.ended_at, metadata = excluded.metadata"
+    )
+
+    def copy_sessions(after: int) -> int:
+        rows = conn.execute(
+            f"SELECT rowid, {SESSION_COLUMNS} FROM sessions WHERE rowid > ? ORDER BY rowid LIMIT ?", (after, batch_size)
+        ).fetchall()
+        conn.executemany(upsert_session, [row[1:] for row in rows])
+        report["sessions"] += len(rows)
+        return rows[-1][0] if rows else after
+
+    def copy_messages(after: int) -> int:
+        rows = conn.execute(
+            """
+            SELECT m.rowid, m.id, s.pk, m.session_id, m.sender, m.body, m.timestamp, m.metadata
+            FROM messages m LEFT JOIN sessions_v2 s ON s.id = m.session_id
+            WHERE m.rowid > ? ORDER BY m.rowid LIMIT ?
+            """,
+            (after, batch_size),
+        ).fetchall()
+        out = []
+        for rowid, message_id, session_pk, session_id, sender, body, timestamp, metadata in rows:
+            if session_pk is None:
+                # its session was created after the sessions were copied, or never existed
+                session = conn.execute(f"SELECT {SESSION_COLUMNS} FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if session is None:
+                    report["orphans"] += 1
+                    continue
+                conn.execute(upsert_session, session)
+                session_pk = conn.execute("SELECT pk FROM sessions_v2 WHERE id = ?", (session_id,)).fetchone()[0]
+            try:
+                metadata = json.loads(metadata) if metadata else None
+            except ValueError:
+                metadata = {"raw": metadata}
+            out.append((
+                session_pk,
+                intern_sender(conn, sender, senders),
+                codec.encode_text(body),
+                timestamp,
+                codec.encode_metadata(metadata),
+                message_id if message_uuids else None,
+            ))
+        conn.executemany(
+            "INSERT INTO messages_v2 (session_pk, sender, body, timestamp, metadata, uuid) VALUES (?, ?, ?, ?, ?, ?)", out
+        )
+        report["messages"] += len(out)
+        return rows[-1][0] if rows else after
+
+    def run_batches(copy, column: str, in_transaction: bool):
+        after = conn.execute(f"SELECT {column} FROM chat_db_migration WHERE id = 0").fetchone()[0]
+        while True:
+            if not in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            last = copy(after)
+            conn.execute(f"UPDATE chat_db_migration SET {column} = ? WHERE id = 0", (last,))
+            if not in_transaction:
+                conn.execute("COMMIT")
+                if progress:
+                    progress(dict(report))
+                if pause:
+                    time.sleep(pause)
+            if last == after:
+                return
+            after = last
+
+    # Bulk copy, other connections get the DB between batches
+    run_batches(copy_sessions, "sessions_rowid", in_transaction=False)
+    run_batches(copy_messages, "messages_rowid", in_transaction=False)
+    report["copy_seconds"] = round(time.perf_counter() - started, 2)
+    if not swap:
+        return report
+
+    # Swap: sessions changed since they were copied, messages added since, then the tables
+    swap_started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        changed = conn.execute(
+            f"""
+            INSERT INTO sessions_v2 ({SESSION_COLUMNS})
+            SELECT {SESSION_COLUMNS} FROM sessions WHERE true
+            ON CONFLICT(id) DO UPDATE SET user_name = excluded.user_name, last_activity = excluded.last_activity,
+                status = excluded.status, ended_at = excluded.ended_at, metadata = excluded.metadata
+            WHERE sessions_v2.last_activity IS NOT excluded.last_activity OR sessions_v2.status IS NOT excluded.status
+                OR sessions_v2.ended_at IS NOT excluded.ended_at OR sessions_v2.user_name IS NOT excluded.user_name
+                OR sessions_v2.metadata IS NOT excluded.metadata
+            """
+        ).rowcount
+        report["sessions_resynced"] = changed
+        run_batches(copy_messages, "messages_rowid", in_transaction=True)
+        # executescript would commit first, so the statements go one by one
+        conn.execute("DROP TABLE messages")
+        conn.execute("DROP TABLE sessions")
+        conn.execute("DROP TABLE chat_db_migration")
+        conn.execute("ALTER TABLE sessions_v2 RENAME TO sessions")
+        conn.execute("ALTER TABLE messages_v2 RENAME TO messages")
+        for statement in SESSION_INDEXES_SQL.strip().split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    report["swap_seconds"] = round(time.perf_counter() - swap_started, 2)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    report["bytes_after"] = live_bytes(conn)
+    report["messages_per_second"] = round(report["messages"] / report["seconds"]) if report["seconds"] else None
+    logger.info(f"Migrated chat DB to schema {SCHEMA_VERSION}: {report}")
+    return report
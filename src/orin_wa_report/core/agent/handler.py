@@ -17,12 +17,15 @@ DB location (auto-created): ./src/orin_wa_report/core/database/chat_sessions.db
 
 Design notes
 - sessions table: one row per session (session = conversation between bot and single phone) -- scalable. 
-- messages table: one row per chat bubble (user or bot), linked to sessions by session_id.
+- messages table: one row per chat bubble (user or bot) keyed by an integer id, linked to sessions by their
+  integer pk, see chat_storage.py for the layout and the migration of older DBs.
 - Session lifecycle: session starts on first user message, inactivity end after 15 minutes (with 5-min warning at 10m),
-  forced end after 2 hours (with 5-min warning at 1h55m). Both warnings are sent to the user. 
+  forced end after 2 hours (with 5-min warning at 1h55m). Both warnings are sent to the user. The deadlines of all
+  sessions are kept in one timer heap rather than a task per session.
 
-This file tries to avoid external dependencies (uses builtin sqlite3). It serializes DB operations using a small
-asyncio.Lock + run_in_executor to avoid blocking the event loop.
+This file tries to avoid external dependencies (uses builtin sqlite3). Writes go through one writer thread that
+groups them into batched transactions, reads use a small pool of read-only WAL connections, so the event loop
+never blocks on the DB.
 
 If you want a production setup: migrate to Postgres+async driver or a dedicated session service; for contextual
 responses integrate a small LLM or vector DB using the messages history.
@@ -32,7 +35,9 @@ responses integrate a small LLM or vector DB using the messages history.
 import json
 import asyncio
 import os
+import queue
 import sqlite3
+import threading
 import time
 import uuid
 import json
@@ -40,13 +45,15 @@ import re
 import httpx
 import copy
 import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set
 
 from openai import OpenAI
             
-from src.orin_wa_report.core.openwa import WAError
+from src.orin_wa_report.core.clients import as_async_openwa_client, get_openwa_client
+from src.orin_wa_report.core.send_scheduler import get_send_scheduler, PRIORITY_CHAT
             
 from src.orin_wa_report.core.agent.llm import (
     get_question_class,
@@ -59,6 +66,31 @@ from src.orin_wa_report.core.agent.utils import (
     get_account_status_answer,
 )
 from src.orin_wa_report.core.agent.config import question_class_details
+from src.orin_wa_report.core.agent.chat_storage import (
+    MessageCodec,
+    create_schema,
+    intern_sender,
+    migrate_chat_db,
+    needs_migration,
+    sender_name,
+)
+from src.orin_wa_report.core.agent.accounts import (
+    get_phone_accounts,
+    is_unresolved_sender,
+    mark_unresolved_sender,
+)
+from src.orin_wa_report.core.identity import (
+    get_identity_index,
+    lid_jid as to_lid_jid,
+    local_phone_number as to_local_phone_number,
+    normalize_phone,
+    phone_jid as to_phone_jid,
+    strip_jid,
+    wplus_phone_number as to_wplus_phone_number,
+)
+from src.orin_wa_report.core.cache import AsyncTTLCache
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.timers import TimerHeap
 from src.orin_wa_report.core.utils import get_db_query_endpoint
 from src.orin_wa_report.core.logger import get_logger
 
@@ -149,79 +181,178 @@ IS_SINGLE_OUTPUT = True  # The chat output is either report only or reply only
 # -----------------------------
 
 class ChatDB:
-    def __init__(self, db_path: Path):
+    """
+    sqlite store for sessions, messages and per-phone config.
+
+    Writes go to one dedicated writer thread through a queue. The writer
+    takes whatever is queued (when several writes are waiting, up to
+    `batch_window` seconds more for others, at most `max_batch`
+    operations) and runs it as one transaction,
+    each operation under its own SAVEPOINT so a failing one doesn't undo
+    the others; callers are resumed once the transaction is committed.
+    Reads run on a pool of `readers` read-only WAL connections and never
+    wait for the writer.
+
+    Operations are plain functions taking the connection, run with
+    `await self._write(fn)` or `await self._read(fn)`.
+
+    Config rows are cached in memory by phone and written through by
+    update_config, so get_config is a dict lookup once a phone is known.
+    A flag set with `expires_at` reads as False from then on, the deadline
+    is stored in the row's `<key>_until` column so it outlives a restart.
+
+    Messages use the compact layout of chat_storage: bodies and metadata
+    longer than `compress_threshold` bytes are stored compressed, and the
+    hex message ids are only generated and kept with `message_uuids`
+    (otherwise a message's id is its integer row id). A DB with the
+    original layout is migrated when it is opened.
+    """
+    # Statements on the hot paths, fixed text so sqlite3's per-connection
+    # statement cache keeps them prepared
+    INSERT_MESSAGE_SQL = (
+        "INSERT INTO messages (session_pk, sender, body, timestamp, metadata, uuid) "
+        "VALUES ((SELECT pk FROM sessions WHERE id = ?), ?, ?, ?, ?, ?)"
+    )
+    BUMP_ACTIVITY_SQL = "UPDATE sessions SET last_activity = MAX(last_activity, ?) WHERE id = ?"
+    MESSAGE_COLUMNS = "id, sender, body, timestamp, metadata, uuid"
+    SESSION_PK = "(SELECT pk FROM sessions WHERE id = ?)"
+
+    def __init__(
+        self,
+        db_path: Path,
+        batch_window: float = 0.0,
+        max_batch: int = 64,
+        readers: int = 4,
+        config_cache_size: int = 50000,
+        config_cache_ttl: float = 3600.0,
+        compression: str = "zlib",
+        compress_threshold: int = 0,
+        message_uuids: bool = False,
+    ):
         self.db_path = Path(db_path)
-        self._conn: Optional[sqlite3.Connection] = None
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.readers = readers
+        self._codec = MessageCodec(compression=compression, threshold=compress_threshold)
+        self.message_uuids = message_uuids
+        # config rows by phone, written through by update_config; only this
+        # process writes the table, the TTL just bounds how long a row is kept
+        self._config_cache = AsyncTTLCache(max_size=config_cache_size, ttl=config_cache_ttl, negative_ttl=0)
+        # contact list pages by (revision, query), stale revisions just age out
+        self._contacts_snapshots = AsyncTTLCache(max_size=256, ttl=300.0, negative_ttl=0)
+        self._conn: Optional[sqlite3.Connection] = None  # owned by the writer thread
         self._init_done = False
         self.valid_config_keys = {"disable_agent"}
-        # small in-process sqlite is protected by an asyncio lock and run_in_executor for blocking ops
         self._lock = asyncio.Lock()
+        self._write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._read_local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        self.commits = 0
+        self.writes = 0
 
     async def initialize(self):
         async with self._lock:
             if self._init_done:
                 return
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
-            # connect
-            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            # connect, transactions are opened explicitly by the writer
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
             
             # Register adapters/converters for boolean values (0/1)
             # This is important for consistency when inserting/retrieving
             # Although sqlite stores BOOL as INTEGER, registering converter/adapter is good practice.
             sqlite3.register_adapter(bool, int)
-            # Add a converter for INTEGER to BOOL type, which we'll use in _get_config_row
-            def convert_bool(v):
-                return bool(int(v))
             
             # safer WAL mode for concurrent readers/writers
             self._conn.execute("PRAGMA journal_mode = WAL;")
             self._conn.execute("PRAGMA synchronous = NORMAL;")
+            self._conn.execute("PRAGMA busy_timeout = 5000;")
+            # schema setup can migrate or backfill a large DB, keep it off the event loop
             await asyncio.get_running_loop().run_in_executor(None, self._create_tables)
+            
+            self._writer = threading.Thread(target=self._writer_loop, name="chat-db-writer", daemon=True)
+            self._writer.start()
+            self._read_executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="chat-db-reader")
             self._init_done = True
             logger.info(f"ChatDB initialized at {self.db_path}")
 
     def _create_tables(self):
         c = self._conn.cursor()
+        if needs_migration(self._conn):
+            # Original layout, converted in place. Run dev/migrate_chat_db.py
+            # beforehand on a large DB to do most of it while the app runs.
+            logger.info(f"Migrating {self.db_path} to the compact message layout")
+            migrate_chat_db(self._conn, codec=self._codec, message_uuids=self.message_uuids)
+        create_schema(self._conn)
         c.executescript(
             """
-            CREATE TABLE IF NOT EXISTS sessions (
+            CREATE TABLE IF NOT EXISTS config (
                 id TEXT PRIMARY KEY,
-                phone TEXT NOT NULL,
+                phone TEXT UNIQUE NOT NULL,
+                disable_agent BOOL NOT NULL
+            )
+            """
+        )
+        # Expiry of each config flag, added to existing DBs
+        columns = {row[1] for row in c.execute("PRAGMA table_info(config)")}
+        for key in sorted(self.valid_config_keys):
+            if f"{key}_until" not in columns:
+                c.execute(f"ALTER TABLE config ADD COLUMN {key}_until INTEGER")
+
+        # One row per phone with its newest session's name and activity, kept
+        # up to date by triggers on sessions so every write path maintains it.
+        # contacts_revision changes with it and versions the dashboard list.
+        has_contacts = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts'").fetchone()
+        c.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS contacts (
+                phone TEXT PRIMARY KEY,
                 user_name TEXT,
-                started_at INTEGER NOT NULL,
-                last_activity INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'active',
-                ended_at INTEGER,
-                metadata TEXT
+                last_activity INTEGER NOT NULL
             );
 
-            CREATE INDEX IF NOT EXISTS idx_sessions_phone ON sessions(phone);
-            CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+            CREATE INDEX IF NOT EXISTS idx_contacts_last_activity ON contacts(last_activity, phone);
 
-            CREATE TABLE IF NOT EXISTS messages (
-                id TEXT PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                sender TEXT NOT NULL,
-                body TEXT,
-                timestamp INTEGER NOT NULL,
-                metadata TEXT,
-                FOREIGN KEY(session_id) REFERENCES sessions(id)
+            CREATE TABLE IF NOT EXISTS contacts_revision (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                revision INTEGER NOT NULL
             );
-
-            CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages(session_id, timestamp);
-            
-            CREATE TABLE IF NOT EXISTS config (
-                id TEXT PRIMARY KEY,
-                phone TEXT UNIQUE NOT NULL,
-                disable_agent BOOL NOT NULL
-            )
+            INSERT OR IGNORE INTO contacts_revision (id, revision) VALUES (0, 0);
+
+            CREATE TRIGGER IF NOT EXISTS trg_contacts_session_insert AFTER INSERT ON sessions
+            BEGIN
+                INSERT INTO contacts (phone, user_name, last_activity) VALUES (NEW.phone, NEW.user_name, NEW.last_activity)
+                ON CONFLICT(phone) DO UPDATE SET user_name = excluded.user_name, last_activity = excluded.last_activity
+                WHERE excluded.last_activity >= contacts.last_activity;
+                UPDATE contacts_revision SET revision = revision + 1 WHERE id = 0;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_contacts_session_activity AFTER UPDATE OF last_activity ON sessions
+            WHEN NEW.last_activity > OLD.last_activity
+            BEGIN
+                INSERT INTO contacts (phone, user_name, last_activity) VALUES (NEW.phone, NEW.user_name, NEW.last_activity)
+                ON CONFLICT(phone) DO UPDATE SET user_name = excluded.user_name, last_activity = excluded.last_activity
+                WHERE excluded.last_activity > contacts.last_activity;
+                UPDATE contacts_revision SET revision = revision + 1 WHERE id = 0;
+            END;
             """
         )
-        self._conn.commit()
+        if not has_contacts:
+            # Existing DB: fill the summary once from the sessions already stored
+            started = time.perf_counter()
+            c.execute(
+                """
+                INSERT OR REPLACE INTO contacts (phone, user_name, last_activity)
+                SELECT phone, user_name, MAX(last_activity) FROM sessions GROUP BY phone
+                """
+            )
+            logger.info(f"Built contacts summary for {c.rowcount} phones in {time.perf_counter() - started:.1f} s")
         
-    def _create_default_config_row(self, phone: str):
+    def _create_default_config_row(self, conn: sqlite3.Connection, phone: str):
         """Internal helper to create a default config row for a new phone."""
-        cur = self._conn.cursor()
+        cur = conn.cursor()
         
         # Build the SQL command dynamically based on self.valid_config_keys
         # All valid bool configs are defaulted to False (0)
@@ -236,59 +367,170 @@ class ChatDB:
         values = [uuid.uuid4().hex, phone] + default_values
         
         cur.execute(sql, values)
-        # No commit here, as it will be part of a larger transaction or committed by the caller.
-
-    async def _run(self, fn, *args, **kwargs):
-        """Run a blocking DB call in executor with lock."""
-        async with self._lock:
-            loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+        # No commit here, the writer commits the whole batch.
+
+    # --- writer thread ---
+    def _writer_loop(self):
+        stopping = False
+        while not stopping:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            batch = [job]
+            # Take what is already queued; only when others are writing too,
+            # wait up to the window for more so a lone write isn't delayed
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    if len(batch) > 1 and self.batch_window > 0:
+                        job = self._write_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    else:
+                        job = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+        # Merge the WAL into the main DB file before the connection goes away
+        try:
+            self._conn.execute("PRAGMA wal_checkpoint(FULL);")
+        finally:
+            self._conn.close()
+            self._conn = None
+
+    def _commit_batch(self, batch: List[tuple]):
+        conn = self._conn
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, _, _ in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((True, fn(conn)))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(False, e)] * len(batch)
+        self.commits += 1
+        self.writes += len(batch)
+        for (_, future, loop), (ok, value) in zip(batch, outcomes):
+            loop.call_soon_threadsafe(_resolve_future, future, ok, value)
+
+    async def _write(self, fn):
+        """Queue `fn(conn)` for the writer, returns its result once committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._write_queue.put((fn, future, loop))
+        return await future
+
+    # --- readers ---
+    def _reader_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._read_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON;")
+            self._read_local.conn = conn
+            self._read_conns.append(conn)
+        return conn
+
+    async def _read(self, fn):
+        """Run `fn(conn)` on a read-only connection from the reader pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, lambda: fn(self._reader_conn()))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "commits": self.commits,
+            "writes_per_commit": round(self.writes / self.commits, 2) if self.commits else None,
+            "queued": self._write_queue.qsize(),
+            "config_cache": self._config_cache.metrics(),
+        }
 
     # --- session operations ---
     async def create_session(self, phone: str, user_name: str, started_at: Optional[int] = None) -> str:
         if started_at is None:
             started_at = int(time.time())
         session_id = uuid.uuid4().hex
-        def _create():
-            cur = self._conn.cursor()
+        def _create(conn):
+            cur = conn.cursor()
             cur.execute(
                 "INSERT INTO sessions (id, phone, user_name, started_at, last_activity, status) VALUES (?, ?, ?, ?, ?, ?)",
                 (session_id, phone, user_name, started_at, started_at, 'active')
             )
             
-            self._create_default_config_row(phone)
-            
-            self._conn.commit()
+            self._create_default_config_row(conn, phone)
             return session_id
-        return await self._run(_create)
+        return await self._write(_create)
 
     async def update_session_activity(self, session_id: str, last_activity: Optional[int] = None):
         if last_activity is None:
             last_activity = int(time.time())
-        def _update():
-            cur = self._conn.cursor()
-            cur.execute(
+        def _update(conn):
+            conn.execute(
                 "UPDATE sessions SET last_activity = ? WHERE id = ?",
                 (last_activity, session_id)
             )
-            self._conn.commit()
-        await self._run(_update)
+        await self._write(_update)
+
+    async def update_sessions_activity(self, updates: List[tuple]):
+        """Write-behind flush: (session_id, last_activity) pairs in one write, never moving backwards."""
+        def _update(conn):
+            conn.executemany(
+                "UPDATE sessions SET last_activity = MAX(last_activity, ?) WHERE id = ?",
+                [(last_activity, session_id) for session_id, last_activity in updates]
+            )
+        await self._write(_update)
 
-    async def end_session(self, session_id: str, ended_at: Optional[int] = None, status: str = "ended"):
+    async def end_session(
+        self,
+        session_id: str,
+        ended_at: Optional[int] = None,
+        status: str = "ended",
+        last_activity: Optional[int] = None,
+    ):
         if ended_at is None:
             ended_at = int(time.time())
-        def _end():
-            cur = self._conn.cursor()
-            cur.execute(
-                "UPDATE sessions SET status = ?, ended_at = ? WHERE id = ?",
-                (status, ended_at, session_id)
+        def _end(conn):
+            conn.execute(
+                "UPDATE sessions SET status = ?, ended_at = ?, last_activity = MAX(last_activity, COALESCE(?, 0)) WHERE id = ?",
+                (status, ended_at, last_activity, session_id)
             )
-            self._conn.commit()
-        await self._run(_end)
+        await self._write(_end)
         
+    async def end_sessions(self, session_ids: List[str], ended_at: Optional[int] = None, status: str = "ended"):
+        """End many sessions in one transaction."""
+        if ended_at is None:
+            ended_at = int(time.time())
+        def _end(conn):
+            conn.executemany(
+                "UPDATE sessions SET status = ?, ended_at = ? WHERE id = ?",
+                [(status, ended_at, session_id) for session_id in session_ids]
+            )
+        await self._write(_end)
+
+    async def get_active_sessions(self) -> List[Dict[str, Any]]:
+        """Every session still marked active, oldest first."""
+        def _get(conn):
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, phone, user_name, started_at, last_activity FROM sessions WHERE status = 'active' ORDER BY started_at"
+            )
+            keys = ["id","phone","user_name","started_at","last_activity"]
+            return [dict(zip(keys, row)) for row in cur.fetchall()]
+        return await self._read(_get)
+
     async def get_session_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
-        def _get():
-            cur = self._conn.cursor()
+        def _get(conn):
+            cur = conn.cursor()
             cur.execute(
                 "SELECT id, phone, user_name, started_at, last_activity, status, ended_at FROM sessions WHERE phone = ? ORDER BY started_at DESC LIMIT 1",
                 (phone,)
@@ -298,12 +540,12 @@ class ChatDB:
                 return None
             keys = ["id","phone","user_name","started_at","last_activity","status","ended_at"]
             return dict(zip(keys, row))
-        return await self._run(_get)
+        return await self._read(_get)
 
     async def get_sessions_by_phone(self, phone: str, limit: int = None) -> List[Dict[str, Any]]:
         """Get all sessions for a phone number, ordered by started_at ascending"""
-        def _get():
-            cur = self._conn.cursor()
+        def _get(conn):
+            cur = conn.cursor()
             cur.execute(
                 """
 SELECT *
@@ -323,7 +565,7 @@ ORDER BY started_at ASC;
                 return []
             keys = ["id","phone","user_name","started_at","last_activity","status","ended_at"]
             return [dict(zip(keys, row)) for row in rows]
-        return await self._run(_get)
+        return await self._read(_get)
 
     async def get_latest_session_by_phone_force(self, phone: str) -> Optional[Dict[str, Any]]:
         """
@@ -331,8 +573,8 @@ ORDER BY started_at ASC;
         regardless of its status (active, ended, etc.).
         This is a clear implementation of the requested 'force' behavior.
         """
-        def _get():
-            cur = self._conn.cursor()
+        def _get(conn):
+            cur = conn.cursor()
             cur.execute(
                 "SELECT id, phone, user_name, started_at, last_activity, status, ended_at FROM sessions WHERE phone = ? ORDER BY started_at DESC LIMIT 1",
                 (phone,)
@@ -342,11 +584,11 @@ ORDER BY started_at ASC;
                 return None
             keys = ["id","phone","user_name","started_at","last_activity","status","ended_at"]
             return dict(zip(keys, row))
-        return await self._run(_get)
+        return await self._read(_get)
 
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        def _get():
-            cur = self._conn.cursor()
+        def _get(conn):
+            cur = conn.cursor()
             cur.execute(
                 "SELECT id, phone, user_name, started_at, last_activity, status, ended_at FROM sessions WHERE id = ?",
                 (session_id,)
@@ -356,70 +598,223 @@ ORDER BY started_at ASC;
                 return None
             keys = ["id","phone","user_name","started_at","last_activity","status","ended_at"]
             return dict(zip(keys, row))
-        return await self._run(_get)
+        return await self._read(_get)
 
     # --- messages ---
+    def _insert_message(
+        self, conn: sqlite3.Connection, session_id: str, sender: str, body: str, timestamp: int, metadata: Optional[dict] = None
+    ) -> str:
+        message_uuid = uuid.uuid4().hex if self.message_uuids else None
+        cur = conn.execute(self.INSERT_MESSAGE_SQL, (
+            session_id,
+            intern_sender(conn, sender),
+            self._codec.encode_text(body),
+            timestamp,
+            self._codec.encode_metadata(metadata),
+            message_uuid,
+        ))
+        return message_uuid or str(cur.lastrowid)
+
     async def add_message(self, session_id: str, sender: str, body: str, timestamp: Optional[int] = None, metadata: Optional[dict] = None) -> str:
         if timestamp is None:
             timestamp = int(time.time())
-        if metadata is None:
-            metadata = {}
-        message_id = uuid.uuid4().hex
-        def _add():
-            cur = self._conn.cursor()
-            cur.execute(
-                "INSERT INTO messages (id, session_id, sender, body, timestamp, metadata) VALUES (?, ?, ?, ?, ?, ?)",
-                (message_id, session_id, sender, body, timestamp, json.dumps(metadata))
-            )
-            self._conn.commit()
-            return message_id
-        return await self._run(_add)
+        def _add(conn):
+            return self._insert_message(conn, session_id, sender, body, timestamp, metadata)
+        return await self._write(_add)
 
     async def add_chat_to_latest_session(self, phone_number: str, sender: str, message: str):
         """
         Adds a message to the latest session associated with the given phone number.
         If no active session is found, it will do nothing (or could optionally raise an error).
+        Finding the session, storing the message and bumping its last activity is one transaction.
         """
-        # 1. Get the latest session for the phone number
-        session = await self.get_session_by_phone(phone_number)
+        timestamp = int(time.time())
+        def _add(conn):
+            row = conn.execute(
+                "SELECT id FROM sessions WHERE phone = ? ORDER BY started_at DESC LIMIT 1", (phone_number,)
+            ).fetchone()
+            if not row:
+                return None
+            self._insert_message(conn, row[0], sender, message, timestamp)
+            conn.execute(self.BUMP_ACTIVITY_SQL, (timestamp, row[0]))
+            return row[0]
 
-        if not session:
+        if await self._write(_add) is None:
             # No session found for this phone number, log or handle as needed
             logger.warning(f"Attempted to add chat for phone {phone_number} but no session found.")
-            return
-
-        session_id = session["id"]
-
-        # 2. Add the message to the found session
-        await self.add_message(
-            session_id=session_id,
-            sender=sender,
-            body=message
-        )
-
-        # 3. Update the session's last activity
-        await self.update_session_activity(session_id)
 
     async def get_messages_for_session(self, session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        def _get():
-            cur = self._conn.cursor()
-            cur.execute(
-                "SELECT id, sender, body, timestamp, metadata FROM messages WHERE session_id = ? ORDER BY timestamp ASC LIMIT ?",
+        def _get(conn):
+            cur = conn.execute(
+                f"SELECT {self.MESSAGE_COLUMNS} FROM messages WHERE session_pk = {self.SESSION_PK} "
+                "ORDER BY timestamp ASC, id ASC LIMIT ?",
                 (session_id, limit)
             )
+            return [self._message_row(conn, r) for r in cur.fetchall()]
+        return await self._read(_get)
+
+    def _message_row(self, conn: sqlite3.Connection, r) -> Dict[str, Any]:
+        """Row of MESSAGE_COLUMNS as returned by the message reads."""
+        return {
+            "id": r[5] or str(r[0]),
+            "sender": sender_name(conn, r[1]),
+            "body": self._codec.decode_text(r[2]),
+            "timestamp": r[3],
+            "metadata": self._codec.decode_metadata(r[4]),
+        }
+
+    @staticmethod
+    def encode_cursor(timestamp: int, rowid: int) -> str:
+        return f"{timestamp}.{rowid}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """'timestamp.rowid' -> (timestamp, rowid), ValueError if malformed."""
+        timestamp, rowid = cursor.split(".")
+        return int(timestamp), int(rowid)
+
+    async def tail(self, session_id: str, n: int) -> List[Dict[str, Any]]:
+        """The newest `n` messages of a session, oldest first."""
+        def _get(conn):
+            # walks idx_messages_session_pk_ts backwards, the id breaks timestamp ties
+            cur = conn.execute(
+                f"SELECT {self.MESSAGE_COLUMNS} FROM messages WHERE session_pk = {self.SESSION_PK} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (session_id, n)
+            )
+            return [self._message_row(conn, r) for r in reversed(cur.fetchall())]
+        return await self._read(_get)
+
+    async def get_messages_page(
+        self, session_id: str, limit: int = 100, before: Optional[str] = None
+    ) -> tuple:
+        """
+        One page of a session's history going back in time: the `limit`
+        messages just older than the `before` cursor (the newest ones without
+        it), oldest first, and the cursor of the next older page or None.
+        """
+        def _get(conn):
+            if before is None:
+                cur = conn.execute(
+                    f"SELECT {self.MESSAGE_COLUMNS} FROM messages WHERE session_pk = {self.SESSION_PK} "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (session_id, limit + 1)
+                )
+            else:
+                cur = conn.execute(
+                    f"SELECT {self.MESSAGE_COLUMNS} FROM messages "
+                    f"WHERE session_pk = {self.SESSION_PK} AND (timestamp, id) < (?, ?) "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (session_id, *self.decode_cursor(before), limit + 1)
+                )
             rows = cur.fetchall()
-            out = []
-            for r in rows:
-                out.append({
-                    "id": r[0],
-                    "sender": r[1],
-                    "body": r[2],
-                    "timestamp": r[3],
-                    "metadata": json.loads(r[4]) if r[4] else None
-                })
-            return out
-        return await self._run(_get)
+            more = len(rows) > limit
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1][3], rows[-1][0]) if more else None
+            return [self._message_row(conn, r) for r in reversed(rows)], next_cursor
+        return await self._read(_get)
+
+    async def get_history_for_phone(
+        self, phone: str, sessions: int = 5, per_session: int = 100, before: Optional[str] = None
+    ) -> tuple:
+        """
+        The `sessions` latest sessions of a phone started before the `before`
+        cursor, each with its newest `per_session` messages, in one query.
+        Returns ([(session_id, [messages oldest first]), ...] oldest session
+        first, cursor of the next older page or None).
+        """
+        def _get(conn):
+            where, params = "phone = ?", [phone]
+            if before is not None:
+                where += " AND (started_at, pk) < (?, ?)"
+                params += list(self.decode_cursor(before))
+            cur = conn.execute(
+                f"""
+                WITH latest AS (
+                    SELECT pk, id, started_at FROM sessions
+                    WHERE {where}
+                    ORDER BY started_at DESC, pk DESC
+                    LIMIT ?
+                )
+                SELECT latest.id, latest.started_at, latest.pk,
+                       m.id, m.sender, m.body, m.timestamp, m.metadata, m.uuid
+                FROM latest LEFT JOIN messages m ON m.id IN (
+                    -- tail of each session, read backwards from idx_messages_session_pk_ts
+                    SELECT id FROM messages WHERE session_pk = latest.pk
+                    ORDER BY timestamp DESC, id DESC LIMIT ?
+                )
+                ORDER BY latest.started_at, latest.pk, m.timestamp, m.id
+                """,
+                params + [sessions + 1, per_session]
+            )
+            history: List[tuple] = []  # (session_id, started_at, pk, messages)
+            for row in cur.fetchall():
+                if not history or history[-1][0] != row[0]:
+                    history.append((row[0], row[1], row[2], []))
+                if row[3] is not None:
+                    history[-1][3].append(self._message_row(conn, row[3:]))
+            # one session more than asked for tells whether an older page exists
+            next_cursor = None
+            if len(history) > sessions:
+                history = history[1:]
+                next_cursor = self.encode_cursor(history[0][1], history[0][2])
+            return [(session_id, messages) for session_id, _, _, messages in history], next_cursor
+        return await self._read(_get)
     
+    # --- contacts ---
+    async def get_contacts(
+        self, limit: int = 100, before: Optional[str] = None, search: Optional[str] = None
+    ) -> tuple:
+        """
+        One page of the contacts summary, most recently active first:
+        (revision, [{"phone_number", "user_name", "last_activity"}, ...],
+        cursor of the next page or None). `before` is a "last_activity.phone"
+        cursor, `search` matches part of the number or name. Pages are kept
+        per contacts revision, so repeated polls of an unchanged list cost
+        one single-row read.
+        """
+        revision = await self._read(
+            lambda conn: conn.execute("SELECT revision FROM contacts_revision WHERE id = 0").fetchone()[0]
+        )
+        key = (revision, limit, before, search)
+        found, page = self._contacts_snapshots.get(key)
+        if found:
+            return page
+
+        def _get(conn):
+            where, params = [], []
+            if before is not None:
+                last_activity, phone = before.split(".", 1)
+                where.append("(last_activity, phone) < (?, ?)")
+                params += [int(last_activity), phone]
+            if search:
+                where.append("(phone LIKE ? OR user_name LIKE ?)")
+                params += [f"%{search}%"] * 2
+            # revision and rows from the same read transaction
+            conn.execute("BEGIN")
+            try:
+                current = conn.execute("SELECT revision FROM contacts_revision WHERE id = 0").fetchone()[0]
+                rows = conn.execute(
+                    f"""
+                    SELECT phone, user_name, last_activity FROM contacts
+                    {"WHERE " + " AND ".join(where) if where else ""}
+                    ORDER BY last_activity DESC, phone DESC
+                    LIMIT ?
+                    """,
+                    params + [limit + 1]
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+            more = len(rows) > limit
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][2]}.{rows[-1][0]}" if more else None
+            contacts = [{"phone_number": r[0], "user_name": r[1], "last_activity": r[2]} for r in rows]
+            return current, contacts, next_cursor
+
+        page = await self._read(_get)
+        self._contacts_snapshots.set((page[0], limit, before, search), page)
+        return page
+
     async def get_config(
         self,
         phone: str,
@@ -438,40 +833,47 @@ ORDER BY started_at ASC;
             logger.error("(get_config) The key you requested is not in the table")
             return None
 
-        def _get():
-            cur = self._conn.cursor()
-            # Note: Using an f-string for the column name 'key' is safe here 
-            # because we strictly validated 'key' against 'valid_keys' above.
-            cur.execute(
-                f"SELECT {key} FROM config WHERE phone = ?",
-                (phone,)
-            )
-            row = cur.fetchone()
-            if row:
-                # Value found, return it as a boolean
-                return bool(row[0])
-            elif create_if_not_exists:
-                # Value not found, but we need to create it
-                self._create_default_config_row(phone)
-                self._conn.commit()
-                # Since we just created a default row, the value for 'key' is False (0)
-                return False
-            else:
-                return None
-        
-        return await self._run(_get)
-    
+        def _get_or_create(conn):
+            self._create_default_config_row(conn, phone)
+            return self._config_row(conn, phone)
+
+        row = await self._config_cache.get_or_load(phone, lambda: self._read(lambda conn: self._config_row(conn, phone)))
+        if row is None and create_if_not_exists:
+            # Not found: create the default row and read it back in one write,
+            # which also returns what a concurrent update_config may have stored
+            row = await self._write(_get_or_create)
+            self._config_cache.set(phone, row)
+        if row is None:
+            return None
+        value, until = row[key]
+        # a flag past its expiry is back to the default (False)
+        return value and (until is None or until > time.time())
+
+    def _config_row(self, conn: sqlite3.Connection, phone: str) -> Optional[Dict[str, tuple]]:
+        """{key: (value, until)} for the phone's config row, None if it has none."""
+        keys = sorted(self.valid_config_keys)
+        # Note: Using an f-string for the column names is safe here
+        # because they come from valid_config_keys.
+        columns = ", ".join(f"{key}, {key}_until" for key in keys)
+        row = conn.execute(f"SELECT {columns} FROM config WHERE phone = ?", (phone,)).fetchone()
+        if not row:
+            return None
+        return {key: (bool(row[2 * i]), row[2 * i + 1]) for i, key in enumerate(keys)}
+
     async def update_config(
         self,
         phone: str,
         values: Dict[str, Any],
-        create_if_not_exists: bool = False
+        create_if_not_exists: bool = False,
+        expires_at: Optional[int] = None,
     ):
         """
         Updates one or more configuration values for a phone number.
         If the phone does not exist and create_if_not_exists is True, it creates a new
         row with the provided values (and False for any missing valid keys).
         The 'values' dict keys must be in self.valid_config_keys.
+        With `expires_at` (epoch seconds) the updated keys read as False from then on,
+        otherwise they keep their value until the next update.
         """
         
         # 1. Filter out invalid keys from the update dictionary
@@ -479,47 +881,58 @@ ORDER BY started_at ASC;
         if not update_keys:
             return # Nothing to update
 
-        def _update():
-            cur = self._conn.cursor()
-            
-            # Check if the phone already has a config row
-            cur.execute("SELECT id FROM config WHERE phone = ?", (phone,))
-            row_exists = cur.fetchone()
-
-            if not row_exists and create_if_not_exists:
-                # 2. Case: Row does not exist, but we should create it
-                self._create_default_config_row(phone) # Creates a default row
-                # We need to commit here to ensure the subsequent UPDATE finds the row
-                self._conn.commit() 
-            elif not row_exists:
-                # 3. Case: Row does not exist and we are not creating it
-                return
-            
-            # 4. Case: Row exists (or was just created), now perform the update
-            # Build the SET part of the SQL query: "key1 = ?, key2 = ?"
-            set_clauses = [f"{key} = ?" for key in update_keys]
+        if create_if_not_exists:
+            # One upsert: a new row gets the given values and False for the other keys
+            keys = sorted(self.valid_config_keys)
+            columns = ["id", "phone"] + keys + [f"{key}_until" for key in keys]
+            set_clauses = [f"{key} = excluded.{key}, {key}_until = excluded.{key}_until" for key in update_keys]
+            sql = (
+                f"INSERT INTO config ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(phone) DO UPDATE SET {', '.join(set_clauses)}"
+            )
+            params = (
+                [uuid.uuid4().hex, phone]
+                + [values.get(key, False) for key in keys]
+                + [expires_at if key in values else None for key in keys]
+            )
+        else:
+            # Build the SET part of the SQL query: "key1 = ?, key1_until = ?", a missing row is left alone
+            set_clauses = [f"{key} = ?, {key}_until = ?" for key in update_keys]
             sql = f"UPDATE config SET {', '.join(set_clauses)} WHERE phone = ?"
-            
-            # Extract values in the same order as the keys for the SET clause
-            update_values = [values[key] for key in update_keys]
-            
-            # Append the phone number for the WHERE clause
-            params = update_values + [phone]
-            
-            cur.execute(sql, params)
-            self._conn.commit()
-        
-        await self._run(_update)
+            params = [v for key in update_keys for v in (values[key], expires_at)] + [phone]
+
+        def _update(conn):
+            conn.execute(sql, params)
+            return self._config_row(conn, phone)
+
+        row = await self._write(_update)
+        # Write-through; invalidating first keeps a load already in flight from caching the old row
+        self._config_cache.invalidate(phone)
+        if row is not None:
+            self._config_cache.set(phone, row)
 
     async def close(self):
-        """Closes the connection, forcing an immediate checkpoint."""
+        """Stops the writer after the queued writes, forcing an immediate checkpoint."""
         async with self._lock:
-            if self._conn:
-                # Force a checkpoint to merge WAL data into the main DB file
-                self._conn.execute("PRAGMA wal_checkpoint(FULL);")
-                self._conn.close()
-                self._conn = None
-                logger.info("SettingsDB connection closed and checkpointed.")
+            if not self._init_done:
+                return
+            self._write_queue.put(None)
+            await asyncio.to_thread(self._writer.join)
+            self._read_executor.shutdown(wait=True)
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+            self._init_done = False
+            logger.info("ChatDB connection closed and checkpointed.")
+
+
+def _resolve_future(future: asyncio.Future, ok: bool, value: Any):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
 
 # -----------------------------
 # Session manager in memory
@@ -533,16 +946,142 @@ class SessionEntry:
         self.user_name = user_name
         self.started_at = started_at
         self.last_activity = last_activity
-        self.inactivity_task: Optional[asyncio.Task] = None
-        self.forced_task: Optional[asyncio.Task] = None
         self.processing_lock = asyncio.Lock()
 
 
 class SessionManager:
-    def __init__(self, db: ChatDB):
+    """
+    Active sessions live in memory and are the source of truth while they
+    last: a message to a known session touches only its SessionEntry.
+    last_activity reaches the DB write-behind, every `flush_interval`
+    seconds for all sessions touched since (and when a session ends or the
+    manager stops). SQLite is read only when a phone has no entry yet.
+
+    Inactivity and forced-end deadlines of every session share one
+    TimerHeap. A new message only moves `last_activity`; the inactivity
+    timer notices when it fires and re-arms itself from there.
+    """
+    def __init__(self, db: ChatDB, flush_interval: float = 5.0):
         self.db = db
+        self.flush_interval = flush_interval
         self._sessions: Dict[str, SessionEntry] = {}  # key by phone
         self._lock = asyncio.Lock()
+        self._dirty: Dict[str, SessionEntry] = {}  # session_id -> entry with unsaved last_activity
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timers = TimerHeap()
+        self._background: Set[asyncio.Task] = set()
+
+    def start(self):
+        self._timers.start()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        await self._timers.stop()
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush session activity")
+
+    async def flush(self) -> int:
+        """Write the last_activity of every session touched since the last flush."""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self.db.update_sessions_activity(
+                [(entry.session_id, entry.last_activity) for entry in dirty.values()]
+            )
+        except Exception:
+            # Keep them for the next flush, newer touches win
+            self._dirty = {**dirty, **self._dirty}
+            raise
+        return len(dirty)
+
+    def _touch(self, entry: SessionEntry, now: int):
+        entry.last_activity = now
+        self._dirty[entry.session_id] = entry
+
+    def _is_live(self, entry: SessionEntry) -> bool:
+        return self._sessions.get(entry.phone) is entry
+
+    async def _end_entry(self, entry: SessionEntry, status: str = "ended"):
+        """Drop the entry and end its row, saving its last_activity in the same write."""
+        self._sessions.pop(entry.phone, None)
+        self._dirty.pop(entry.session_id, None)
+        await self.db.end_session(
+            entry.session_id, ended_at=int(time.time()), status=status, last_activity=entry.last_activity
+        )
+
+    def _register(self, entry: SessionEntry, client):
+        """Make `entry` the phone's live session and arm its timers."""
+        self._sessions[entry.phone] = entry
+        self._timers.schedule(entry.last_activity + INACTIVITY_WARNING_SECONDS, self._on_inactivity_warning, entry, client)
+        self._timers.schedule(
+            entry.started_at + FORCED_SESSION_SECONDS - FORCED_WARNING_BEFORE, self._on_forced_warning, entry, client
+        )
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def recover(self) -> Dict[str, int]:
+        """
+        Startup pass over the sessions left active by the previous process:
+        one query loads them, the ones past their inactivity or forced-end
+        deadline (and older duplicates for the same phone) are ended in one
+        transaction, the rest get their entry and timers back. Recovered
+        entries have no client, their messages go through the current
+        OpenWA client.
+        """
+        now = int(time.time())
+        rows = await self.db.get_active_sessions()
+        identity_index = get_identity_index()
+        latest: Dict[str, Dict[str, Any]] = {}
+        expired: List[str] = []
+        for row in rows:  # oldest first, so a later row for the same phone replaces the earlier one
+            previous = latest.pop(row["phone"], None)
+            if previous:
+                expired.append(previous["id"])
+            if (
+                now - int(row["started_at"]) >= FORCED_SESSION_SECONDS
+                or now - int(row["last_activity"]) >= INACTIVITY_END_SECONDS
+            ):
+                expired.append(row["id"])
+            else:
+                latest[row["phone"]] = row
+        async with self._lock:
+            if expired:
+                await self.db.end_sessions(expired, ended_at=now)
+            for phone, row in latest.items():
+                if phone in self._sessions:
+                    continue
+                # the DB keeps the bare number, a known LID goes back to its @lid address
+                jid = to_lid_jid(phone) if identity_index.phone_for(phone) else to_phone_jid(phone)
+                entry = SessionEntry(
+                    session_id=row["id"],
+                    phone=phone,
+                    jid=jid,
+                    user_name=row.get("user_name") or "",
+                    started_at=int(row["started_at"]),
+                    last_activity=int(row["last_activity"]),
+                )
+                self._register(entry, None)
+        logger.info(f"Recovered {len(latest)} active sessions, ended {len(expired)} expired ones")
+        return {"active": len(rows), "recovered": len(latest), "ended": len(expired)}
 
     async def ensure_session(self, phone: str, jid: str, user_name: str, client) -> SessionEntry:
         """Get existing active session for phone or create a new one."""
@@ -550,21 +1089,10 @@ class SessionManager:
         async with self._lock:
             entry = self._sessions.get(phone)
             if entry:
-                # verify it's still active in DB
-                sess = await self.db.get_session(entry.session_id)
-                if sess and sess.get("status") == "active":
-                    # update last_activity in db + in-memory
-                    await self.db.update_session_activity(entry.session_id, now)
-                    entry.last_activity = now
-                    # reset inactivity watcher
-                    if entry.inactivity_task:
-                        entry.inactivity_task.cancel()
-                    entry.inactivity_task = asyncio.create_task(self._inactivity_watcher(entry, client))
-                    return entry
-                else:
-                    # stale entry in memory
-                    await self._cancel_tasks(entry)
-                    self._sessions.pop(phone, None)
+                # active in memory, nothing to read from the DB; the
+                # inactivity timer re-arms itself from the new last_activity
+                self._touch(entry, now)
+                return entry
 
             # look in DB for most recent session for this phone
             dbsess = await self.db.get_session_by_phone(phone)
@@ -580,12 +1108,8 @@ class SessionManager:
                         started_at=int(dbsess.get("started_at")),
                         last_activity=int(dbsess.get("last_activity"))
                     )
-                    # schedule watchers
-                    entry.inactivity_task = asyncio.create_task(self._inactivity_watcher(entry, client))
-                    entry.forced_task = asyncio.create_task(self._forced_watcher(entry, client))
-                    self._sessions[phone] = entry
-                    await self.db.update_session_activity(entry.session_id, now)
-                    entry.last_activity = now
+                    self._touch(entry, now)
+                    self._register(entry, client)
                     return entry
                 else:
                     # session too old - end it in DB and create new
@@ -597,125 +1121,78 @@ class SessionManager:
             # create new session
             session_id = await self.db.create_session(phone, user_name, started_at=now)
             entry = SessionEntry(session_id=session_id, phone=phone, jid=jid, user_name=user_name, started_at=now, last_activity=now)
-            entry.inactivity_task = asyncio.create_task(self._inactivity_watcher(entry, client))
-            entry.forced_task = asyncio.create_task(self._forced_watcher(entry, client))
-            self._sessions[phone] = entry
+            self._register(entry, client)
             logger.info(f"Created new session {session_id} for {phone}")
             return entry
 
     async def touch_session(self, phone: str, client):
-        """Update session last_activity and restart inactivity watcher."""
+        """Update session last_activity, which also pushes back its inactivity deadline."""
         async with self._lock:
             entry = self._sessions.get(phone)
             if not entry:
                 return None
-            now = int(time.time())
-            entry.last_activity = now
-            try:
-                await self.db.update_session_activity(entry.session_id, now)
-            except Exception:
-                logger.exception("Failed to update session activity")
-            if entry.inactivity_task:
-                entry.inactivity_task.cancel()
-            entry.inactivity_task = asyncio.create_task(self._inactivity_watcher(entry, client))
+            self._touch(entry, int(time.time()))
             return entry
 
-    async def _cancel_tasks(self, entry: SessionEntry):
-        if entry.inactivity_task:
-            try:
-                entry.inactivity_task.cancel()
-            except Exception:
-                pass
-        if entry.forced_task:
-            try:
-                entry.forced_task.cancel()
-            except Exception:
-                pass
+    # --- timers ---
+    def _on_inactivity_warning(self, entry: SessionEntry, client):
+        """10 minutes without activity: send the 5-min warning, then wait for the end deadline."""
+        if not self._is_live(entry):
+            return
+        due = entry.last_activity + INACTIVITY_WARNING_SECONDS
+        if due > time.time():
+            # activity happened since this was armed
+            self._timers.schedule(due, self._on_inactivity_warning, entry, client)
+            return
+        if USE_WARNING_SESSION_MESSAGE:
+            self._spawn(self._send(client, entry.jid, INACTIVITY_WARNING_SESSION_MESSAGE, "inactivity warning"))
+        self._timers.schedule(entry.last_activity + INACTIVITY_END_SECONDS, self._on_inactivity_end, entry, client)
 
-    async def _inactivity_watcher(self, entry: SessionEntry, client):
-        """Sends a 5-min warning at 10 minutes of inactivity then ends the session at 15 minutes if no reply."""
-        try:
-            # sleep until warning
-            await asyncio.sleep(INACTIVITY_WARNING_SECONDS)
-            # check actual last_activity
-            sess = await self.db.get_session(entry.session_id)
-            if not sess or sess.get("status") != "active":
-                return
-            last_activity = int(sess.get("last_activity"))
-            now = int(time.time())
-            if now - last_activity < INACTIVITY_WARNING_SECONDS:
-                # activity happened - watcher will be restarted by touch_session
-                return
-            # send warning
-            if USE_WARNING_SESSION_MESSAGE:
-                warn_text = INACTIVITY_WARNING_SESSION_MESSAGE
-                try:
-                    client.sendText(entry.jid, warn_text)
-                except Exception:
-                    logger.exception("Failed to send inactivity warning")
-            # wait final 5 minutes
-            await asyncio.sleep(INACTIVITY_END_SECONDS - INACTIVITY_WARNING_SECONDS)
-            # final check
-            sess = await self.db.get_session(entry.session_id)
-            if not sess or sess.get("status") != "active":
-                return
-            last_activity = int(sess.get("last_activity"))
-            now = int(time.time())
-            if now - last_activity < INACTIVITY_END_SECONDS:
-                # user replied in the meantime
-                return
-            # end session
-            logger.info(f"Ending session {entry.session_id} for {entry.phone} due to inactivity")
-            if USE_END_SESSION_MESSAGE:
-                try:
-                    client.sendText(entry.jid, INACTIVITY_END_SESSION_MESSAGE)
-                except Exception:
-                    logger.exception("Failed to send inactivity final message")
-            await self.db.end_session(entry.session_id, ended_at=int(time.time()), status="ended")
-            # cleanup
-            async with self._lock:
-                await self._cancel_tasks(entry)
-                self._sessions.pop(entry.phone, None)
-        except asyncio.CancelledError:
-            # watcher cancelled because of new activity / session end
+    def _on_inactivity_end(self, entry: SessionEntry, client):
+        if not self._is_live(entry):
             return
-        except Exception:
-            logger.exception("Error in inactivity watcher for session %s", entry.session_id)
+        if time.time() - entry.last_activity < INACTIVITY_END_SECONDS:
+            # user replied in the meantime, back to waiting for the warning
+            self._timers.schedule(
+                entry.last_activity + INACTIVITY_WARNING_SECONDS, self._on_inactivity_warning, entry, client
+            )
+            return
+        logger.info(f"Ending session {entry.session_id} for {entry.phone} due to inactivity")
+        self._spawn(self._expire(entry, client, INACTIVITY_END_SESSION_MESSAGE))
 
-    async def _forced_watcher(self, entry: SessionEntry, client):
+    def _on_forced_warning(self, entry: SessionEntry, client):
         """Force-end long sessions after FORCED_SESSION_SECONDS. Send a 5-minute warning beforehand."""
+        if not self._is_live(entry):
+            return
+        if USE_WARNING_SESSION_MESSAGE:
+            self._spawn(self._send(client, entry.jid, FORCED_WARNING_SESSION_MESSAGE, "forced-end warning"))
+        self._timers.schedule(entry.started_at + FORCED_SESSION_SECONDS, self._on_forced_end, entry, client)
+
+    def _on_forced_end(self, entry: SessionEntry, client):
+        if not self._is_live(entry):
+            return
+        logger.info(f"Force ending session {entry.session_id} for {entry.phone} due to time limit")
+        self._spawn(self._expire(entry, client, FORCED_END_SESSION_MESSAGE))
+
+    async def _send(self, client, jid: str, text: str, what: str):
+        client = client or get_openwa_client()
+        if client is None:
+            logger.warning(f"No OpenWA client to send {what} to {jid}")
+            return
+        try:
+            await as_async_openwa_client(client).send_text(jid, text)
+        except Exception:
+            logger.exception(f"Failed to send {what}")
+
+    async def _expire(self, entry: SessionEntry, client, end_message: str):
+        if USE_END_SESSION_MESSAGE:
+            await self._send(client, entry.jid, end_message, "session end message")
         try:
-            total = FORCED_SESSION_SECONDS
-            warn_at = total - FORCED_WARNING_BEFORE
-            await asyncio.sleep(warn_at)
-            # double-check session still active
-            sess = await self.db.get_session(entry.session_id)
-            if not sess or sess.get("status") != "active":
-                return
-            if USE_WARNING_SESSION_MESSAGE:
-                try:
-                    client.sendText(entry.jid, FORCED_WARNING_SESSION_MESSAGE)
-                except Exception:
-                    logger.exception("Failed to send forced-end warning")
-            await asyncio.sleep(FORCED_WARNING_BEFORE)
-            # final end
-            sess = await self.db.get_session(entry.session_id)
-            if not sess or sess.get("status") != "active":
-                return
-            logger.info(f"Force ending session {entry.session_id} for {entry.phone} due to time limit")
-            if USE_END_SESSION_MESSAGE:
-                try:
-                    client.sendText(entry.jid, FORCED_END_SESSION_MESSAGE)
-                except Exception:
-                    logger.exception("Failed to send forced final message")
-            await self.db.end_session(entry.session_id, ended_at=int(time.time()), status="ended")
             async with self._lock:
-                await self._cancel_tasks(entry)
-                self._sessions.pop(entry.phone, None)
-        except asyncio.CancelledError:
-            return
+                if self._is_live(entry):
+                    await self._end_entry(entry)
         except Exception:
-            logger.exception("Error in forced watcher for session %s", entry.session_id)
+            logger.exception("Failed to end session %s", entry.session_id)
             
     async def end_session(self, phone: str, client, reason: str = "ended"):
         """Manually end a user session."""
@@ -724,17 +1201,14 @@ class SessionManager:
             if not entry:
                 return False
             try:
-                await self.db.end_session(entry.session_id, ended_at=int(time.time()), status=reason)
+                await self._end_entry(entry, status=reason)
             except Exception:
+                # keep the session so it can be ended again
+                self._sessions[phone] = entry
                 logger.exception("Failed to end session in DB")
                 return False
             if USE_END_SESSION_MESSAGE:
-                try:
-                    client.sendText(entry.jid, END_SESSION_MESSAGE)
-                except Exception:
-                    logger.exception("Failed to send session end message")
-            await self._cancel_tasks(entry)
-            self._sessions.pop(phone, None)
+                await self._send(client, entry.jid, END_SESSION_MESSAGE, "session end message")
             logger.info(f"Session {entry.session_id} for {phone} ended manually with reason: {reason}")
             return True
 
@@ -749,14 +1223,44 @@ async def _ensure_db_and_manager():
     global _DB, _SESSION_MANAGER
     async with _db_init_lock:
         if _DB is None:
-            _DB = ChatDB(DB_PATH)
+            chat_db_config: Dict = get_config_data().get("chat_db") or {}
+            _DB = ChatDB(
+                DB_PATH,
+                batch_window=chat_db_config.get("batch_window", 0.0),
+                max_batch=chat_db_config.get("max_batch", 64),
+                readers=chat_db_config.get("readers", 4),
+                config_cache_size=chat_db_config.get("config_cache_size", 50000),
+                config_cache_ttl=chat_db_config.get("config_cache_ttl", 3600.0),
+                compression=chat_db_config.get("compression", "zlib"),
+                compress_threshold=chat_db_config.get("compress_threshold", 0),
+                message_uuids=chat_db_config.get("message_uuids", False),
+            )
             await _DB.initialize()
-            _SESSION_MANAGER = SessionManager(_DB)
+            _SESSION_MANAGER = SessionManager(
+                _DB,
+                flush_interval=chat_db_config.get("activity_flush_interval", 5.0),
+            )
+            try:
+                await _SESSION_MANAGER.recover()
+            except Exception:
+                logger.exception("Failed to recover active sessions")
+            _SESSION_MANAGER.start()
             
 async def get_chat_db() -> ChatDB:
     await _ensure_db_and_manager()
     return _DB
 
+async def close_chat_db():
+    """Save pending session activity, then stop the DB writer."""
+    global _DB, _SESSION_MANAGER
+    async with _db_init_lock:
+        if _SESSION_MANAGER is not None:
+            await _SESSION_MANAGER.stop()
+            _SESSION_MANAGER = None
+        if _DB is not None:
+            await _DB.close()
+            _DB = None
+
 # -----------------------------
 # Chat response logic
 # -----------------------------
@@ -892,26 +1396,27 @@ async def full_fetch_ai(
     reply = await fetch_ai_reply(httpx_client, token, llm_messages, bot_agent_id)
     return reply, None
     
+def _resolve_receivers(raw_phone_number: str, raw_lid_number: str):
+    if USE_RECEIVER_PHONE_MAPPING:
+        default_receiver = RECEIVER_PHONE_MAPPING.get("*")
+        mapped_receiver = RECEIVER_PHONE_MAPPING.get(raw_phone_number, default_receiver)
+        return mapped_receiver.get("phone"), mapped_receiver.get("lid")
+    return raw_phone_number, raw_lid_number
+
 async def send_text_wrapper(
     client,
     raw_phone_number: str,
     raw_lid_number: str,
     text: str,
 ):
-    if USE_RECEIVER_PHONE_MAPPING:
-        default_receiver = RECEIVER_PHONE_MAPPING.get("*")
-        mapped_receiver = RECEIVER_PHONE_MAPPING.get(raw_phone_number, default_receiver)
-        phone_receiver = mapped_receiver.get("phone")
-        lid_receiver = mapped_receiver.get("lid")
-        try:
-            client.sendText(phone_receiver, text)
-        except WAError:
-            client.sendText(lid_receiver, text)
-    else:
-        try:
-            client.sendText(raw_phone_number, text)
-        except WAError:
-            client.sendText(raw_lid_number, text)
+    phone_receiver, lid_receiver = _resolve_receivers(raw_phone_number, raw_lid_number)
+
+    wa_client = as_async_openwa_client(client)
+    await get_send_scheduler().send(
+        phone_receiver,
+        lambda: wa_client.send_text(phone_receiver, text, fallback=lid_receiver),
+        priority=PRIORITY_CHAT,
+    )
             
 async def send_file_wrapper(
     client,
@@ -921,53 +1426,21 @@ async def send_file_wrapper(
     filename: str = "file",
     caption: str = "",
 ):
-    if USE_RECEIVER_PHONE_MAPPING:
-        default_receiver = RECEIVER_PHONE_MAPPING.get("*")
-        mapped_receiver = RECEIVER_PHONE_MAPPING.get(raw_phone_number, default_receiver)
-        phone_receiver = mapped_receiver.get("phone")
-        lid_receiver = mapped_receiver.get("lid")
-        try:
-            client.sendFile(
-                phone_receiver, 
-                file, 
-                filename, 
-                caption
-            )
-        except WAError:
-            client.sendFile(
-                lid_receiver, 
-                file, 
-                filename, 
-                caption
-            )
-    else:
-        try:
-            client.sendFile(
-                raw_phone_number, 
-                file, 
-                filename, 
-                caption
-            )
-        except WAError:
-            client.sendFile(
-                raw_lid_number, 
-                file, 
-                filename, 
-                caption
-            )
+    phone_receiver, lid_receiver = _resolve_receivers(raw_phone_number, raw_lid_number)
+
+    wa_client = as_async_openwa_client(client)
+    await get_send_scheduler().send(
+        phone_receiver,
+        lambda: wa_client.send_file(
+            phone_receiver, 
+            file, 
+            filename, 
+            caption,
+            fallback=lid_receiver,
+        ),
+        priority=PRIORITY_CHAT,
+    )
             
-async def reset_agent_after_delay(phone, delay_seconds: int):
-    """Wait for the delay, then set disable_agent back to False."""
-    await asyncio.sleep(delay_seconds)
-    try:
-        await _DB.update_config(
-            phone=phone,
-            values={"disable_agent": False}
-        )
-        logger.info(f"Successfully re-enabled agent for {phone} after delay.")
-    except Exception:
-        logger.exception(f"Failed to reset disable_agent for {phone}")
-
 async def chat_response(
     msg: Dict[str, Any],
     client,
@@ -1039,7 +1512,8 @@ async def chat_response(
         # await _DB.add_message(entry.session_id, sender="bot", body=intro_message)
         
         # Seen/Read the Message
-        client.sendSeen(phone_jid)
+        wa_client = as_async_openwa_client(client)
+        await wa_client.send_seen(phone_jid)
 
         # store user message
         try:
@@ -1053,7 +1527,7 @@ async def chat_response(
             if USE_WAITING_MESSAGE:
                 reply = WAITING_MESSAGE
                 try:
-                    client.sendText(phone_jid, reply)
+                    await wa_client.send_text(phone_jid, reply)
                 except Exception:
                     logger.exception("Failed to send wait reply to %s", phone_jid)
     
@@ -1067,13 +1541,10 @@ async def chat_response(
             return reply
         
         
-        # Build a simple context from last user messages
-        messages = await _DB.get_messages_for_session(entry.session_id, limit=20)
+        # Build a simple context from the 10 most recent messages (oldest first)
+        last_messages = await _DB.tail(entry.session_id, 10)
 
-        # Messages are now ordered oldest first, so get the last 10 as the most recent
-        last_messages = messages[-10:] if len(messages) >= 10 else messages
-
-        last_message = messages[-1]
+        last_message = last_messages[-1]
         logger.info(f"Get last message: {last_message}")
         
         # Build LLM messages for context (now naturally ordered oldest to newest)
@@ -1108,9 +1579,8 @@ async def chat_response(
                 phone=phone,
                 values={"disable_agent": True},
                 create_if_not_exists=True,
+                expires_at=int(time.time()) + 3600,  # re-enabled after 1 hour, kept across restarts
             )
-            # Fire and forget: this runs in the background for 1 hour
-            asyncio.create_task(reset_agent_after_delay(phone, 3600))
             await send_text_wrapper(
                 client=client,
                 raw_phone_number=raw_phone_number,
@@ -1132,7 +1602,7 @@ async def chat_response(
                 """Start simulating typing after 1 second delay"""
                 try:
                     await typing_task
-                    client.simulateTyping(phone_jid, True)
+                    await wa_client.simulate_typing(phone_jid, True)
                     logger.debug(f"Started typing indicator for {phone_jid}")
                 except asyncio.CancelledError:
                     # Typing was cancelled before starting (response was fast)
@@ -1194,7 +1664,7 @@ async def chat_response(
                             
                             if USE_WAITING_MESSAGE:
                                 waiting_text = WAITING_MESSAGE
-                                client.sendText(phone_jid, waiting_text)
+                                await wa_client.send_text(phone_jid, waiting_text)
                                 await _DB.add_message(entry.session_id, sender="bot", body=waiting_text)
                             waiting_message_sent = True
                         except Exception:
@@ -1267,7 +1737,7 @@ async def chat_response(
                     
                     # Always stop typing indicator
                     try:
-                        client.simulateTyping(phone_jid, False)
+                        await wa_client.simulate_typing(phone_jid, False)
                     except Exception:
                         logger.exception("Failed to stop typing indicator")
                     
@@ -1386,73 +1856,31 @@ def register_conv_handler(bot, openai_client: OpenAI):
             if raw_phone_number in SENDER_PHONE_MAPPING.keys():
                 raw_phone_number = SENDER_PHONE_MAPPING[raw_phone_number]
         
-        phone_number = raw_phone_number.split("@")[0]
-        lid_number = raw_lid_number.split("@")[0]
+        # Senders that only carry a LID are resolved through the identity index
+        identity = get_identity_index()
+        phone_number = normalize_phone(raw_phone_number) or identity.phone_for(raw_lid_number)
+        if not phone_number:
+            logger.warning(f"Can't resolve a phone number for sender {raw_phone_number}, {raw_lid_number}")
+            return
+        lid_number = strip_jid(raw_lid_number) or identity.lid_for(phone_number) or ""
         
         # Alternative phone number data
-        wplus_phone_number = "+" + phone_number
-        local_phone_number = "0" + phone_number[2:]
+        wplus_phone_number = to_wplus_phone_number(phone_number)
+        local_phone_number = to_local_phone_number(phone_number)
         
         logger.info(f"{phone_number} messaged with info: phone_number: {phone_number}, lid_number: {lid_number}, wplus_phone_number: {wplus_phone_number}, local_phone_number: {local_phone_number}")
         # If phone_number is not verified
         
-        # Max 3 users per question referred
-        max_api_token_users = 3
-        
-        query = f"""
-SELECT
-    id,
-    name,
-    api_token,
-    wa_number
-FROM (
-    SELECT
-        id,
-        name,
-        api_token,
-        wa_number,
-        updated_at,
-        ROW_NUMBER() OVER (
-            PARTITION BY (
-                CASE 
-                    WHEN parent_id IS NOT NULL AND parent_id != 0 
-                    -- Group by parent_id if it exists
-                    THEN CAST(parent_id AS CHAR) 
-                    -- Otherwise, group by unique ID so it isn't filtered
-                    ELSE CAST(id AS CHAR) 
-                END
-            )
-            ORDER BY updated_at DESC
-        ) as row_num
-    FROM users
-    WHERE
-        (
-            phone_number = :local_phone_number
-        )
-        AND deleted_at IS NULL
-) AS filtered_users
-WHERE row_num = 1
-ORDER BY updated_at DESC
-LIMIT {max_api_token_users};
-        """
-        # NOTE: TEMPORARILY REMOVE RULE TO BE VERIFIED
-        # AND wa_verified = 1
-        async with httpx.AsyncClient() as httpx_client:
-            response = await httpx_client.post(db_query_url, json={
-                "query": query,
-                "params": {
-                    "wa_number": str(phone_number),
-                    "wa_lid": str(lid_number),
-                    "phone_number": str(phone_number),
-                    "wplus_phone_number": str(wplus_phone_number),
-                    "local_phone_number": str(local_phone_number),
-                }
-            })
-            response_sql: Dict = response.json()
+        # Numbers that just had no accounts are not looked up again for a while
+        if is_unresolved_sender(phone_number, lid_number):
+            logger.debug(f"{phone_number} is a recently unresolved sender, skipping")
+            return
         
-        rows = response_sql.get("rows") or []
-        logger.info(f"User rows: {response_sql}")
+        # Accounts on this number (cached, see agent/accounts.py)
+        rows = await get_phone_accounts(local_phone_number)
+        logger.info(f"User rows: {rows}")
         if not rows:
+            mark_unresolved_sender(phone_number, lid_number)
             # logger.error(f"User {phone_number} not verified")
             # NOTE: DEATIVATED NOT VERIFIED USER MESSAGE
             # response = "Mohon maaf, nomor WhatsApp anda belum terverifikasi oleh sistem kami!"
@@ -1466,11 +1894,8 @@ LIMIT {max_api_token_users};
             return
         
         
-        api_tokens = [
-            row["api_token"]
-            for row in response_sql.get("rows", [])
-            if "api_token" in row
-        ]
+        identity.link_users(phone_number, [row.id for row in rows])
+        api_tokens = [row.api_token for row in rows]
 
         # api_token = response_sql.get("rows")[0].get("api_token")
         if not api_tokens:
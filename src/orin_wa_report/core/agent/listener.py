@@ -2,7 +2,9 @@ import re
 import asyncio
 import inspect
 
-from src.orin_wa_report.core.openwa import SocketClient
+from src.orin_wa_report.core.identity import get_identity_index
+from src.orin_wa_report.core.openwa import SocketClient, AsyncSocketClient
+from src.orin_wa_report.core.rate_limit import get_inbound_rate_limiter
 
 class MessageHandler:
     def __init__(self, open_wa_client: SocketClient):
@@ -21,7 +23,7 @@ class MessageHandler:
         self._handler = fn
 
 class ChatBotHandler:
-    def __init__(self, client: SocketClient):
+    def __init__(self, client: SocketClient | AsyncSocketClient):
         self.client = client
         self.routes = []   # list of (pattern, handler)
         self.fallback = None
@@ -29,6 +31,12 @@ class ChatBotHandler:
         self.loop = asyncio.get_event_loop()  # capture main loop
 
         async def wrapper(msg):
+            # Drop floods from one sender before any DB or OpenWA work
+            data = msg.get("data") or {}
+            if not data.get("fromMe") and not get_inbound_rate_limiter().allow(data.get("from")):
+                return
+            # Keep phone <-> LID pairs current for the send paths
+            get_identity_index().learn_from_message(msg)
             text = msg["data"].get("body", "")
 
             for pattern, handler in self.routes:
@@ -42,7 +50,11 @@ class ChatBotHandler:
             # Schedule wrapper safely on the main loop
             asyncio.run_coroutine_threadsafe(wrapper(msg), self.loop)
 
-        self.client.onAnyMessage(sync_wrapper)
+        if isinstance(client, AsyncSocketClient):
+            # Events already arrive on the loop
+            self.client.onAnyMessage(wrapper)
+        else:
+            self.client.onAnyMessage(sync_wrapper)
 
     async def _call_handler(self, handler, msg):
         if inspect.iscoroutinefunction(handler):
@@ -2,12 +2,14 @@ import asyncio
 import re
 import os
 import signal
-from src.orin_wa_report.core.openwa import SocketClient
+from src.orin_wa_report.core.openwa import SocketClient, AsyncSocketClient
 from src.orin_wa_report.core.openai import create_client
 from src.orin_wa_report.core.agent.listener import ChatBotHandler
 from src.orin_wa_report.core.agent.handler import (
     register_conv_handler,
 )
+from src.orin_wa_report.core.agent.accounts import warm_phone_account_cache
+from src.orin_wa_report.core.config import get_config_data
 from src.orin_wa_report.core.logger import get_logger
 
 logger = get_logger(__name__, service="Agent")
@@ -39,7 +41,7 @@ def printResponse(message):
 #     client = await loop.run_in_executor(None, blocking_init)
 #     return client
 
-async def run_bot(openwa_client: SocketClient):
+async def run_bot(openwa_client: SocketClient | AsyncSocketClient):
     logger.info("🚀 Starting WhatsApp bot...")
     # client = await init_openwa_client()
     bot = ChatBotHandler(openwa_client)
@@ -48,6 +50,10 @@ async def run_bot(openwa_client: SocketClient):
     logger.debug("⚙️ Bot initialized, registering handlers...")
     
     register_conv_handler(bot=bot, openai_client=openai_client)
+    
+    # Preload sender -> accounts so the first messages skip the lookup
+    if (get_config_data().get("phone_account_cache") or {}).get("warm_up", False):
+        asyncio.create_task(warm_phone_account_cache())
 
     logger.info("✅ Bot is running. Waiting for messages...")
     
@@ -56,7 +62,10 @@ async def run_bot(openwa_client: SocketClient):
     # Graceful shutdown handler
     async def shutdown():
         logger.info("🛑 Shutting down socket client...")
-        await asyncio.to_thread(openwa_client.disconnect)
+        if isinstance(openwa_client, AsyncSocketClient):
+            await openwa_client.disconnect()
+        else:
+            await asyncio.to_thread(openwa_client.disconnect)
         logger.info("✅ Socket client disconnected.")
 
     loop = asyncio.get_running_loop()
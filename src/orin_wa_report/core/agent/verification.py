@@ -4,7 +4,8 @@ from src.orin_wa_report.core.development.verify_wa import (
     verify_wa_key_and_store_wa_number
 )
 from src.orin_wa_report.core.logger import get_logger
-from src.orin_wa_report.core.openwa import WAError
+from src.orin_wa_report.core.clients import as_async_openwa_client
+from src.orin_wa_report.core.identity import strip_jid
 
 logger = get_logger(__name__, service="Agent")
 
@@ -40,8 +41,8 @@ async def verify_wa_bot(msg, client):
         raw_phone_number = msg["data"]["sender"].get("phoneNumber")
         raw_lid_number = msg["data"]["sender"].get("lid")
         
-        phone_number = raw_phone_number.split("@")[0]
-        lid_number = raw_lid_number.split("@")[0]
+        phone_number = strip_jid(raw_phone_number)
+        lid_number = strip_jid(raw_lid_number)
         user_name = msg["data"].get("sender").get("pushname", "")
         message = msg["data"].get("body", "")
         
@@ -67,8 +68,7 @@ async def verify_wa_bot(msg, client):
         else:
             logger.info(f"User with number: phone-({phone_number})/lid-({lid_number}) key not match")
             response = "Maaf, kode verifikasi Anda tidak sesuai. Silakan coba lagi."
-        try:
-            client.sendText(raw_phone_number, response)
-        except WAError:
-            client.sendText(raw_lid_number, response)
+        await as_async_openwa_client(client).send_text(
+            raw_phone_number, response, fallback=raw_lid_number
+        )
             
\ No newline at end of file
@@ -0,0 +1,261 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.orin_wa_report.core.config import get_config_data
+
+
+class AlertRecord:
+    """One alert_notifications row, only the columns the dispatch path reads."""
+    __slots__ = (
+        "id", "user_id", "device_id", "alert_type", "device_name", "message", "wa_number", "wa_lid",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        user_id: int,
+        alert_type: str,
+        device_name: Optional[str],
+        message: Optional[str],
+        wa_number: Optional[str],
+        wa_lid: Optional[str],
+        device_id: Optional[int] = None,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.device_id = device_id
+        self.alert_type = alert_type
+        self.device_name = device_name
+        self.message = message
+        self.wa_number = wa_number
+        self.wa_lid = wa_lid
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "AlertRecord":
+        return cls(
+            int(row["id"]),
+            row["user_id"],
+            row["alert_type"],
+            row.get("device_name"),
+            row.get("message"),
+            row.get("wa_number"),
+            row.get("wa_lid"),
+            row.get("device_id"),
+        )
+
+    def to_row(self) -> Dict:
+        """The columns from_row() reads, e.g. to persist a held alert."""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @property
+    def recipient(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.wa_number, self.wa_lid
+
+
+DEFAULT_DIGEST_PROMPT = r"Notifikasi ORIN! {count} peringatan baru untuk kendaraan anda:"
+DEFAULT_DIGEST_ITEM_PROMPT = r"- ({device_name}) {message}"
+DIGEST_PROMPT_SETTINGS = ("prompt_default", "prompt_digest", "prompt_digest_item")
+
+
+class NotificationTemplates:
+    """
+    The prompt_{alert_type} / prompt_default settings compiled once per
+    notification settings version into alert_type -> str.format lookups.
+    prompt_digest (header, {count}) and prompt_digest_item (one line per
+    alert, {device_name} {message} {alert_type} {repeat}) build digests.
+    """
+    def __init__(self, notification_setting: Dict[str, str], version: int = 0):
+        self.version = version
+        self._default: Callable[..., str] = notification_setting.get("prompt_default").format
+        self._by_type: Dict[str, Callable[..., str]] = {
+            setting[len("prompt_"):]: value.format
+            for setting, value in notification_setting.items()
+            if setting.startswith("prompt_") and setting not in DIGEST_PROMPT_SETTINGS and value
+        }
+        self.digest: Callable[..., str] = (
+            notification_setting.get("prompt_digest") or DEFAULT_DIGEST_PROMPT
+        ).format
+        digest_item = notification_setting.get("prompt_digest_item") or DEFAULT_DIGEST_ITEM_PROMPT
+        self.digest_item: Callable[..., str] = digest_item.format
+        self.digest_item_has_repeat = "{repeat}" in digest_item
+
+    def formatter(self, alert_type: str) -> Callable[..., str]:
+        return self._by_type.get(alert_type, self._default)
+
+
+class AlertCoalescer:
+    """
+    Coalesces alerts per recipient so a flapping device or repeated geofence
+    crossings become one digest message instead of one sendText each.
+
+    The first alert for a recipient goes out on the next flush. Sending it
+    opens a `window_seconds` window for that recipient: follow-ups arriving
+    inside it are held and sent as one digest when it closes, which opens the
+    next window. A recipient with nothing held when its window closes gets
+    its next alert immediately again.
+
+    With `dedupe`, alerts for the same device and alert type inside a window
+    collapse into the latest one with a repeat count. A group is flushed
+    early once it holds `max_items` distinct entries.
+    """
+    def __init__(
+        self,
+        window_seconds: float = 0,
+        dedupe: bool = True,
+        max_items: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.dedupe = dedupe
+        self.max_items = max_items
+        self._clock = clock
+        # recipient (or alert id when disabled) -> _DigestGroup
+        self._pending: Dict[Tuple, _DigestGroup] = {}
+        # ids of every held alert, deduped ones included
+        self._ids: Dict[int, Tuple] = {}
+        # recipient -> when its current window closes
+        self._window_until: Dict[Tuple, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, records: Iterable[AlertRecord]):
+        now = self._clock()
+        for record in records:
+            if record.id in self._ids:
+                continue
+            # without a window every alert is its own message
+            group_key = record.recipient if self.enabled else record.id
+            group = self._pending.get(group_key)
+            if group is None:
+                # due now, or when the window opened by the last send closes
+                due_at = max(now, self._window_until.get(group_key, now))
+                group = self._pending[group_key] = _DigestGroup(group_key, now, due_at)
+            entry_key = (record.device_id or record.device_name, record.alert_type) if self.dedupe else record.id
+            group.add(entry_key, record)
+            self._ids[record.id] = group_key
+
+    def _is_due(self, group: "_DigestGroup", now: float) -> bool:
+        return now >= group.due_at or len(group.entries) >= self.max_items
+
+    def flush_due(self, force: bool = False) -> List["_DigestGroup"]:
+        """Pop and return every group whose window closed (or is full)."""
+        now = self._clock()
+        due = [
+            group_key for group_key, group in self._pending.items()
+            if force or self._is_due(group, now)
+        ]
+        groups = []
+        for group_key in due:
+            group = self._pending.pop(group_key)
+            for alert_id in group.ids:
+                self._ids.pop(alert_id, None)
+            groups.append(group)
+        if self.enabled:
+            # closed windows without follow-ups carry no state
+            for group_key in [k for k, until in self._window_until.items() if until <= now]:
+                del self._window_until[group_key]
+            for group in groups:
+                self._window_until[group.key] = now + self.window_seconds
+        return groups
+
+    def restore(self, groups: List["_DigestGroup"]):
+        """Put groups back after a failed flush, they stay due."""
+        for group in groups:
+            self._pending[group.key] = group
+            for alert_id in group.ids:
+                self._ids[alert_id] = group.key
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the oldest group is due, None when nothing is held."""
+        if not self._pending:
+            return None
+        return max(0.0, min(group.due_at for group in self._pending.values()) - self._clock())
+
+
+class _DigestGroup:
+    __slots__ = ("key", "first_seen", "due_at", "entries", "ids")
+
+    def __init__(self, key, first_seen: float, due_at: float):
+        self.key = key
+        self.first_seen = first_seen
+        self.due_at = due_at
+        # key -> [latest record, repeat]
+        self.entries: Dict = {}
+        self.ids: List[int] = []
+
+    def add(self, key, record: AlertRecord):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [record, 1]
+        else:
+            entry[0] = record
+            entry[1] += 1
+        self.ids.append(record.id)
+
+    def items(self) -> List[Tuple[AlertRecord, int]]:
+        return sorted(((record, repeat) for record, repeat in self.entries.values()), key=lambda e: e[0].id)
+
+
+def render_digest_messages(
+    groups: Iterable[_DigestGroup],
+    templates: NotificationTemplates,
+) -> List[Dict]:
+    """
+    One message per recipient group: a lone alert keeps its own prompt, two
+    or more become a prompt_digest header followed by prompt_digest_item lines.
+    The digest is keyed in the outbox by the group's first alert id.
+    """
+    formatter = templates.formatter
+    messages = []
+    for group in groups:
+        items = group.items()
+        if len(group.ids) == 1:
+            record = items[0][0]
+            message = formatter(record.alert_type)(
+                device_name=record.device_name,
+                message=record.message,
+            )
+        else:
+            lines = [templates.digest(count=len(group.ids))]
+            for record, repeat in items:
+                line = templates.digest_item(
+                    device_name=record.device_name,
+                    message=record.message,
+                    alert_type=record.alert_type,
+                    repeat=repeat,
+                )
+                if repeat > 1 and not templates.digest_item_has_repeat:
+                    line += f" ({repeat}x)"
+                lines.append(line)
+            message = "\n".join(lines)
+        record = items[0][0]
+        messages.append({
+            "alert_id": min(group.ids),
+            "to": f"{record.wa_number}@c.us",
+            "to_fallback": f"{record.wa_lid}@lid",
+            "message": message,
+        })
+    return messages
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_ALERT_COALESCER: Optional[AlertCoalescer] = None
+
+
+def get_alert_coalescer() -> AlertCoalescer:
+    global _ALERT_COALESCER
+    if _ALERT_COALESCER is None:
+        digest_config: Dict = get_config_data().get("alert_digest") or {}
+        _ALERT_COALESCER = AlertCoalescer(
+            window_seconds=digest_config.get("window_seconds", 0),
+            dedupe=digest_config.get("dedupe", True),
+            max_items=digest_config.get("max_items", 20),
+        )
+    return _ALERT_COALESCER
@@ -0,0 +1,317 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.db import get_alert_outbox_db
+from src.orin_wa_report.core.logger import get_logger
+from src.orin_wa_report.core.models import AlertIdRow, DBStatement
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
+
+logger = get_logger(__name__, service="FastAPI")
+
+ALERT_FETCH_QUERY = """
+SELECT
+    an.*,
+    u.wa_number,
+    u.wa_lid,
+    u.wa_notif,
+    u.wa_verified,
+    d.device_name
+FROM alert_notifications an
+JOIN users u ON u.id = an.user_id
+LEFT JOIN devices d ON d.id = an.device_id
+WHERE an.id > :id{alert_type_filter}
+  AND u.wa_notif = 1
+  AND u.wa_verified = 1
+  AND u.deleted_at IS NULL
+ORDER BY an.id ASC
+LIMIT {limit};
+"""
+
+ALERT_LAST_ID_QUERY = "SELECT id FROM alert_notifications ORDER BY id DESC LIMIT 1"
+
+
+def build_alert_fetch_query(
+    last_id: int,
+    limit: int,
+    alert_types: Optional[Iterable[str]] = None,
+) -> Tuple[str, Dict]:
+    """
+    Build the cursor page query. When alert_types is given the rows are
+    filtered by `an.alert_type IN (...)` in MySQL, one bound parameter per type.
+    """
+    params = {"id": last_id}
+    alert_type_filter = ""
+    if alert_types is not None:
+        alert_types = list(alert_types)
+        if alert_types:
+            placeholders = []
+            for i, alert_type in enumerate(alert_types):
+                params[f"alert_type_{i}"] = alert_type
+                placeholders.append(f":alert_type_{i}")
+            alert_type_filter = f"\n  AND an.alert_type IN ({', '.join(placeholders)})"
+        else:
+            alert_type_filter = "\n  AND 1 = 0"
+    query = ALERT_FETCH_QUERY.format(limit=int(limit), alert_type_filter=alert_type_filter)
+    return query, params
+
+
+class AlertSource:
+    """
+    Base class for everything that produces batches of alert_notifications rows.
+
+    Each row is a dict with the columns of ALERT_FETCH_QUERY (alert columns plus
+    wa_number, wa_lid and device_name). Every backend feeds the same dispatch
+    pipeline in api/utils.py through get_batch().
+    """
+    name = "base"
+
+    def __init__(self):
+        self.last_id: Optional[int] = None
+        # Alert types worth dispatching, None means every type. Sources that
+        # query a database push this into the query itself.
+        self.alert_types: Optional[List[str]] = None
+
+    async def next_batch(self) -> List[Dict]:
+        """Wait for the next batch of rows, may be empty when the source is idle."""
+        raise NotImplementedError
+
+    async def get_batch(self, timeout: float) -> List[Dict]:
+        """
+        Same as next_batch() but returns an empty list after `timeout` seconds,
+        so the caller can re-check the settings while the source is idle.
+        """
+        try:
+            return await asyncio.wait_for(self.next_batch(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+
+    def reset(self):
+        """Forget the cursor, the next batch starts from the newest alert."""
+        self.last_id = None
+
+    def _advance(self, rows: List[Dict]) -> List[Dict]:
+        """Drop rows at or behind the cursor and move the cursor forward."""
+        if self.last_id is not None:
+            rows = [row for row in rows if int(row["id"]) > self.last_id]
+        if rows:
+            self.last_id = max(int(row["id"]) for row in rows)
+        return rows
+
+
+class PollingAlertSource(AlertSource):
+    """
+    Cursor poller against the DB query gateway.
+
+    The poll interval adapts to the table: a full page is followed by an
+    immediate re-poll so a backlog drains at gateway speed, a partial page
+    re-polls after `min_interval`, and empty pages back off exponentially
+    up to `max_interval`.
+    """
+    name = "polling"
+
+    def __init__(
+        self,
+        url: str,
+        page_size: int = 1000,
+        min_interval: float = 0.5,
+        max_interval: float = 6.0,
+        backoff: float = 2.0,
+    ):
+        super().__init__()
+        self.url = url
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._delay = 0.0
+        # Loop time of the next poll, the backoff sleep runs until then
+        self._poll_at = 0.0
+
+    async def _fetch_last_id(self) -> int:
+        result = await get_db_gateway().execute(
+            DBStatement(query=ALERT_LAST_ID_QUERY, row_model=AlertIdRow), url=self.url,
+        )
+        return result.rows[0].id if result.rows else 0
+
+    async def _fetch_page(self) -> List[Dict]:
+        query, params = build_alert_fetch_query(
+            last_id=self.last_id,
+            limit=self.page_size,
+            alert_types=self.alert_types,
+        )
+        result = await get_db_gateway().execute(DBStatement(query=query, params=params), url=self.url)
+        return result.rows
+
+    async def next_batch(self) -> List[Dict]:
+        """One poll cycle, returns an empty list when the table is idle."""
+        wait = self._poll_at - asyncio.get_running_loop().time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        if self.last_id is None:
+            logger.info("Alert source: Undefined alert id, fetch one...")
+            self.last_id = await self._fetch_last_id()
+            logger.info(f"Get alert_last_id: {self.last_id}")
+            self._schedule(self.min_interval)
+            return []
+
+        rows = await self._fetch_page()
+        if len(rows) >= self.page_size:
+            self._schedule(0.0)
+        elif rows:
+            self._schedule(self.min_interval)
+        else:
+            self._schedule(min(
+                max(self._delay * self.backoff, self.min_interval),
+                self.max_interval,
+            ))
+        return self._advance(rows)
+
+    async def get_batch(self, timeout: float) -> List[Dict]:
+        # Never cancel a poll halfway. When the next poll is further away
+        # than `timeout` (a digest falls due first) return early, the
+        # remaining backoff is slept on the next call.
+        wait = self._poll_at - asyncio.get_running_loop().time()
+        if wait > timeout:
+            await asyncio.sleep(max(timeout, 0))
+            return []
+        return await self.next_batch()
+
+    def reset(self):
+        super().reset()
+        self._delay = 0.0
+        self._poll_at = 0.0
+
+    def _schedule(self, delay: float):
+        self._delay = delay
+        self._poll_at = asyncio.get_running_loop().time() + delay
+
+
+class PushAlertSource(AlertSource):
+    """
+    Receives alert batches pushed to the ingest endpoint (POST /alert/ingest).
+
+    Pushed rows must carry the same columns as the polling query. push()
+    stores them in the alert outbox's inbox before returning, so an accepted
+    batch survives a restart, and next_batch() drains the inbox in push order.
+    The cursor is the inbox seq rather than an alert id: the producer owns
+    delivery order, so rows are never dropped for being behind an alert id,
+    and a batch whose dispatch failed is read from the inbox again.
+
+    At most `max_pending` rows wait at once. push() never waits for room: a
+    batch that doesn't fit raises asyncio.QueueFull (the producer retries
+    later) and one larger than `max_pending` raises ValueError.
+    """
+    name = "push"
+
+    def __init__(self, max_pending: int = 10000, page_size: int = 1000):
+        super().__init__()
+        self.max_pending = max_pending
+        self.page_size = page_size
+        # Newest inbox seq, None until read from the outbox
+        self._head: Optional[int] = None
+        # Rows of pushes between the room check and their commit
+        self._reserved = 0
+        self._pushed = asyncio.Event()
+
+    async def _load_head(self):
+        if self._head is not None:
+            return
+        self._head = await (await get_alert_outbox_db()).inbox_head()
+        if self.last_id is not None and self.last_id > self._head:
+            # A cursor stored before pushed rows went through the inbox is an alert id
+            logger.warning(f"Push alert cursor {self.last_id} is ahead of the inbox, starting at {self._head}")
+            self.last_id = self._head
+
+    async def push(self, rows: List[Dict]) -> int:
+        """Store a batch of rows, returns how many rows were accepted."""
+        if not rows:
+            return 0
+        if len(rows) > self.max_pending:
+            raise ValueError(f"Batch of {len(rows)} alerts is larger than max_pending ({self.max_pending})")
+        await self._load_head()
+        if self.pending() + self._reserved + len(rows) > self.max_pending:
+            raise asyncio.QueueFull()
+        self._reserved += len(rows)
+        try:
+            head = await (await get_alert_outbox_db()).append_inbox(rows)
+        finally:
+            self._reserved -= len(rows)
+        self._head = max(self._head, head)
+        self._pushed.set()
+        return len(rows)
+
+    def pending(self) -> int:
+        """Stored rows not yet handed to the dispatcher."""
+        if self._head is None:
+            return 0
+        return max(0, self._head - (self.last_id or 0))
+
+    async def next_batch(self) -> List[Dict]:
+        while True:
+            batch = await self._read_batch()
+            if batch:
+                return batch
+            await self._pushed.wait()
+
+    async def get_batch(self, timeout: float) -> List[Dict]:
+        # Waits for a push instead of cancelling an inbox read halfway
+        batch = await self._read_batch()
+        if batch or timeout <= 0:
+            return batch
+        try:
+            await asyncio.wait_for(self._pushed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return await self._read_batch()
+
+    async def _read_batch(self) -> List[Dict]:
+        await self._load_head()
+        # Cleared before reading, a push landing meanwhile sets it again
+        self._pushed.clear()
+        outbox = await get_alert_outbox_db()
+        entries = await outbox.read_inbox(self.last_id or 0, limit=self.page_size, source=self.name)
+        if not entries:
+            return []
+        self.last_id = entries[-1][0]
+        batch = [row for _, row in entries]
+        batch.sort(key=lambda row: int(row["id"]))
+        return batch
+
+    def reset(self):
+        # Pushed rows are only sent once, there is no newest id to jump to
+        pass
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_ALERT_SOURCE: Optional[AlertSource] = None
+
+
+def create_alert_source(name: str, url: Optional[str] = None) -> AlertSource:
+    alert_source_config: Dict = get_config_data().get("alert_source") or {}
+    if name == "push":
+        return PushAlertSource(
+            max_pending=alert_source_config.get("max_pending", 10000),
+            page_size=alert_source_config.get("page_size", 1000),
+        )
+    if name == "polling":
+        return PollingAlertSource(
+            url=url or get_db_query_endpoint(name="devsites_orin_dev"),
+            page_size=alert_source_config.get("page_size", 1000),
+            min_interval=alert_source_config.get("min_interval", 0.5),
+            max_interval=alert_source_config.get("max_interval", 6.0),
+        )
+    raise ValueError(f"Unknown alert source: {name}")
+
+
+def get_alert_source() -> AlertSource:
+    global _ALERT_SOURCE
+    if _ALERT_SOURCE is None:
+        alert_source_config: Dict = get_config_data().get("alert_source") or {}
+        _ALERT_SOURCE = create_alert_source(alert_source_config.get("backend", "polling"))
+        logger.info(f"Using '{_ALERT_SOURCE.name}' alert source")
+    return _ALERT_SOURCE
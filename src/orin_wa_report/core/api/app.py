@@ -1,20 +1,20 @@
 import os
+import json
 import asyncio
 import logging
 from pydantic import BaseModel
 from typing import List, Optional
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 
-from src.orin_wa_report.core.openwa import WAError
 
 from src.orin_wa_report.core.config import get_config_data
-from src.orin_wa_report.core.clients import get_openwa_client
-from src.orin_wa_report.core.agent.handler import ChatDB, DB_PATH
+from src.orin_wa_report.core.clients import get_openwa_client, get_async_openwa_client
+from src.orin_wa_report.core.agent.handler import close_chat_db, get_chat_db
 from src.orin_wa_report.core.api.routers.client import router as client_router
 from src.orin_wa_report.core.api.routers.alert import router as alert_router
 from src.orin_wa_report.core.api.routers.dev import router as dev_router
@@ -23,8 +23,19 @@ from src.orin_wa_report.core.api.utils import (
     periodic_dummy_notifications,
     periodic_send_notifications,
 )
-from src.orin_wa_report.core.db import SettingsDB, DB_PATH as SETTINGS_DB_PATH
-from src.orin_wa_report.core.models import SendMessageRequest
+from src.orin_wa_report.core.db import (
+    get_settings_db,
+    get_alert_outbox_db,
+    get_identity_db,
+)
+from src.orin_wa_report.core.models import OutboxMessageRequest
+from src.orin_wa_report.core.send_scheduler import get_send_scheduler
+from src.orin_wa_report.core.utils import get_api_token_cache, get_db_gateway
+from src.orin_wa_report.core.agent.accounts import get_phone_account_cache, get_unresolved_sender_cache
+from src.orin_wa_report.core.bulk_send import get_bulk_sender
+from src.orin_wa_report.core.identity import get_identity_index
+from src.orin_wa_report.core.rate_limit import get_inbound_rate_limiter
+from src.orin_wa_report.core.runtime_settings import get_runtime_settings
 from src.orin_wa_report.core.logger import get_logger
 
 from dotenv import load_dotenv
@@ -53,26 +64,33 @@ class EndpointFilter(logging.Filter):
 
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
-# Initialize ChatDB for session management
-chat_db = ChatDB(DB_PATH)
-
-# Initialize SettingDB for setting management
-settings_db = SettingsDB(SETTINGS_DB_PATH)
-
 # Periodic Task
 @app.on_event("startup")
 async def start_background_task():
-    # Initialize chat database
-    await chat_db.initialize()
+    # Pooled client for the DB query gateway
+    await get_db_gateway().start()
+    
+    # Initialize settings database (shared with the routers and alert loop)
+    await get_settings_db()
+    await get_runtime_settings()
+    
+    # Initialize alert outbox database
+    await get_alert_outbox_db()
     
-    # Initialize settings database
-    await settings_db.initialize()
+    # Phone <-> LID <-> user index, saved back in the background
+    identity_index = get_identity_index()
+    await identity_index.load()
+    identity_index.start()
+    
+    # Initialize chat database (shared with the bot and the routers), sessions
+    # left active by the last run are recovered here, after the identity index
+    await get_chat_db()
     
     # Initialize openwa_client
     # asyncio.create_task(init_openwa_client())
     
-    # Message Queue for Bulk Messages
-    asyncio.create_task(message_worker())
+    # Send scheduler for bulk messages and chat replies
+    get_send_scheduler().start()
     
     # Dummy alert notifications creating
     asyncio.create_task(periodic_dummy_notifications())
@@ -83,9 +101,17 @@ async def start_background_task():
 # Disconnect gracefully on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
-    openwa_client.disconnect()
-    await chat_db.close()
-    await settings_db.close()
+    await get_send_scheduler().stop()
+    await get_bulk_sender().close()
+    wa_client = get_async_openwa_client()
+    if wa_client:
+        await wa_client.close()
+    await close_chat_db()
+    await (await get_settings_db()).close()
+    await (await get_alert_outbox_db()).close()
+    await get_identity_index().stop()
+    await (await get_identity_db()).close()
+    await get_db_gateway().close()
 
 # Configure CORS with allowed origins
 origins = os.getenv('CORS_ORIGINS', '').split(',')
@@ -95,6 +121,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],  # pagination and contacts polling, readable by the dashboard
 )
 
 # Templates
@@ -113,31 +140,12 @@ app.mount("/static", StaticFiles(directory="src/orin_wa_report/web/static"), nam
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-# Clients
-openwa_client = get_openwa_client()
-
 ## Bulk Messages
-message_queue = asyncio.Queue()
-
-# --- Worker that runs in background ---
-async def message_worker():
-    while True:
-        msg, delay = await message_queue.get()
-        try:
-            try:
-                openwa_client.sendText(msg.to, msg.message)
-            except WAError:
-                openwa_client.sendText(msg.to_fallback, msg.message)
-            logger.info(f"Message worker to {msg.to} with delay {delay}")
-        except Exception as e:
-            print(f"❌ Failed to send {msg.to}: {e}")
-        if delay and delay > 0:
-            await asyncio.sleep(delay)
-        message_queue.task_done()
-
+# Sends go through the shared SendScheduler (rate limits + per-recipient fairness),
+# the alert loop calls get_bulk_sender() directly
 class BulkMessageRequest(BaseModel):
-    messages: List[SendMessageRequest]   # list of messages
-    delay_seconds: Optional[float] = 0  # optional delay between messages (default: 0)
+    messages: List[OutboxMessageRequest]   # list of messages
+    delay_seconds: Optional[float] = 0  # ignored, pacing is done by the SendScheduler
 
 # --- API Endpoint ---
 @app.post(
@@ -145,13 +153,73 @@ class BulkMessageRequest(BaseModel):
     include_in_schema=False,
 )
 async def send_messages(req: BulkMessageRequest):
-    if openwa_client is None:
+    if get_openwa_client() is None:
         raise HTTPException(status_code=503, detail="WhatsApp client not ready")
 
-    for msg in req.messages:
-        await message_queue.put((msg, req.delay_seconds))
+    job = get_bulk_sender().submit(
+        [msg.model_dump() for msg in req.messages],
+        source="api",
+    )
+
+    return {"status": "queued", "count": len(req.messages), "job_id": job.id}
+
+@app.get(
+    path="/cache/metrics",
+    include_in_schema=False,
+)
+async def cache_metrics():
+    return {
+        "api_token": get_api_token_cache().metrics(),
+        "phone_accounts": get_phone_account_cache().metrics(),
+        "unresolved_senders": get_unresolved_sender_cache().metrics(),
+        "inbound_rate_limit": get_inbound_rate_limiter().metrics(),
+        "identity": get_identity_index().metrics(),
+        "chat_config": (await get_chat_db()).metrics()["config_cache"],
+    }
+
+@app.get(
+    path="/send-messages/metrics",
+    include_in_schema=False,
+)
+async def send_messages_metrics():
+    return get_send_scheduler().metrics()
+
+@app.get(
+    path="/send-messages/jobs",
+    include_in_schema=False,
+)
+async def send_messages_jobs():
+    return [job.snapshot() for job in get_bulk_sender().jobs()]
 
-    return {"status": "queued", "count": len(req.messages)}
+@app.get(
+    path="/send-messages/{job_id}",
+    include_in_schema=False,
+)
+async def send_messages_job(job_id: str):
+    job = get_bulk_sender().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
+@app.get(
+    path="/send-messages/{job_id}/events",
+    include_in_schema=False,
+)
+async def send_messages_job_events(job_id: str):
+    """Server-sent events, one progress snapshot per change until the job is done."""
+    bulk_sender = get_bulk_sender()
+    if bulk_sender.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for snapshot in bulk_sender.watch(job_id):
+            yield f"data: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 # Frontend Demo
 # app.include_router(demo_router)
@@ -169,38 +237,26 @@ class ApplySettings(BaseModel):
     path="/settings",
     include_in_schema=False,
 )
-def get_settings():
-    # logger.info(f"Get Setting, config_data: {config_data}")
-    enable_create_dummy_alert = config_data.get("dummy").get("enable_create_alert", False)
-    enable_send_alert = config_data.get("fastapi").get("enable_send_alert", False)
-    
-    settings = {
-        "enable_create_dummy_alert": enable_create_dummy_alert,
-        "enable_send_alert": enable_send_alert,
-    }
-    
-    return settings
+async def get_settings():
+    runtime_settings = await get_runtime_settings()
+    return runtime_settings.settings.model_dump()
 
 @app.post(
     path="/settings",
     include_in_schema=False,
 )
-def apply_settings(payload: ApplySettings):
-    config_data["dummy"]["enable_create_alert"] = payload.enable_create_dummy_alert
-    config_data["fastapi"]["enable_send_alert"] = payload.enable_send_alert
-    
-    settings = {
-        "enable_create_dummy_alert": payload.enable_create_dummy_alert,
-        "enable_send_alert": payload.enable_send_alert,
-    }
+async def apply_settings(payload: ApplySettings):
+    runtime_settings = await get_runtime_settings()
+    settings = await runtime_settings.update(**payload.model_dump())
     
-    return {"ok": True, "settings": settings}
+    return {"ok": True, "settings": settings.model_dump()}
 
 @app.get(
     path="/whatsapp/disable_agent/{phone_number}",
     include_in_schema=False,
 )
 async def get_disable_agent(phone_number: str):
+    chat_db = await get_chat_db()
     disable_agent = await chat_db.get_config(
         phone=phone_number,
         key="disable_agent",
@@ -234,7 +290,9 @@ async def update_disable_agent(data: DisableAgentUpdate):
         "disable_agent": data.disable_agent
     }
     
-    # 2. Call the update_config method
+    # 2. Call the update_config method, a manual change replaces any timed
+    # re-enable left by a handover
+    chat_db = await get_chat_db()
     await chat_db.update_config(
         phone=data.phone_number,
         values=update_values,
@@ -1,18 +1,21 @@
+import asyncio
 import os
 import urllib.parse
 from pydantic import BaseModel
 from typing import Dict
 
 import pandas as pd
-import httpx
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from src.orin_wa_report.core.db import SettingsDB, get_settings_db
 from src.orin_wa_report.core.development.create_user import create_dummy_user
 from src.orin_wa_report.core.utils import (
+    get_db_gateway,
     get_db_query_endpoint,
     get_user_id_from_api_token,
+    invalidate_api_token,
+    invalidate_api_tokens_of_user,
     vps_db_base_url,
 )
 from src.orin_wa_report.core.logger import get_logger
@@ -36,7 +39,10 @@ from src.orin_wa_report.core.models import (
     PutUserAlertSettingsRequest,
     PutUserAlertSettingsResponse,
     put_user_alert_settings_response_500,
+    IngestAlertsRequest,
 )
+from src.orin_wa_report.core.api.alert_source import PushAlertSource, get_alert_source
+from src.orin_wa_report.core.agent.accounts import invalidate_phone_accounts_of_user
 
 from dotenv import load_dotenv
 load_dotenv(override=True)
@@ -82,26 +88,25 @@ class CreateUser(BaseModel):
     mimic_user: str | None = "None"
     
 async def get_users_util(url: str) -> Dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json={
-            "query": """
-                SELECT
-                    id,
-                    name,
-                    email,
-                    api_token,
-                    wa_key,
-                    wa_notif,
-                    wa_number,
-                    wa_verified,
-                    wa_lid
-                FROM users
-                WHERE
-                    name LIKE 'OrinAI%'
-                    AND deleted_at IS NULL
-            """
-        })
-        response_sql: Dict = response.json()
+    response = await get_db_gateway().post(url, json={
+        "query": """
+            SELECT
+                id,
+                name,
+                email,
+                api_token,
+                wa_key,
+                wa_notif,
+                wa_number,
+                wa_verified,
+                wa_lid
+            FROM users
+            WHERE
+                name LIKE 'OrinAI%'
+                AND deleted_at IS NULL
+        """
+    })
+    response_sql: Dict = response.json()
     return response_sql
 
 # Routes
@@ -133,18 +138,17 @@ async def create_user(payload: CreateUser):
     
     # Get api_token from mimic_user
     if mimic_user != "None":
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url_prod, json={
-                "query": """
-                    SELECT id, api_token
-                    FROM user_tokens
-                    WHERE
-                        user_id = :id
-                    LIMIT 1
-                """,
-                "params": {"id": mimic_user}
-            })
-            response_sql: Dict = response.json()
+        response = await get_db_gateway().post(url_prod, json={
+            "query": """
+                SELECT id, api_token
+                FROM user_tokens
+                WHERE
+                    user_id = :id
+                LIMIT 1
+            """,
+            "params": {"id": mimic_user}
+        })
+        response_sql: Dict = response.json()
         mimic_token = response_sql.get("rows")[0].get("api_token")
         
         
@@ -202,23 +206,26 @@ async def delete_user(user_id: int):
     # Deleting a user
     try:
         url = get_db_query_endpoint(name=APP_STAGE)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": """
-                    UPDATE users
-                    SET
-                        deleted_at = NOW(),
-                        api_token = NULL,
-                        wa_key = "",
-                        wa_notif = 0,
-                        wa_number = "",
-                        wa_verified = 0
-                    WHERE id = :id; COMMIT;
-                """,
-                "params": {"id": user_id},
-                "api_key": ORIN_DB_API_KEY
-            })
-            response_sql: Dict = response.json()
+        response = await get_db_gateway().post(url, json={
+            "query": """
+                UPDATE users
+                SET
+                    deleted_at = NOW(),
+                    api_token = NULL,
+                    wa_key = "",
+                    wa_notif = 0,
+                    wa_number = "",
+                    wa_verified = 0
+                WHERE id = :id; COMMIT;
+            """,
+            "params": {"id": user_id},
+            "api_key": ORIN_DB_API_KEY
+        })
+        response_sql: Dict = response.json()
+        
+        # The user's api_token is gone, drop it from the caches too
+        invalidate_api_tokens_of_user(user_id)
+        invalidate_phone_accounts_of_user(user_id)
         
         return JSONResponse(content={
             "ok": True,
@@ -243,19 +250,18 @@ async def verify_user(token: str = Depends(get_bearer_token)):
         url = get_db_query_endpoint(name=APP_STAGE)
         
         # Get user_id from Bearer token
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": """
-                    SELECT id, api_token
-                    FROM users
-                    WHERE
-                        api_token = :api_token
-                        AND deleted_at IS NULL
-                    LIMIT 1
-                """,
-                "params": {"api_token": token}
-            })
-            response_sql: Dict = response.json()
+        response = await get_db_gateway().post(url, json={
+            "query": """
+                SELECT id, api_token
+                FROM users
+                WHERE
+                    api_token = :api_token
+                    AND deleted_at IS NULL
+                LIMIT 1
+            """,
+            "params": {"api_token": token}
+        })
+        response_sql: Dict = response.json()
             
         if len(response_sql.get("rows")) == 0:
             return JSONResponse(content={
@@ -307,13 +313,12 @@ async def get_user_verification(token: str = Depends(get_bearer_token)):
         
         query = "SELECT wa_verified FROM users WHERE api_token = :api_token AND deleted_at IS NULL LIMIT 1;"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": query,
-                "params": {
-                    "api_token": token
-                }
-            })
+        response = await get_db_gateway().post(url, json={
+            "query": query,
+            "params": {
+                "api_token": token
+            }
+        })
         
         response.raise_for_status()
         response_sql = response.json()
@@ -372,17 +377,17 @@ async def unsubscribe_user(token: str = Depends(get_bearer_token)):
             COMMIT;
         """
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": query,
-                "params": {
-                    "api_token": token
-                },
-                "api_key": ORIN_DB_API_KEY,
-            })
+        response = await get_db_gateway().post(url, json={
+            "query": query,
+            "params": {
+                "api_token": token
+            },
+            "api_key": ORIN_DB_API_KEY,
+        })
             
         response.raise_for_status()
         response_sql = response.json()
+        invalidate_api_token(token)
         
         logger.info(f"User token {token} unsubscribed: {response_sql}")
         return JSONResponse(content={
@@ -410,13 +415,12 @@ async def get_toggle_notification(token: str = Depends(get_bearer_token)):
         
         query = "SELECT wa_notif FROM users WHERE api_token = :api_token AND deleted_at IS NULL LIMIT 1;"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": query,
-                "params": {
-                    "api_token": token
-                }
-            })
+        response = await get_db_gateway().post(url, json={
+            "query": query,
+            "params": {
+                "api_token": token
+            }
+        })
         
         response.raise_for_status()
         response_sql = response.json()
@@ -468,15 +472,14 @@ async def put_toggle_notification(
         
         query = "UPDATE users SET wa_notif = :desired_toggle WHERE api_token = :api_token AND deleted_at IS NULL; COMMIT;"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={
-                "query": query,
-                "params": {
-                    "desired_toggle": desired_toggle,
-                    "api_token": token
-                },
-                "api_key": ORIN_DB_API_KEY,
-            })
+        response = await get_db_gateway().post(url, json={
+            "query": query,
+            "params": {
+                "desired_toggle": desired_toggle,
+                "api_token": token
+            },
+            "api_key": ORIN_DB_API_KEY,
+        })
         
         response.raise_for_status()
         response_sql: Dict = response.json()
@@ -601,4 +604,60 @@ async def put_user_alert_setting(
             "status": "error",
             "message": f"Error when updating user alert settings: {str(e)}",
             "data": None,
-        }, status_code=500)
\ No newline at end of file
+        }, status_code=500)
+
+# Alert Ingest (push alert source)
+# Seconds a producer is asked to wait when the queue is full
+ALERT_INGEST_RETRY_AFTER = 5
+
+@router.post(
+    path="/ingest",
+    include_in_schema=False,
+)
+async def ingest_alerts(
+    payload: IngestAlertsRequest,
+    token: str = Depends(get_bearer_token),
+):
+    if not ORIN_DB_API_KEY or token != ORIN_DB_API_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid ingest key")
+    
+    source = get_alert_source()
+    if not isinstance(source, PushAlertSource):
+        return JSONResponse(content={
+            "ok": False,
+            "status": "error",
+            "message": f"Alert ingest is disabled, active alert source is '{source.name}'",
+        }, status_code=409)
+    
+    try:
+        # 202 once the rows are committed to the alert outbox's inbox, they
+        # are dispatched even if the process restarts before that
+        accepted = await source.push(payload.alerts)
+        return JSONResponse(content={
+            "ok": True,
+            "status": "success",
+            "message": "Alerts stored",
+            "data": {
+                "accepted": accepted,
+                "pending_rows": source.pending(),
+            },
+        }, status_code=202)
+    except asyncio.QueueFull:
+        # Dispatcher behind or sending switched off, the producer retries later
+        return JSONResponse(content={
+            "ok": False,
+            "status": "error",
+            "message": f"Alert queue is full ({source.pending()}/{source.max_pending} rows pending), retry later",
+        }, status_code=503, headers={"Retry-After": str(ALERT_INGEST_RETRY_AFTER)})
+    except ValueError as e:
+        return JSONResponse(content={
+            "ok": False,
+            "status": "error",
+            "message": str(e),
+        }, status_code=413)
+    except Exception as e:
+        return JSONResponse(content={
+            "ok": False,
+            "status": "error",
+            "message": f"Error when ingesting alerts: {str(e)}",
+        }, status_code=500)
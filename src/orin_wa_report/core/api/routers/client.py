@@ -1,15 +1,17 @@
 import os
 import random
+from typing import Dict, List, Optional
 
 import httpx
-from fastapi import APIRouter, Response, HTTPException, Request, Depends
+from fastapi import APIRouter, Response, HTTPException, Request, Depends, Query
 from fastapi.responses import JSONResponse
 
 from src.orin_wa_report.core.agent.handler import ChatDB, get_chat_db
 from src.orin_wa_report.core.db import SettingsDB, get_settings_db
-from src.orin_wa_report.core.openwa import SocketClient, WAError
-from src.orin_wa_report.core.clients import get_openwa_client
+from src.orin_wa_report.core.openwa import AsyncOpenWAClient, WATimeoutError
+from src.orin_wa_report.core.clients import get_async_openwa_client
 from src.orin_wa_report.core.models import SendMessageRequest, SendFileRequest
+from src.orin_wa_report.core.send_scheduler import get_send_scheduler, PRIORITY_CHAT
 from src.orin_wa_report.core.api.utils import (
     convert_phone_to_lid,
 )
@@ -59,16 +61,18 @@ async def get_qr_raw():
 )
 async def send_message(
     req: SendMessageRequest,
-    openwa_client: SocketClient = Depends(get_openwa_client),
+    wa_client: AsyncOpenWAClient = Depends(get_async_openwa_client),
     chat_db: ChatDB = Depends(get_chat_db),
 ):
-    if openwa_client is None:
+    if wa_client is None:
         raise HTTPException(status_code=503, detail="WhatsApp client not ready")
+
     try:
-        try:
-            openwa_client.sendText(req.to, req.message)
-        except WAError:
-            openwa_client.sendText(req.to_fallback, req.message)
+        await get_send_scheduler().send(
+            req.to,
+            lambda: wa_client.send_text(req.to, req.message, fallback=req.to_fallback),
+            priority=PRIORITY_CHAT,
+        )
         await chat_db.add_chat_to_latest_session(
             phone_number=req.to.split(sep="@")[0],
             sender="bot",
@@ -84,16 +88,16 @@ async def send_message(
 )
 async def send_file(
     req: SendFileRequest,
-    openwa_client: SocketClient = Depends(get_openwa_client),
+    wa_client: AsyncOpenWAClient = Depends(get_async_openwa_client),
 ):
-    if openwa_client is None:
+    if wa_client is None:
         raise HTTPException(status_code=503, detail="WhatsApp client not ready")
 
     # Define the helper to call the function positionally
-    def call_send_file(target_to):
+    async def call_send_file(target_to):
         # We pass only the values in the specific order the library expects:
         # 1. to, 2. file, 3. filename, 4. caption
-        return openwa_client.sendFile(
+        return await wa_client.send_file(
             target_to, 
             req.file, 
             req.filename, 
@@ -103,11 +107,13 @@ async def send_file(
     try:
         try:
             # Try with primary 'to'
-            result = call_send_file(req.to)
+            result = await call_send_file(req.to)
+        except WATimeoutError:
+            raise
         except Exception:
             # Try with fallback if primary fails
             if req.to_fallback:
-                result = call_send_file(req.to_fallback)
+                result = await call_send_file(req.to_fallback)
             else:
                 raise
             
@@ -123,41 +129,53 @@ async def send_file(
 
 
 # New routes for chat history and sessions
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _to_openai_messages(messages: List[Dict]) -> List[Dict]:
+    """Stored messages -> 'role'/'content'/'timestamp' dicts, order kept."""
+    return [
+        {
+            "role": "assistant" if msg['sender'] == 'bot' else 'user',
+            "content": msg['body'],
+            "timestamp": msg['timestamp']
+        }
+        for msg in messages
+    ]
+
 @router.get(
     path="/chat_history/{phone_number}",
     include_in_schema=False,
 )
 async def get_chat_history(
     phone_number: str,
+    response: Response,
+    sessions: int = Query(5, ge=1, le=50),
+    before: Optional[str] = None,
     chat_db: ChatDB = Depends(get_chat_db),
 ):
     """
-    Fetch ALL chat history for a phone number across all sessions
-    Returns: List of messages with session markers and timestamps
+    Fetch chat history for a phone number across its latest sessions
+    (newest 100 messages of each), fetched in one query
+    Returns: List of messages with session markers and timestamps, oldest first.
+    When older sessions exist, the X-Next-Cursor header holds the `before`
+    value for the next page.
     """
-    # Get all sessions for this phone number
-    sessions = await chat_db.get_sessions_by_phone(phone_number, limit=5)
-    if not sessions:
-        return []
+    try:
+        history, next_cursor = await chat_db.get_history_for_phone(phone_number, sessions=sessions, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     # Format messages with session markers
     openai_messages = []
-    for session in sessions:
+    for session_id, messages in history:
         # Add session marker
         openai_messages.append({
             "role": "session",
-            "content": session['id']
+            "content": session_id
         })
-        
-        # Get messages for this session (already ordered oldest first from DB)
-        messages = await chat_db.get_messages_for_session(session['id'])
-        for msg in messages:
-            role = "assistant" if msg['sender'] == 'bot' else 'user'
-            openai_messages.append({
-                "role": role,
-                "content": msg['body'],
-                "timestamp": msg['timestamp']
-            })
+        openai_messages.extend(_to_openai_messages(messages))
     
     return openai_messages
 
@@ -196,34 +214,34 @@ async def get_phone_to_lid(
     include_in_schema=False,
 )
 async def get_contacts(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
+    q: Optional[str] = None,
     chat_db: ChatDB = Depends(get_chat_db),
 ):
     """
-    Fetch all contacts that have chat history
+    Fetch contacts that have chat history, from the contacts summary table
     Returns: List of dicts with keys "phone_number", "user_name", "last_activity"
-    Sorted by last_activity DESC (newest first)
+    Sorted by last_activity DESC (newest first), `limit` per page, optionally
+    filtered by `q` (part of the number or name). When more contacts exist,
+    the X-Next-Cursor header holds the `before` value for the next page.
+    The ETag follows the contacts revision: a poll sending it back in
+    If-None-Match gets 304 Not Modified until a contact changes.
     """
-    # Query sessions with phone, user_name, and latest last_activity
-    def _get_contacts():
-        cur = chat_db._conn.cursor()
-        cur.execute(
-            """
-            SELECT phone, user_name, MAX(last_activity) as last_activity
-            FROM sessions
-            GROUP BY phone
-            ORDER BY last_activity DESC
-            """
-        )
-        return [
-            {
-                "phone_number": row[0],
-                "user_name": row[1],
-                "last_activity": row[2]
-            }
-            for row in cur.fetchall()
-        ]
+    try:
+        revision, contacts, next_cursor = await chat_db.get_contacts(limit=limit, before=before, search=q)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    contacts = await chat_db._run(_get_contacts)
+    etag = f'W/"contacts-{revision}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return contacts
 
 @router.get(
@@ -239,15 +257,15 @@ async def get_sessions(
     Returns: List of session IDs (strings)
     """
     # Query sessions for phone number
-    def _get_sessions():
-        cur = chat_db._conn.cursor()
+    def _get_sessions(conn):
+        cur = conn.cursor()
         cur.execute(
             "SELECT id FROM sessions WHERE phone = ? ORDER BY started_at DESC",
             (phone_number,)
         )
         return [row[0] for row in cur.fetchall()]
     
-    session_ids = await chat_db._run(_get_sessions)
+    session_ids = await chat_db._read(_get_sessions)
     return session_ids
 
 @router.get(
@@ -256,27 +274,26 @@ async def get_sessions(
 )
 async def get_chat_history_by_session(
     session_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
     chat_db: ChatDB = Depends(get_chat_db),
 ):
     """
     Fetch chat history by session ID in OpenAI format with timestamps
-    Returns: List of messages with 'role', 'content', and 'timestamp'
+    Returns: the newest `limit` messages older than the `before` cursor (the
+    newest of the session without it), oldest first, with 'role', 'content'
+    and 'timestamp'. When older messages exist, the X-Next-Cursor header
+    holds the `before` value for the next page.
     """
-    messages = await chat_db.get_messages_for_session(session_id)
-    if not messages:
-        return []
+    try:
+        messages, next_cursor = await chat_db.get_messages_page(session_id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    # Format messages for OpenAI with timestamps (already ordered oldest first from DB)
-    openai_messages = []
-    for msg in messages:
-        role = "assistant" if msg['sender'] == 'bot' else 'user'
-        openai_messages.append({
-            "role": role,
-            "content": msg['body'],
-            "timestamp": msg['timestamp']
-        })
-    
-    return openai_messages
+    return _to_openai_messages(messages)
 
 
 @router.get(
@@ -285,16 +302,19 @@ async def get_chat_history_by_session(
 )
 async def get_profile(
     phone_number: str,
-    openwa_client: SocketClient = Depends(get_openwa_client),
+    wa_client: AsyncOpenWAClient = Depends(get_async_openwa_client),
 ):
     """
     Fetch ALL chat history for a phone number across all sessions
     Returns: List of messages with session markers and timestamps
     """
     
-    contact_details = openwa_client.getContact(f"{phone_number}@c.us")
+    if wa_client is None:
+        raise HTTPException(status_code=503, detail="WhatsApp client not ready")
+    
+    contact_details = await wa_client.call("getContact", f"{phone_number}@c.us")
     if contact_details is None:
-        contact_details = openwa_client.getContact(f"{phone_number}@lid")
+        contact_details = await wa_client.call("getContact", f"{phone_number}@lid")
     
     profile_url = contact_details.get("profilePicThumbObj", "")
     # logger.info(f"Profile Url: {profile_url}")
@@ -322,7 +342,7 @@ async def get_profile(
 async def wa_dummy_notification(
     request: Request,
     settings_db: SettingsDB = Depends(get_settings_db),
-    openwa_client: SocketClient = Depends(get_openwa_client),
+    wa_client: AsyncOpenWAClient = Depends(get_async_openwa_client),
 ):
     data = await request.json()
     number_type = data.get("number_type")
@@ -345,11 +365,11 @@ async def wa_dummy_notification(
         
     message_final = alert_setting["value"].format(device_name=prompt_device_name, message=prompt_message)
     
-    if openwa_client is None:
+    if wa_client is None:
         raise HTTPException(status_code=503, detail="WhatsApp client not ready")
 
     try:
-        openwa_client.sendText(to, message_final)
+        await wa_client.send_text(to, message_final)
         return {"status": "success", "to": to, "message": message_final}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
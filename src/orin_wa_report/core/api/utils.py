@@ -1,17 +1,27 @@
 import asyncio
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 
-import httpx
-import pandas as pd
 from dotenv import load_dotenv
 
 from src.orin_wa_report.core.logger import get_logger
 from src.orin_wa_report.core.development import (
     create_notifications,
 )
-from src.orin_wa_report.core.utils import get_db_query_endpoint
-from src.orin_wa_report.core.db import SettingsDB, DB_PATH
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
+from src.orin_wa_report.core.db import SettingsDB, get_settings_db, get_alert_outbox_db
+from src.orin_wa_report.core.identity import get_identity_index
+from src.orin_wa_report.core.api.alert_source import AlertSource, get_alert_source
+from src.orin_wa_report.core.bulk_send import BulkSendJob, get_bulk_sender
+from src.orin_wa_report.core.runtime_settings import get_runtime_settings
+from src.orin_wa_report.core.api.alert_render import (
+    AlertCoalescer,
+    AlertRecord,
+    NotificationTemplates,
+    get_alert_coalescer,
+    render_digest_messages,
+)
 
 load_dotenv(override=True)
 
@@ -20,204 +30,227 @@ logger = get_logger(__name__, service="FastAPI")
 APP_STAGE = os.getenv("APP_STAGE", "development")
 db_query_url = get_db_query_endpoint(name=APP_STAGE)
 
-SETTINGS_DB = None
-_db_init_lock = asyncio.Lock()
-
-async def ensure_settings_db():
-    global SETTINGS_DB
-    async with _db_init_lock:
-        if SETTINGS_DB is None:
-            SETTINGS_DB = SettingsDB(DB_PATH)
-            await SETTINGS_DB.initialize()
-
 async def periodic_dummy_notifications():
+    runtime_settings = await get_runtime_settings()
     while True:
-        await asyncio.sleep(1)
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get("http://localhost:8000/settings")
-                config_data = response.json()
-            # if not config_data.get("dummy").get("enable_create_alert", False):
-            if not config_data.get("enable_create_dummy_alert"):
-                # logger.info(f"Periodic dummy notifications disabled...")
+            if not runtime_settings.settings.enable_create_dummy_alert:
+                # Sleep until the dashboard flips a setting
+                await runtime_settings.wait_for_change()
                 continue
                 
+            await asyncio.sleep(1)
             logger.info("Run periodic dummy notifications...")
             await create_notifications.create_dummy_notifications(sample=0.5)
         except Exception as e:
             logger.error(f"Error in dummy notifications background job: {e}")
+            await asyncio.sleep(1)
+
+# Compiled prompt_* templates, rebuilt when the notification settings change
+_NOTIFICATION_TEMPLATES: Optional[NotificationTemplates] = None
+
+async def get_notification_templates(settings_db: SettingsDB) -> NotificationTemplates:
+    global _NOTIFICATION_TEMPLATES
+    version = settings_db.notification_version
+    if _NOTIFICATION_TEMPLATES is None or _NOTIFICATION_TEMPLATES.version != version:
+        notification_config: List[Dict[str, str]] = await settings_db.get_notification_setting()
+        notification_setting = {item["setting"]: item["value"] for item in notification_config}
+        _NOTIFICATION_TEMPLATES = NotificationTemplates(notification_setting, version=version)
+        logger.info(f"Compiled notification templates for settings version {version}")
+    return _NOTIFICATION_TEMPLATES
 
-async def build_notification_message(
-    notification_setting: Dict[str, str],
-    row_data: pd.Series
-) -> str:
-    alert_type = row_data["alert_type"]
-    device_name = row_data["device_name"]
-    message = row_data["message"]
+async def send_outbox_messages(messages: List[Dict], source: str = "alerts") -> Optional[BulkSendJob]:
+    """Hand messages stored in the alert outbox to the in-process bulk sender."""
+    if not messages:
+        return None
     
-    # Check if there is a specific message format
-    # "prompt_{alert_type}" is the key in notification_setting
-    # if there is any specific message format based on alert_type
-    alert_type_key = f"prompt_{alert_type}"
-    if alert_type_key in notification_setting.keys():
-        message = notification_setting.get(alert_type_key).format(
-            device_name=device_name,
-            message=message
-        )
-    else:  # use 'prompt_default' if there is no specific alert
-        message = notification_setting.get("prompt_default").format(
-            device_name=device_name,
-            message=message,
-        )
-    return message
+    job = get_bulk_sender().submit(messages, source=source)
+    logger.info(f"Sending {len(messages)} outbox messages as job {job.id}")
+    return job
+
+async def restore_held_alerts(coalescer: AlertCoalescer) -> int:
+    """Put the alerts held for digests when the process stopped back into the coalescer."""
+    held = await (await get_alert_outbox_db()).load_held()
+    if held:
+        coalescer.add(AlertRecord.from_row(row) for row in held)
+        logger.info(f"Holding {len(held)} alerts left from the last run for digests")
+    return len(held)
+
+async def dispatch_alerts(
+    rows: List[Dict],
+    source: AlertSource | None = None,
+    coalescer: AlertCoalescer | None = None,
+):
+    """
+    Turn a batch of alert rows from any AlertSource into WhatsApp messages,
+    store them in the alert outbox together with the source cursor, and hand
+    them to the bulk sender.
+
+    Alerts are grouped per recipient by the AlertCoalescer: groups whose
+    digest window closed are sent, the rest stay held. Held alerts are stored
+    in the outbox with the cursor, and a restart loads them back into the
+    coalescer instead of fetching them again. `rows` may be empty to only
+    flush due digests.
+    """
+    settings_db = await get_settings_db()
+    outbox = await get_alert_outbox_db()
+    if coalescer is None:
+        coalescer = AlertCoalescer()
     
+    templates = await get_notification_templates(settings_db)
     
+    # Per-user alert types (global allowed + required already applied in SQL
+    # for polled rows), O(1) lookup per row
+    allows = settings_db.subscriptions.allows
+    records = [
+        AlertRecord.from_row(row)
+        for row in rows
+        if allows(row["user_id"], row["alert_type"])
+    ]
+    coalescer.add(records)
+    groups = coalescer.flush_due()
+    
+    # New alerts left in the coalescer are stored as held, sent ones are
+    # released (deleting an id that was never held is a no-op)
+    sent_ids = [alert_id for group in groups for alert_id in group.ids]
+    sent = set(sent_ids)
+    hold = [record.to_row() for record in records if record.id not in sent]
+    
+    source_name = source.name if source else None
+    source_last_id = source.last_id if source else None
+    
+    if not groups:
+        if rows:
+            logger.info(f"No new notif to send yet, {len(coalescer)} alerts held for digests")
+        await outbox.enqueue([], source=source_name, last_id=source_last_id, hold=hold)
+        return
+    
+    # old message: f"Notifikasi ORIN! Kendaraan anda ({row['device_name']}) {row['message']}"
+    messages = render_digest_messages(groups, templates)
+    
+    # Persist messages + cursor atomically, then send what was stored
+    try:
+        stored_messages = await outbox.enqueue(
+            messages,
+            source=source_name,
+            last_id=source_last_id,
+            hold=hold,
+            release=sent_ids,
+        )
+    except Exception:
+        coalescer.restore(groups)
+        raise
+    alert_count = sum(len(group.ids) for group in groups)
+    logger.info(f"Outbox stored {len(stored_messages)}/{len(messages)} messages for {alert_count} alerts")
+    await send_outbox_messages(stored_messages, source=source_name or "alerts")
+
+# How long an idle source may block before the settings toggle is re-checked
+ALERT_SETTINGS_CHECK_SECONDS = 6
+# How often failed sends are retried and sent rows compacted
+OUTBOX_MAINTENANCE_SECONDS = 60
+
+async def outbox_maintenance():
+    """Resend retryable outbox rows and compact confirmed ones."""
+    outbox = await get_alert_outbox_db()
+    retry_messages = await outbox.claim_pending()
+    if retry_messages:
+        logger.info(f"Retrying {len(retry_messages)} outbox messages")
+        await send_outbox_messages(retry_messages, source="outbox-retry")
+    compacted = await outbox.compact()
+    if compacted:
+        logger.info(f"Compacted {compacted} sent outbox messages")
 
-# PLEASE IMPLEMENT SQLITE FOR THIS, AND SETTINGS FOR MORE ROBUST
-alert_last_id = None
+async def periodic_send_notifications(source: AlertSource | None = None):
+    """
+    Dispatch loop for ORIN alerts. Batches come from the configured
+    AlertSource (adaptive cursor poller or pushed ingest batches).
 
-async def periodic_send_notifications():
-    global alert_last_id
-    await ensure_settings_db()
+    The cursor, undelivered messages and alerts held for digests live in the
+    alert outbox, so after a restart dispatch resumes from the stored cursor,
+    held alerts go back into the coalescer and messages that were in flight
+    are sent again. Toggling sending off pauses dispatch without moving the
+    cursor.
+    """
+    settings_db = await get_settings_db()
+    outbox = await get_alert_outbox_db()
+    if source is None:
+        source = get_alert_source()
+    coalescer = get_alert_coalescer()
+    
+    stored_last_id = await outbox.get_cursor(source.name)
+    if stored_last_id is not None:
+        source.last_id = stored_last_id
+        logger.info(f"Resuming '{source.name}' alert source from alert_last_id: {stored_last_id}")
+    await restore_held_alerts(coalescer)
+    resumed = False
+    last_maintenance = time.monotonic()
+    
+    runtime_settings = await get_runtime_settings()
+    
     while True:
-        await asyncio.sleep(6)
         try:
-            notification_config: List[Dict[str, str]] = await SETTINGS_DB.get_notification_setting()
-            notification_setting = {item["setting"]: item["value"] for item in notification_config}
+            # Check config, paused until sending is switched back on
+            if not runtime_settings.settings.enable_send_alert:
+                await runtime_settings.wait_for_change()
+                continue
             
-            allowed_alert_type = notification_setting.get("allowed_alert_type").split(sep=";")
+            if not resumed:
+                in_flight = await outbox.claim_pending(include_sending=True)
+                if in_flight:
+                    logger.info(f"Resending {len(in_flight)} outbox messages left from the last run")
+                    await send_outbox_messages(in_flight, source="outbox-resume")
+                resumed = True
             
-            # logger.info(notification_setting)
+            if time.monotonic() - last_maintenance >= OUTBOX_MAINTENANCE_SECONDS:
+                last_maintenance = time.monotonic()
+                await outbox_maintenance()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get("http://localhost:8000/settings")
-                config_data = response.json()
-                
-            # Check config
-            # if not config_data.get("fastapi").get("enable_send_alert", False):
-            if not config_data.get("enable_send_alert"):
-                # logger.info(f"Periodic send notifications disabled...")
-                alert_last_id = None
+            # Only fetch alert types someone can receive
+            source.alert_types = settings_db.subscriptions.sql_alert_types()
+            
+            previous_last_id = source.last_id
+            timeout = ALERT_SETTINGS_CHECK_SECONDS
+            digest_due = coalescer.next_due()
+            if digest_due is not None:
+                timeout = min(timeout, digest_due)
+            rows = await source.get_batch(timeout=timeout)
+            if not rows:
+                if len(coalescer) and coalescer.next_due() == 0:
+                    await dispatch_alerts([], source=source, coalescer=coalescer)
+                elif source.last_id is not None and source.last_id != previous_last_id:
+                    await outbox.set_cursor(source.name, source.last_id)
                 continue
             
-            logger.info(f"Periodic send notifications: alllowed_alert_type: {allowed_alert_type}")
-                
-            url = get_db_query_endpoint(name="devsites_orin_dev")
-            if alert_last_id is None:
-                logger.info("Periodic send notifications: Undefined alert id, fetch one...")
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(url, json={
-                        "query": """
-                            SELECT id FROM alert_notifications ORDER BY id DESC LIMIT 1
-                        """
-                    })
-                    response_sql: Dict = response.json()
-                alert_last_id = response_sql.get("rows")[0].get("id")
-                logger.info(f"Get alert_last_id: {alert_last_id}")
-            else:
-                # Fetch all alert notifications from last known to now with 1000 limit order from newest
-                
-                logger.info("Periodic send notifications: Begin fetching notifications...")
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(url, json={
-                        "query": """
-SELECT 
-    an.*, 
-    u.wa_number,
-    u.wa_lid, 
-    u.wa_notif, 
-    u.wa_verified,
-    d.device_name
-FROM alert_notifications an
-JOIN users u ON u.id = an.user_id
-LEFT JOIN devices d ON d.id = an.device_id
-WHERE an.id > :id
-  AND u.wa_notif = 1
-  AND u.wa_verified = 1
-  AND u.deleted_at IS NULL
-ORDER BY an.id ASC
-LIMIT 1000;
-
-"""
-                    , "params": {"id": alert_last_id}})
-                    response_sql: Dict = response.json()
-                
-                # Parse to messages
-                df_notif = pd.DataFrame(response_sql.get("rows", {}))
-                
-                if len(df_notif) == 0:
-                    logger.info(f"No new notif to subscribed user, continue...")
-                    continue
-                
-                alert_last_id = int(df_notif["id"].iloc[-1])
-                logger.info(f"Get alert_last_id: {alert_last_id}")
-                
-                # old message: f"Notifikasi ORIN! Kendaraan anda ({row['device_name']}) {row['message']}"
-                # TODO: Alert type filter + Required is inside the sql query, not after fetching
-                # TODO: IMPLEMENT PERSONALIZED USER_ALERT
-                
-                # 1. Filter the rows we need to process
-                rows_to_process = [
-                    row
-                    for _, row in df_notif.iterrows()
-                    if row['alert_type'] in allowed_alert_type
-                ]
-                
-                # 2. Create a list of awaitable tasks for building messages
-                message_building_tasks = [
-                    build_notification_message(
-                        notification_setting=notification_setting,
-                        row_data=row
-                    )
-                    for row in rows_to_process
-                ]
-                
-                # 3. Use asyncio.gather to run all tasks concurrently
-                # The results will be a list of the resolved message strings, in the same order as the tasks.
-                message_contents = await asyncio.gather(*message_building_tasks)
-                
-                # 4. Construct the final 'messages' list using the concurrent results
-                messages = [
-                    {
-                        "to": f"{row['wa_number']}@c.us",
-                        "to_fallback": f"{row['wa_lid']}@lid",
-                        "message": content
-                    }
-                    for row, content in zip(rows_to_process, message_contents)
-                ]
-                
-                messages_delay_seconds = round(5.9/len(messages), 2)
-                messages_payload = {
-                    "messages": messages,
-                    "delay_seconds": messages_delay_seconds
-                }
-                
-                logger.info(f"Sending messages from id {alert_last_id} with delay {messages_delay_seconds}")
-                
-                # Send bulking using API "send-bulk"
-                async with httpx.AsyncClient() as client:
-                    response = await client.post("http://localhost:8000/send-messages", json=messages_payload)
-                    response_sql: Dict = response.json()
-                
-                logger.info(f"Send messages result: {response_sql}")
+            logger.info(f"Get alert_last_id: {source.last_id}")
+            try:
+                await dispatch_alerts(rows, source=source, coalescer=coalescer)
+            except Exception:
+                # Nothing reached the outbox, fetch the same rows again
+                source.last_id = previous_last_id
+                raise
         except Exception as e:
             logger.error(f"Error in send notifications background job: {e}")
+            await asyncio.sleep(ALERT_SETTINGS_CHECK_SECONDS)
 
 async def convert_phone_to_lid(phone_number: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(db_query_url, json={
-            "query": """
-                SELECT 
-                    wa_number,
-                    wa_lid
-                FROM users
-                WHERE
-                    wa_number = :wa_number
-                LIMIT 1
-            """,
-            "params": {"wa_number": phone_number}
-        })
-        response_sql: Dict = response.json()
+    # Pairs seen on inbound messages or resolved before need no query
+    identity = get_identity_index()
+    wa_lid = identity.lid_for(phone_number)
+    if wa_lid:
+        return wa_lid
+    response_sql: Dict = await get_db_gateway().query(
+        """
+            SELECT 
+                wa_number,
+                wa_lid
+            FROM users
+            WHERE
+                wa_number = :wa_number
+            LIMIT 1
+        """,
+        params={"wa_number": phone_number},
+        url=db_query_url,
+    )
     wa_lid = response_sql.get("rows")[0].get("wa_lid")
+    identity.learn(phone_number, wa_lid)
     return wa_lid
\ No newline at end of file
@@ -0,0 +1,221 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src.orin_wa_report.core.clients import get_async_openwa_client
+from src.orin_wa_report.core.db import get_alert_outbox_db
+from src.orin_wa_report.core.logger import get_logger
+from src.orin_wa_report.core.openwa import WAError
+from src.orin_wa_report.core.send_scheduler import (
+    PRIORITY_BULK,
+    SendScheduler,
+    get_send_scheduler,
+)
+
+logger = get_logger(__name__, service="FastAPI")
+
+
+class BulkSendJob:
+    """Progress of one bulk send, updated as the scheduler works through it."""
+    def __init__(self, total: int, source: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.fallback = 0
+        self.created_at = time.time()
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.sent + self.failed >= self.total
+
+    def _record(self, sent: bool, fallback: bool = False):
+        if sent:
+            self.sent += 1
+            if fallback:
+                self.fallback += 1
+        else:
+            self.failed += 1
+        if self.done and self._finished is None:
+            self._finished = time.monotonic()
+        # Wake everybody waiting on this change, later waiters get a new event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_changed(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = (self._finished or time.monotonic()) - self._started
+        processed = self.sent + self.failed
+        return {
+            "job_id": self.id,
+            "source": self.source,
+            "status": "done" if self.done else "running",
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "fallback_to_lid": self.fallback,
+            "remaining": self.total - processed,
+            "created_at": int(self.created_at),
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(processed / elapsed, 3) if elapsed > 0 else None,
+        }
+
+
+class BulkSender:
+    """
+    In-process bulk send API. Messages are dicts with 'to', 'to_fallback',
+    'message' and optionally 'outbox_id' (alert outbox rows are marked sent
+    or failed). Each submit() returns a BulkSendJob to poll or watch.
+
+    Outbox results are written in one transaction every `flush_interval`
+    seconds or every `flush_size` results, not one commit per send. Results
+    lost in a crash leave their rows 'sending', which claim_pending() at the
+    next startup sends again.
+    """
+    def __init__(
+        self,
+        scheduler: Optional[SendScheduler] = None,
+        max_jobs: int = 1000,
+        flush_interval: float = 1.0,
+        flush_size: int = 100,
+    ):
+        self._scheduler = scheduler
+        self.max_jobs = max_jobs
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._jobs: "OrderedDict[str, BulkSendJob]" = OrderedDict()
+        self._results: List[Tuple[int, Optional[str]]] = []
+        self._results_ready = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def scheduler(self) -> SendScheduler:
+        if self._scheduler is None:
+            self._scheduler = get_send_scheduler()
+        return self._scheduler
+
+    def submit(self, messages: List[Dict], source: Optional[str] = None) -> BulkSendJob:
+        job = BulkSendJob(total=len(messages), source=source)
+        self._jobs[job.id] = job
+        self._prune()
+        for msg in messages:
+            self.scheduler.submit(
+                recipient=msg["to"],
+                action=lambda msg=msg: self._send_one(job, msg),
+                priority=PRIORITY_BULK,
+            )
+        logger.info(f"Bulk send job {job.id} queued {job.total} messages")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BulkSendJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[BulkSendJob]:
+        return list(self._jobs.values())
+
+    async def watch(self, job_id: str, interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a snapshot on every change (at least every `interval`) until the job is done."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        while True:
+            yield job.snapshot()
+            if job.done:
+                return
+            await job.wait_changed(interval)
+
+    async def flush(self):
+        """Write the queued outbox results in one transaction."""
+        results, self._results = self._results, []
+        if not results:
+            return
+        try:
+            outbox = await get_alert_outbox_db()
+            await outbox.mark_results(results)
+        except Exception:
+            # Rows left 'sending' are only reclaimed at startup, so keep the
+            # results and write them again on the next flush
+            logger.exception(f"Failed to record {len(results)} outbox results, retrying on the next flush")
+            self._results[:0] = results
+
+    async def close(self):
+        """Stop the flusher and write what is still queued."""
+        # Not cancelled: a flush in progress finishes, and its results aren't lost
+        if self._flusher is not None:
+            self._closing = True
+            self._results_ready.set()
+            await self._flusher
+            self._flusher = None
+            self._closing = False
+        await self.flush()
+
+    def _record_outbox(self, outbox_id: int, error: Optional[str] = None):
+        self._results.append((outbox_id, error))
+        if len(self._results) >= self.flush_size:
+            self._results_ready.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._results_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._results_ready.clear()
+            await self.flush()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_jobs."""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+
+    async def _send_one(self, job: BulkSendJob, msg: Dict):
+        outbox_id = msg.get("outbox_id")
+        fallback = False
+        try:
+            wa_client = get_async_openwa_client()
+            if wa_client is None:
+                raise WAError("WhatsApp client not ready")
+            # The identity index puts the address known to deliver first
+            _, used = await wa_client.deliver("sendText", msg["to"], msg.get("to_fallback"), msg["message"])
+            fallback = used != msg["to"]
+            logger.info(f"Message worker to {msg['to']}")
+        except Exception as e:
+            logger.error(f"❌ Failed to send {msg['to']}: {e}")
+            job._record(sent=False)
+            if outbox_id is not None:
+                self._record_outbox(outbox_id, str(e))
+            return
+        job._record(sent=True, fallback=fallback)
+        if outbox_id is not None:
+            self._record_outbox(outbox_id)
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_BULK_SENDER: Optional[BulkSender] = None
+
+
+def get_bulk_sender() -> BulkSender:
+    global _BULK_SENDER
+    if _BULK_SENDER is None:
+        _BULK_SENDER = BulkSender()
+    return _BULK_SENDER
@@ -1,27 +1,66 @@
 import os
 import asyncio
-from src.orin_wa_report.core.openwa import SocketClient
+import weakref
+from typing import Dict
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.identity import get_identity_index
+from src.orin_wa_report.core.openwa import SocketClient, AsyncSocketClient, AsyncOpenWAClient
 
 # OpenWA Client
 OPEN_WA_PORT = os.getenv("OPEN_WA_PORT")
-openwa_client: SocketClient | None = None
+openwa_client: SocketClient | AsyncSocketClient | None = None
+# Async facades, one per SocketClient
+_async_clients: "weakref.WeakKeyDictionary[SocketClient | AsyncSocketClient, AsyncOpenWAClient]" = weakref.WeakKeyDictionary()
 
 async def init_openwa():
     """Background task to initialize the client without blocking main flow."""
     global openwa_client
+    openwa_config: Dict = get_config_data().get("openwa") or {}
+    url = f"http://172.17.0.1:{OPEN_WA_PORT}/"
     try:
-        # If SocketClient is blocking/synchronous, use to_thread
-        # If it's native async, just await it directly
-        client = await asyncio.to_thread(
-            SocketClient, 
-            f"http://172.17.0.1:{OPEN_WA_PORT}/", 
-            api_key="my_secret_api_key"
-        )
+        if openwa_config.get("backend", "sync") == "async":
+            # Native asyncio client, retries with jittered backoff until connected
+            client = AsyncSocketClient(
+                url,
+                api_key="my_secret_api_key",
+                call_timeout=openwa_config.get("timeout", 30.0),
+            )
+            await client.connect()
+        else:
+            # Blocking client, its connect loop sleeps, so keep it off the loop
+            client = await asyncio.to_thread(
+                SocketClient, 
+                url, 
+                api_key="my_secret_api_key"
+            )
         openwa_client = client
         print("✅ OpenWA Client connected in background.")
     except Exception as e:
         print(f"❌ Failed to connect OpenWA: {e}")
     
 def get_openwa_client():
-    print(openwa_client)
     return openwa_client
+
+def as_async_openwa_client(client: SocketClient | AsyncSocketClient) -> AsyncOpenWAClient:
+    """
+    Awaitable facade for `client`, with the thread pool size, concurrency
+    and timeout from config.yaml `openwa`. One facade per SocketClient.
+    """
+    async_client = _async_clients.get(client)
+    if async_client is None:
+        openwa_config: Dict = get_config_data().get("openwa") or {}
+        async_client = AsyncOpenWAClient(
+            client,
+            max_workers=openwa_config.get("max_workers", 8),
+            max_concurrency=openwa_config.get("max_concurrency", 8),
+            timeout=openwa_config.get("timeout", 30.0),
+            address_book=get_identity_index(),
+        )
+        _async_clients[client] = async_client
+    return async_client
+
+def get_async_openwa_client() -> AsyncOpenWAClient | None:
+    if openwa_client is None:
+        return None
+    return as_async_openwa_client(openwa_client)
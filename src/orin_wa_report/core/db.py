@@ -9,7 +9,7 @@ import re
 import httpx
 import copy
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, FrozenSet, Tuple
 
 from src.orin_wa_report.core.logger import get_logger
 
@@ -19,9 +19,55 @@ logger = get_logger(__name__, service="Agent")
 CORE_DIR = Path(__file__).resolve().parents[0]  # core/
 DB_DIR = CORE_DIR / "database"
 DB_PATH = DB_DIR / "settings.db"
+OUTBOX_DB_PATH = DB_DIR / "alert_outbox.db"
+IDENTITY_DB_PATH = DB_DIR / "identity.db"
 
 db_path = Path(DB_PATH)
 
+class AlertSubscriptionIndex:
+    """
+    In-memory view of user_alert_setting: user_id -> frozenset(alert types).
+
+    Users without a row fall back to the global allowed_alert_type, required
+    alert types always pass. allows() is O(1) per alert row.
+    """
+    def __init__(self, required_types: Iterable[str]):
+        self.required_types: FrozenSet[str] = frozenset(required_types)
+        self.allowed_types: FrozenSet[str] = frozenset()
+        self._by_user: Dict[int, FrozenSet[str]] = {}
+
+    @staticmethod
+    def parse(value: Optional[str | Iterable[str]]) -> FrozenSet[str]:
+        if value is None:
+            return frozenset()
+        if isinstance(value, str):
+            value = value.split(sep=";")
+        return frozenset(t for t in value if t)
+
+    def set_allowed(self, value: str | Iterable[str]):
+        self.allowed_types = self.parse(value)
+
+    def set_user(self, user_id: int, value: str | Iterable[str]):
+        self._by_user[int(user_id)] = self.parse(value)
+
+    def get_user(self, user_id: int) -> FrozenSet[str]:
+        return self._by_user.get(int(user_id), self.allowed_types)
+
+    def allows(self, user_id: int, alert_type: str) -> bool:
+        if alert_type in self.required_types:
+            return True
+        return (
+            alert_type in self.allowed_types
+            and alert_type in self._by_user.get(user_id, self.allowed_types)
+        )
+
+    def sql_alert_types(self) -> List[str]:
+        """Alert types worth fetching at all: global allowed + required."""
+        return sorted(self.allowed_types | self.required_types)
+
+    def __len__(self):
+        return len(self._by_user)
+
 class SettingsDB:
     def __init__(self, db_path: Path):
         self.db_path = Path(db_path)
@@ -32,6 +78,13 @@ class SettingsDB:
         # Hard-coded settings
         self.required_alert_type = ["expired_license", "warning_expired_license"]
         
+        # Per-user alert subscriptions, kept in sync by the writers below
+        self.subscriptions = AlertSubscriptionIndex(self.required_alert_type)
+        
+        # Bumped on every notification_setting write so readers can cache
+        # anything derived from it (e.g. compiled message templates)
+        self.notification_version = 0
+        
     async def initialize(self):
         async with self._lock:
             if self._init_done:
@@ -52,9 +105,21 @@ class SettingsDB:
             self._conn.execute("PRAGMA journal_mode = WAL;")
             self._conn.execute("PRAGMA synchronous = NORMAL;")
             await asyncio.get_running_loop().run_in_executor(None, self._create_tables)
+            await asyncio.get_running_loop().run_in_executor(None, self._load_subscription_index)
             self._init_done = True
             logger.info(f"ChatDB initialized at {self.db_path}")
 
+    def _load_subscription_index(self):
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT value FROM notification_setting WHERE setting = 'allowed_alert_type'")
+        row = cursor.fetchone()
+        self.subscriptions.set_allowed(row[0] if row else "")
+        
+        cursor.execute("SELECT user_id, value FROM user_alert_setting")
+        for user_id, value in cursor.fetchall():
+            self.subscriptions.set_user(user_id, value)
+        logger.info(f"Alert subscription index loaded for {len(self.subscriptions)} users")
+
     def _create_tables(self):
         c = self._conn.cursor()
         c.executescript(
@@ -75,6 +140,12 @@ class SettingsDB:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 setting TEXT NOT NULL UNIQUE,
                 value TEXT
+            );
+            
+            CREATE TABLE IF NOT EXISTS runtime_setting (
+                setting TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at INTEGER
             )
             """
         )
@@ -107,6 +178,20 @@ class SettingsDB:
                 )
                 self._conn.commit()
                 logger.info("Default notification prompt initialized")
+
+            # Default digest prompts, used when alerts are coalesced per recipient
+            for setting, value in (
+                ("prompt_digest", r"Notifikasi ORIN! {count} peringatan baru untuk kendaraan anda:"),
+                ("prompt_digest_item", r"- ({device_name}) {message}"),
+            ):
+                c.execute("SELECT setting FROM notification_setting WHERE setting=?", (setting,))
+                if c.fetchone() is None:
+                    c.execute(
+                        "INSERT INTO notification_setting (setting, value) VALUES (?, ?)",
+                        (setting, value)
+                    )
+                    self._conn.commit()
+                    logger.info(f"Default {setting} initialized")
         except Exception as e:
             logger.error(f"Error initializing default notification setting: {e}")
         
@@ -288,6 +373,7 @@ Kriteria Output pada Key 'is_handover':
                 )
             )
             self._conn.commit()
+            self.notification_version += 1
             setting_id = cursor.lastrowid
             return {
                 "id": setting_id,
@@ -316,6 +402,9 @@ Kriteria Output pada Key 'is_handover':
             if cursor.rowcount == 0:
                 raise ValueError("Setting not found")
             self._conn.commit()
+            self.notification_version += 1
+            if setting == "allowed_alert_type":
+                self.subscriptions.set_allowed(value)
             return {
                 "setting": setting,
                 "value": value,
@@ -329,6 +418,7 @@ Kriteria Output pada Key 'is_handover':
         if cursor.rowcount == 0:
             raise ValueError("Setting not found")
         self._conn.commit()
+        self.notification_version += 1
         return {"status": "success", "message": "Setting deleted"}
     
     async def get_user_alert_setting(
@@ -357,6 +447,7 @@ Kriteria Output pada Key 'is_handover':
                 )
             )
             self._conn.commit()
+            self.subscriptions.set_user(user_id, user_alert_setting)
             
             if include_required_alert_type:
                 user_alert_setting = self.include_required_alert(
@@ -395,8 +486,8 @@ Kriteria Output pada Key 'is_handover':
             )
             current_alert_type_set = set(current_alert_type.split(sep=";"))
             
-            for key, value in value.items():
-                if value == True and value in allowed_alert_type_list:
+            for key, enabled in value.items():
+                if enabled == True and key in allowed_alert_type_list:
                     current_alert_type_set.add(key)
                 else:
                     current_alert_type_set.discard(key)
@@ -411,9 +502,29 @@ Kriteria Output pada Key 'is_handover':
             )
         )
         self._conn.commit()
+        if cursor.rowcount:
+            self.subscriptions.set_user(user_id, updated_alert_type)
         
         return updated_alert_type
     
+    async def get_runtime_settings(self) -> Dict[str, Any]:
+        """Runtime toggles saved by put_runtime_settings, JSON decoded."""
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT setting, value FROM runtime_setting")
+        return {setting: json.loads(value) for setting, value in cursor.fetchall()}
+    
+    async def put_runtime_settings(self, values: Dict[str, Any]) -> None:
+        cursor = self._conn.cursor()
+        now = int(time.time())
+        cursor.executemany(
+            """
+            INSERT INTO runtime_setting (setting, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(setting) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            [(setting, json.dumps(value), now) for setting, value in values.items()]
+        )
+        self._conn.commit()
+    
     # async def get_chat_filter_setting(self) -> tuple[Optional[str], Optional[str]]:
     #     """
     #     Returns a tuple of (instruction, questions).
@@ -470,6 +581,422 @@ Kriteria Output pada Key 'is_handover':
                 self._conn = None
                 logger.info("SettingsDB connection closed and checkpointed.")
                 
+class AlertOutboxDB:
+    """
+    Durable alert cursor and outbox for the alert dispatch pipeline.
+
+    alert_cursor keeps the last alert id taken from each alert source,
+    alert_outbox keeps every message built from those alerts until it is
+    confirmed sent, and alert_held keeps the alerts the coalescer holds for a
+    digest. All three are written in the same transaction, so a restart
+    resumes exactly where dispatch stopped without re-reading MySQL.
+
+    alert_inbox keeps rows pushed to the ingest endpoint in push order. The
+    push source's cursor is an inbox seq, and rows at or behind the stored
+    cursor are deleted as the inbox is read.
+
+    Outbox status flow: 'sending' -> 'sent' | 'pending' (retry) -> 'failed'
+    once max_attempts is reached. Sent rows are compacted away in batches.
+    """
+    def __init__(self, db_path: Path, max_attempts: int = 3):
+        self.db_path = Path(db_path)
+        self.max_attempts = max_attempts
+        self._conn: Optional[sqlite3.Connection] = None
+        self._init_done = False
+        self._lock = asyncio.Lock()
+
+    async def initialize(self):
+        async with self._lock:
+            if self._init_done:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL;")
+            self._conn.execute("PRAGMA synchronous = NORMAL;")
+            await asyncio.get_running_loop().run_in_executor(None, self._create_tables)
+            self._init_done = True
+            logger.info(f"AlertOutboxDB initialized at {self.db_path}")
+
+    def _create_tables(self):
+        c = self._conn.cursor()
+        c.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS alert_cursor (
+                source TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS alert_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert_id INTEGER UNIQUE,
+                recipient TEXT NOT NULL,
+                recipient_fallback TEXT,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'sending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_alert_outbox_status ON alert_outbox(status, id);
+
+            CREATE TABLE IF NOT EXISTS alert_held (
+                alert_id INTEGER PRIMARY KEY,
+                alert TEXT NOT NULL,
+                created_at INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS alert_inbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert TEXT NOT NULL,
+                created_at INTEGER NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking DB call in executor with lock."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+    # --- cursor ---
+    async def get_cursor(self, source: str) -> Optional[int]:
+        def _get():
+            cur = self._conn.cursor()
+            cur.execute("SELECT last_id FROM alert_cursor WHERE source = ?", (source,))
+            row = cur.fetchone()
+            return int(row[0]) if row else None
+        return await self._run(_get)
+
+    def _set_cursor(self, cur: sqlite3.Cursor, source: str, last_id: int, now: int):
+        cur.execute(
+            """
+            INSERT INTO alert_cursor (source, last_id, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                last_id = MAX(last_id, excluded.last_id),
+                updated_at = excluded.updated_at
+            """,
+            (source, last_id, now)
+        )
+
+    async def set_cursor(self, source: str, last_id: int):
+        def _set():
+            self._set_cursor(self._conn.cursor(), source, last_id, int(time.time()))
+            self._conn.commit()
+        await self._run(_set)
+
+    # --- outbox ---
+    async def enqueue(
+        self,
+        messages: List[Dict[str, Any]],
+        source: Optional[str] = None,
+        last_id: Optional[int] = None,
+        hold: Optional[List[Dict[str, Any]]] = None,
+        release: Optional[Iterable[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Store messages as 'sending', update the held alerts and advance the
+        cursor in one transaction.
+
+        Each message is a dict with 'to', 'to_fallback', 'message' and
+        optionally 'alert_id'. Alerts that are already in the outbox are
+        skipped. `hold` are alert rows (with 'id') now held for a digest,
+        `release` the ids of held alerts that were just sent. Returns the
+        stored messages with their 'outbox_id'.
+        """
+        now = int(time.time())
+        def _enqueue():
+            cur = self._conn.cursor()
+            stored = []
+            try:
+                if release:
+                    cur.executemany(
+                        "DELETE FROM alert_held WHERE alert_id = ?",
+                        [(alert_id,) for alert_id in release]
+                    )
+                if hold:
+                    cur.executemany(
+                        "INSERT OR IGNORE INTO alert_held (alert_id, alert, created_at) VALUES (?, ?, ?)",
+                        [(int(row["id"]), json.dumps(row), now) for row in hold]
+                    )
+                for msg in messages:
+                    cur.execute(
+                        """
+                        INSERT OR IGNORE INTO alert_outbox
+                            (alert_id, recipient, recipient_fallback, message, status, attempts, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, 'sending', 0, ?, ?)
+                        """,
+                        (msg.get("alert_id"), msg["to"], msg.get("to_fallback"), msg["message"], now, now)
+                    )
+                    if cur.rowcount == 1:
+                        stored.append({**msg, "outbox_id": cur.lastrowid})
+                if source is not None and last_id is not None:
+                    self._set_cursor(cur, source, last_id, now)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            return stored
+        return await self._run(_enqueue)
+
+    # --- inbox (push alert source) ---
+    def _inbox_head(self, cur: sqlite3.Cursor) -> int:
+        # AUTOINCREMENT keeps the counter after the rows are deleted
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'alert_inbox'")
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+    async def append_inbox(self, rows: List[Dict[str, Any]]) -> int:
+        """Store pushed alert rows in one transaction, returns the newest inbox seq."""
+        now = int(time.time())
+        def _append():
+            cur = self._conn.cursor()
+            try:
+                cur.executemany(
+                    "INSERT INTO alert_inbox (alert, created_at) VALUES (?, ?)",
+                    [(json.dumps(row), now) for row in rows]
+                )
+                head = self._inbox_head(cur)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            return head
+        return await self._run(_append)
+
+    async def inbox_head(self) -> int:
+        """The newest inbox seq ever stored, 0 for an empty inbox."""
+        return await self._run(lambda: self._inbox_head(self._conn.cursor()))
+
+    async def read_inbox(self, after: int, limit: int = 1000, source: Optional[str] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Up to `limit` (seq, row) pairs after `after`, in push order. Rows at
+        or behind `source`'s stored cursor were dispatched and are deleted first.
+        """
+        def _read():
+            cur = self._conn.cursor()
+            if source is not None:
+                cur.execute(
+                    "DELETE FROM alert_inbox WHERE seq <= (SELECT last_id FROM alert_cursor WHERE source = ?)",
+                    (source,)
+                )
+                if cur.rowcount:
+                    self._conn.commit()
+            cur.execute(
+                "SELECT seq, alert FROM alert_inbox WHERE seq > ? ORDER BY seq ASC LIMIT ?",
+                (after, limit)
+            )
+            return [(row[0], json.loads(row[1])) for row in cur.fetchall()]
+        return await self._run(_read)
+
+    async def load_held(self) -> List[Dict[str, Any]]:
+        """Alert rows held for a digest when the process stopped, oldest first."""
+        def _load():
+            cur = self._conn.execute("SELECT alert FROM alert_held ORDER BY alert_id ASC")
+            return [json.loads(row[0]) for row in cur.fetchall()]
+        return await self._run(_load)
+
+    async def claim_pending(self, limit: int = 1000, include_sending: bool = False) -> List[Dict[str, Any]]:
+        """
+        Mark up to `limit` retryable rows as 'sending' and return them.
+        include_sending also reclaims rows that were in flight when the
+        process stopped (used once at startup).
+        """
+        statuses = ("pending", "sending") if include_sending else ("pending",)
+        now = int(time.time())
+        def _claim():
+            cur = self._conn.cursor()
+            cur.execute(
+                f"""
+                SELECT id, alert_id, recipient, recipient_fallback, message
+                FROM alert_outbox
+                WHERE status IN ({", ".join("?" * len(statuses))})
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (*statuses, limit)
+            )
+            rows = cur.fetchall()
+            if rows:
+                cur.executemany(
+                    "UPDATE alert_outbox SET status = 'sending', updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+                self._conn.commit()
+            return [
+                {
+                    "outbox_id": row[0],
+                    "alert_id": row[1],
+                    "to": row[2],
+                    "to_fallback": row[3],
+                    "message": row[4],
+                }
+                for row in rows
+            ]
+        return await self._run(_claim)
+
+    async def mark_results(self, results: List[Tuple[int, Optional[str]]]):
+        """
+        Record delivery results in one transaction: (outbox_id, None) is
+        sent, (outbox_id, error) a failed attempt, retried until max_attempts.
+        """
+        if not results:
+            return
+        now = int(time.time())
+        def _mark():
+            try:
+                self._conn.executemany(
+                    "UPDATE alert_outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?",
+                    [(now, outbox_id) for outbox_id, error in results if error is None]
+                )
+                self._conn.executemany(
+                    """
+                    UPDATE alert_outbox
+                    SET
+                        attempts = attempts + 1,
+                        status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                        last_error = ?,
+                        updated_at = ?
+                    WHERE id = ?
+                    """,
+                    [(self.max_attempts, error, now, outbox_id) for outbox_id, error in results if error is not None]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        await self._run(_mark)
+
+    async def compact(self, batch_size: int = 500) -> int:
+        """Delete confirmed ('sent') rows in batches, returns the number deleted."""
+        def _compact():
+            total = 0
+            while True:
+                cur = self._conn.execute(
+                    """
+                    DELETE FROM alert_outbox WHERE id IN (
+                        SELECT id FROM alert_outbox WHERE status = 'sent' ORDER BY id LIMIT ?
+                    )
+                    """,
+                    (batch_size,)
+                )
+                self._conn.commit()
+                total += cur.rowcount
+                if cur.rowcount < batch_size:
+                    return total
+        return await self._run(_compact)
+
+    async def get_stats(self) -> Dict[str, int]:
+        def _stats():
+            cur = self._conn.cursor()
+            cur.execute("SELECT status, COUNT(*) FROM alert_outbox GROUP BY status")
+            return {row[0]: row[1] for row in cur.fetchall()}
+        return await self._run(_stats)
+
+    async def close(self):
+        """Closes the connection, forcing an immediate checkpoint."""
+        async with self._lock:
+            if self._conn:
+                self._conn.execute("PRAGMA wal_checkpoint(FULL);")
+                self._conn.close()
+                self._conn = None
+                logger.info("AlertOutboxDB connection closed and checkpointed.")
+
+class IdentityDB:
+    """
+    Persisted side of the phone/LID identity index (core/identity.py): one
+    row per phone number with its LID, the ORIN user ids seen on it and the
+    address that last delivered ('phone' or 'lid').
+    """
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._init_done = False
+        self._lock = asyncio.Lock()
+
+    async def initialize(self):
+        async with self._lock:
+            if self._init_done:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL;")
+            self._conn.execute("PRAGMA synchronous = NORMAL;")
+            await asyncio.get_running_loop().run_in_executor(None, self._create_tables)
+            self._init_done = True
+            logger.info(f"IdentityDB initialized at {self.db_path}")
+
+    def _create_tables(self):
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS wa_identity (
+                phone TEXT PRIMARY KEY,
+                lid TEXT,
+                user_ids TEXT,
+                preferred TEXT,
+                updated_at INTEGER NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_wa_identity_lid ON wa_identity(lid);
+            """
+        )
+        self._conn.commit()
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking DB call in executor with lock."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+    async def load_all(self) -> List[Dict[str, Any]]:
+        def _load():
+            cur = self._conn.cursor()
+            cur.execute("SELECT phone, lid, user_ids, preferred, updated_at FROM wa_identity")
+            return [
+                {
+                    "phone": row[0],
+                    "lid": row[1],
+                    "user_ids": [int(user_id) for user_id in (row[2] or "").split(",") if user_id],
+                    "preferred": row[3],
+                    "updated_at": row[4],
+                }
+                for row in cur.fetchall()
+            ]
+        return await self._run(_load)
+
+    async def upsert_many(self, rows: List[Dict[str, Any]]):
+        def _upsert():
+            self._conn.executemany(
+                """
+                INSERT INTO wa_identity (phone, lid, user_ids, preferred, updated_at)
+                VALUES (:phone, :lid, :user_ids, :preferred, :updated_at)
+                ON CONFLICT(phone) DO UPDATE SET
+                    lid = excluded.lid,
+                    user_ids = excluded.user_ids,
+                    preferred = excluded.preferred,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    {**row, "user_ids": ",".join(str(user_id) for user_id in sorted(row["user_ids"]))}
+                    for row in rows
+                ],
+            )
+            self._conn.commit()
+        await self._run(_upsert)
+
+    async def close(self):
+        """Closes the connection, forcing an immediate checkpoint."""
+        async with self._lock:
+            if self._conn:
+                self._conn.execute("PRAGMA wal_checkpoint(FULL);")
+                self._conn.close()
+                self._conn = None
+                logger.info("IdentityDB connection closed and checkpointed.")
+
 # -----------------------------
 # Module-level singletons
 # -----------------------------
@@ -485,4 +1012,27 @@ async def ensure_settings_db():
             
 async def get_settings_db() -> SettingsDB:
     await ensure_settings_db()
-    return SETTINGS_DB
\ No newline at end of file
+    return SETTINGS_DB
+
+ALERT_OUTBOX_DB: Optional[AlertOutboxDB] = None
+_outbox_init_lock = asyncio.Lock()
+
+async def get_alert_outbox_db() -> AlertOutboxDB:
+    global ALERT_OUTBOX_DB
+    async with _outbox_init_lock:
+        if ALERT_OUTBOX_DB is None:
+            ALERT_OUTBOX_DB = AlertOutboxDB(OUTBOX_DB_PATH)
+            await ALERT_OUTBOX_DB.initialize()
+    return ALERT_OUTBOX_DB
+
+IDENTITY_DB: Optional[IdentityDB] = None
+_identity_init_lock = asyncio.Lock()
+
+async def get_identity_db() -> IdentityDB:
+    global IDENTITY_DB
+    async with _identity_init_lock:
+        if IDENTITY_DB is None:
+            IDENTITY_DB = IdentityDB(IDENTITY_DB_PATH)
+            await IDENTITY_DB.initialize()
+    return IDENTITY_DB
+
@@ -6,11 +6,9 @@ import os
 from typing import List, Dict
 
 import numpy as np
-import pandas as pd
-import httpx
 
 from src.orin_wa_report.core.logger import get_logger
-from src.orin_wa_report.core.utils import get_db_query_endpoint
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
 
 logger = get_logger(__name__)
 
@@ -54,23 +52,21 @@ async def insert_dummy_alert(user_id: int, device_id: int):
     else:
         message = "Unknown alert."
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json={
-            "query": f"INSERT INTO alert_notifications (device_id, user_id, alert_type, message) VALUES ({device_id}, {user_id}, '{alert_type}', '{message}');COMMIT;",
-            "api_key": db_api_key
-        })
-        response_sql: Dict = response.json()
+    response = await get_db_gateway().post(url, json={
+        "query": f"INSERT INTO alert_notifications (device_id, user_id, alert_type, message) VALUES ({device_id}, {user_id}, '{alert_type}', '{message}');COMMIT;",
+        "api_key": db_api_key
+    })
+    response_sql: Dict = response.json()
     
     return response_sql
 
 async def get_subscribed_users() -> List[Dict]:
     url = get_db_query_endpoint(name="devsites_orin_dev")
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json={
-            "query": f"SELECT id, name, wa_key, wa_notif, wa_number, wa_verified from users WHERE wa_notif = 1 AND wa_verified = 1"
-        })
-        response_sql: Dict = response.json()
+    response = await get_db_gateway().post(url, json={
+        "query": f"SELECT id, name, wa_key, wa_notif, wa_number, wa_verified from users WHERE wa_notif = 1 AND wa_verified = 1"
+    })
+    response_sql: Dict = response.json()
     
     return response_sql.get("rows")
 
@@ -84,24 +80,23 @@ async def create_dummy_notifications(sample: float = 0.25):
 
         if random.random() < sample:
             # Get Devices from user
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json={
-                    "query": """
-                        SELECT id, user_id, device_sn   , device_name 
-                        FROM devices 
-                        WHERE user_id = :user_id AND deleted_at IS NULL
-                    """,
-                    "params": {"user_id": user_id}
-                })
-                response_sql: Dict = response.json()
-
-            user_devices = pd.DataFrame(response_sql.get("rows", []))
-
-            if user_devices.empty:
+            response = await get_db_gateway().post(url, json={
+                "query": """
+                    SELECT id, user_id, device_sn   , device_name 
+                    FROM devices 
+                    WHERE user_id = :user_id AND deleted_at IS NULL
+                """,
+                "params": {"user_id": user_id}
+            })
+            response_sql: Dict = response.json()
+
+            user_devices: List[Dict] = response_sql.get("rows", [])
+
+            if not user_devices:
                 logger.info(f"No devices for user {user_name} (id={user_id})")
                 continue
 
-            random_device = user_devices.sample(n=1).iloc[0]
+            random_device = random.choice(user_devices)
             device_id = random_device["id"]
             device_sn = random_device["device_sn"]
             device_name = random_device["device_name"]
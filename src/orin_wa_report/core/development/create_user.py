@@ -6,10 +6,10 @@ import secrets
 import base64
 from typing import Dict
 
-import httpx
 import numpy as np
 
-from src.orin_wa_report.core.utils import get_db_query_endpoint
+from src.orin_wa_report.core.models import DBStatement
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
 from src.orin_wa_report.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -72,36 +72,38 @@ async def generate_api_token(length: int = 64) -> str:
     token = base64.urlsafe_b64encode(random_bytes).decode("utf-8").rstrip("=")
     return token
 
-async def create_dummy_devices(user_id: int, count: int = 3):
-    url = get_db_query_endpoint(name="devsites_orin_dev")
-    
-    values = []
-    for _ in range(count):
-        device_sn = f"6789{np.random.randint(10000000, 99999999)}"
+def build_dummy_devices_statement(owner_query: str, params: Dict, count: int = 3) -> DBStatement:
+    """
+    One INSERT ... SELECT for `count` random devices. `owner_query` selects
+    the owning user's id (as `id`) so the statement can follow the users
+    INSERT in the same batch.
+    """
+    params = dict(params)
+    devices = []
+    for i in range(count):
         first_name = np.random.choice(device_first_name_list)
         second_name = np.random.choice(device_second_name_list)
-        device_name = f"{first_name} {second_name}"
-        
-        gsm = f"081{np.random.randint(10000000, 99999999)}"
-        
-        # Escape strings properly
-        values.append(f"({user_id}, 64, {device_sn}, '{device_name}', '{gsm}', 'premium', NOW(), NOW())")
+        params[f"device_sn_{i}"] = f"6789{np.random.randint(10000000, 99999999)}"
+        params[f"device_name_{i}"] = f"{first_name} {second_name}"
+        params[f"gsm_{i}"] = f"081{np.random.randint(10000000, 99999999)}"
+        devices.append(f"SELECT :device_sn_{i} AS device_sn, :device_name_{i} AS device_name, :gsm_{i} AS gsm")
     
-    # Build one INSERT query with multiple rows
     query = f"""
     INSERT INTO devices (user_id, device_type_id, device_sn, device_name, gsm, status, created_at, updated_at) 
-    VALUES {", ".join(values)};
+    SELECT owner.id, 64, d.device_sn, d.device_name, d.gsm, 'premium', NOW(), NOW()
+    FROM ({owner_query}) AS owner
+    CROSS JOIN ({" UNION ALL ".join(devices)}) AS d;
     COMMIT;
     """
+    return DBStatement(query=query, params=params)
+
+async def create_dummy_devices(user_id: int, count: int = 3):
+    url = get_db_query_endpoint(name="devsites_orin_dev")
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json={
-            "query": query,
-            "api_key": db_api_key
-        })
-        response_sql: Dict = response.json()
+    statement = build_dummy_devices_statement("SELECT :user_id AS id", {"user_id": user_id}, count=count)
+    result = await get_db_gateway().execute(statement, url=url, api_key=db_api_key)
     
-    return response_sql
+    return result.model_dump()
 
 async def create_dummy_user(wa_verified: bool = False, name: str = None, phone_number: str = "", api_token: str = None, dummy_devices_count: int = 3):
     url = get_db_query_endpoint(name="devsites_orin_dev")
@@ -125,20 +127,32 @@ async def create_dummy_user(wa_verified: bool = False, name: str = None, phone_n
     hashed_password = "$2y$10$orinaimantapjayajayajayaluarbiasa"
     
     user_api_token = api_token if api_token else await generate_api_token(length=32)
+    user_params = {
+        "name": name,
+        "email": email,
+        "password": hashed_password,
+        "api_token": user_api_token,
+        "wa_number": wa_number,
+        "wa_verified": wa_verified,
+        "wa_lid": wa_lid,
+    }
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json={
-            "query": f"INSERT INTO users (name,email,password,created_at,updated_at,api_token,verified,account_type,license_type,google,facebook,has_tms,wa_number,wa_verified,wa_lid) VALUES ('{name}','{email}','{hashed_password}',NOW(),NOW(),'{user_api_token}',1,'premium','basic_annual',0,0,0,'{wa_number}',{wa_verified},'{wa_lid}');COMMIT;",
-            "api_key": db_api_key
-        })
-        response_sql: Dict = response.json()
-        
-    # Create dummy devices
-    user_id = response_sql.get("last_insert_id")
-    response_sql_devices = await create_dummy_devices(
-        user_id=user_id,
-        count=dummy_devices_count
-    )
+    # The user and its dummy devices go in one batch, the devices find
+    # their owner through the api_token and email just inserted
+    statements = [DBStatement(
+        query="INSERT INTO users (name,email,password,created_at,updated_at,api_token,verified,account_type,license_type,google,facebook,has_tms,wa_number,wa_verified,wa_lid) VALUES (:name,:email,:password,NOW(),NOW(),:api_token,1,'premium','basic_annual',0,0,0,:wa_number,:wa_verified,:wa_lid);COMMIT;",
+        params=user_params,
+    )]
+    if dummy_devices_count > 0:
+        statements.append(build_dummy_devices_statement(
+            "SELECT id FROM users WHERE api_token = :api_token AND email = :email ORDER BY id DESC LIMIT 1",
+            {"api_token": user_api_token, "email": email},
+            count=dummy_devices_count,
+        ))
+    results = await get_db_gateway().batch(statements, url=url, api_key=db_api_key, ordered=True)
+    response_sql: Dict = results[0].model_dump()
+    response_sql_devices: Dict = results[1].model_dump() if len(results) > 1 else {}
+    user_id = results[0].last_insert_id
         
     result = {
         "name": name,
@@ -1,6 +1,5 @@
 import base64, hmac, hashlib, time
 import os
-import httpx
 import asyncio
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
@@ -8,7 +7,9 @@ from typing import Dict
 
 from fastapi import Header, HTTPException
 
-from src.orin_wa_report.core.utils import get_db_query_endpoint
+from src.orin_wa_report.core.agent.accounts import forget_unresolved_sender
+from src.orin_wa_report.core.models import DBStatement, WaKeyExistsRow
+from src.orin_wa_report.core.utils import get_db_gateway, get_db_query_endpoint
 from dotenv import load_dotenv
 
 from src.orin_wa_report.core.logger import get_logger
@@ -72,12 +73,11 @@ async def verify_wa_key(token: str, max_age_seconds: int = 24 * 3600) -> dict:
 async def generate_and_store_wa_key(user_id: str):
     generated_wa_key = await generate_wa_key()
     query = f"UPDATE users SET wa_key = '{generated_wa_key}' WHERE id = {user_id}; COMMIT;"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(db_query_url, json={
-            "query": query,
-            "api_key": db_api_key,
-        })
-        response_sql: Dict = response.json()
+    response = await get_db_gateway().post(db_query_url, json={
+        "query": query,
+        "api_key": db_api_key,
+    })
+    response_sql: Dict = response.json()
         
     return {
         "wa_key": generated_wa_key,
@@ -92,75 +92,78 @@ async def verify_wa_key_and_store_wa_number(
     try:
         verification_result = await verify_wa_key(token=wa_key)
         
-        # Check if wa_key valid or not
-        query = """
-        SELECT CASE 
-            WHEN EXISTS (
-                SELECT 1 
-                FROM users 
-                WHERE wa_key = :wa_key
-            ) THEN 1 
-            ELSE 0
-        END AS wa_key_exists;
-        """
-        async with httpx.AsyncClient() as client:
-            response = await client.post(db_query_url, json={
-                "query": query,
-                "params": {"wa_key": wa_key}
-            })
-            response_sql: Dict = response.json()
-            
-        if response_sql.get("rows")[0].get("wa_key_exists") == 0:
-            raise ValueError(f"Wa key {wa_key} from number {wa_number} doesn't exist in database")
+        # The key check and both UPDATEs go to the gateway as one ordered batch.
+        # The UPDATEs only match when the key exists, so a bad key changes nothing.
+        statements = [
+            DBStatement(
+                query="""
+                SELECT CASE 
+                    WHEN EXISTS (
+                        SELECT 1 
+                        FROM users 
+                        WHERE wa_key = :wa_key
+                    ) THEN 1 
+                    ELSE 0
+                END AS wa_key_exists;
+                """,
+                params={"wa_key": wa_key},
+                row_model=WaKeyExistsRow,
+            ),
+        ]
         
         # IMPLEMENT WHEN NEW NUMBER VERIFIED, WHEN THERE IS SAME NUMBER ON OTHER USERS, THE OTHER USERS WILL BE UNVERIFIED
         # WhatsApp soon migrate from phone_number to lid_number
         if wa_number or wa_lid:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(db_query_url, json={
-                    "query": """
-                        UPDATE users
-                        SET
-                            wa_key = '',
-                            wa_notif = 0,
-                            wa_verified = 0,
-                            wa_number = ''
-                        WHERE wa_number = :wa_number
-                            OR wa_lid = :wa_lid;
-                        COMMIT;
-                    """,
-                    "params": {
-                        "wa_number": wa_number,
-                        "wa_lid": wa_lid,
-                    },
-                    "api_key": db_api_key,
-                })
-            response.raise_for_status()
-            response_json = response.json()
-            logger.info(f"Unverify all the users with the verified number: {response_json}")
-                
-        # Update WA Number to Database
-        query = """
-        UPDATE users 
-        SET wa_number = :wa_number, 
-            wa_lid = :wa_lid,
-            wa_notif = 1, 
-            wa_verified = 1 
-        WHERE wa_key = :wa_key;
-        COMMIT;
-        """
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(db_query_url, json={
-                "query": query,
-                "api_key": db_api_key,
-                "params": {
+            statements.append(DBStatement(
+                query="""
+                    UPDATE users
+                    SET
+                        wa_key = '',
+                        wa_notif = 0,
+                        wa_verified = 0,
+                        wa_number = ''
+                    WHERE (wa_number = :wa_number
+                        OR wa_lid = :wa_lid)
+                        AND (wa_key IS NULL OR wa_key <> :wa_key)
+                        AND EXISTS (
+                            SELECT 1 FROM (SELECT id FROM users WHERE wa_key = :wa_key) AS key_owner
+                        );
+                    COMMIT;
+                """,
+                params={
                     "wa_key": wa_key,
                     "wa_number": wa_number,
                     "wa_lid": wa_lid,
-                }
-            })
-            response_sql: Dict = response.json()
+                },
+            ))
+                
+        # Update WA Number to Database
+        statements.append(DBStatement(
+            query="""
+            UPDATE users 
+            SET wa_number = :wa_number, 
+                wa_lid = :wa_lid,
+                wa_notif = 1, 
+                wa_verified = 1 
+            WHERE wa_key = :wa_key;
+            COMMIT;
+            """,
+            params={
+                "wa_key": wa_key,
+                "wa_number": wa_number,
+                "wa_lid": wa_lid,
+            },
+        ))
+
+        results = await get_db_gateway().batch(statements, url=db_query_url, api_key=db_api_key, ordered=True)
+        
+        if results[0].rows[0].wa_key_exists == 0:
+            raise ValueError(f"Wa key {wa_key} from number {wa_number} doesn't exist in database")
+        # The number has an account now, don't wait for the unresolved entry to expire
+        forget_unresolved_sender(wa_number, wa_lid)
+        if len(results) == 3:
+            logger.info(f"Unverify all the users with the verified number: {results[1].model_dump()}")
+        response_sql: Dict = results[-1].model_dump()
             
         return {
             "verification_result": verification_result,
@@ -0,0 +1,294 @@
+import asyncio
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.db import IdentityDB, get_identity_db
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="FastAPI")
+
+PHONE_SUFFIX = "@c.us"
+LID_SUFFIX = "@lid"
+
+
+# -----------------------------
+# Normalisation
+# -----------------------------
+def strip_jid(address: Optional[str]) -> str:
+    """'6281...@c.us' / '1281...@lid' -> the bare number."""
+    return (address or "").split("@")[0]
+
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """Any phone form (+62..., 08..., 62...@c.us) -> '62...', None if there are no digits."""
+    digits = re.sub(r"\D", "", strip_jid(value))
+    if not digits:
+        return None
+    if digits.startswith("0"):
+        digits = "62" + digits[1:]
+    return digits
+
+
+def local_phone_number(phone: str) -> str:
+    """'6281...' -> '081...', the form stored in users.phone_number."""
+    return "0" + phone[2:]
+
+
+def wplus_phone_number(phone: str) -> str:
+    return "+" + phone
+
+
+def phone_jid(phone: str) -> str:
+    return f"{phone}{PHONE_SUFFIX}"
+
+
+def lid_jid(lid: str) -> str:
+    return f"{lid}{LID_SUFFIX}"
+
+
+def is_lid(address: Optional[str]) -> bool:
+    return bool(address) and address.endswith(LID_SUFFIX)
+
+
+class IdentityEntry:
+    __slots__ = ("phone", "lid", "user_ids", "preferred", "updated_at")
+
+    def __init__(
+        self,
+        phone: str,
+        lid: Optional[str] = None,
+        user_ids: Iterable[int] = (),
+        preferred: Optional[str] = None,
+        updated_at: Optional[int] = None,
+    ):
+        self.phone = phone
+        self.lid = lid
+        self.user_ids: Set[int] = set(user_ids)
+        self.preferred = preferred  # 'phone' | 'lid' | None, the address that last delivered
+        self.updated_at = updated_at or int(time.time())
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "phone": self.phone,
+            "lid": self.lid,
+            "user_ids": self.user_ids,
+            "preferred": self.preferred,
+            "updated_at": self.updated_at,
+        }
+
+
+class IdentityIndex:
+    """
+    Bidirectional phone <-> LID <-> user index, in memory with write-behind
+    persistence to IdentityDB.
+
+    Pairs are learned from inbound messages (sender.phoneNumber/sender.lid)
+    and user ids from account lookups. Send paths ask `order(to, fallback)`
+    for the address that last delivered to that person first, and report
+    back through `record()`, so a contact that only answers on @lid stops
+    costing a failed @c.us attempt on every send.
+    """
+    def __init__(self, db: Optional[IdentityDB] = None, flush_interval: float = 5.0):
+        self._db = db
+        self.flush_interval = flush_interval
+        self._by_phone: Dict[str, IdentityEntry] = {}
+        self._by_lid: Dict[str, str] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.learned = 0
+        self.reordered = 0
+
+    def __len__(self) -> int:
+        return len(self._by_phone)
+
+    # --- loading / persistence ---
+    async def load(self):
+        if self._db is None:
+            self._db = await get_identity_db()
+        else:
+            await self._db.initialize()
+        rows = await self._db.load_all()
+        for row in rows:
+            self._put(IdentityEntry(**row))
+        logger.info(f"Identity index loaded {len(rows)} numbers")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist identity index: {e}")
+
+    async def flush(self) -> int:
+        if not self._dirty or self._db is None:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        rows = [self._by_phone[phone].to_row() for phone in dirty if phone in self._by_phone]
+        try:
+            await self._db.upsert_many(rows)
+        except Exception:
+            # Try again on the next flush
+            self._dirty |= dirty
+            raise
+        return len(rows)
+
+    # --- index maintenance ---
+    def _put(self, entry: IdentityEntry):
+        self._by_phone[entry.phone] = entry
+        if entry.lid:
+            self._by_lid[entry.lid] = entry.phone
+        for user_id in entry.user_ids:
+            self._by_user.setdefault(user_id, set()).add(entry.phone)
+
+    def _entry(self, phone: str) -> IdentityEntry:
+        entry = self._by_phone.get(phone)
+        if entry is None:
+            entry = self._by_phone[phone] = IdentityEntry(phone)
+        return entry
+
+    def _touch(self, entry: IdentityEntry):
+        entry.updated_at = int(time.time())
+        self._dirty.add(entry.phone)
+
+    def learn(self, phone: Optional[str], lid: Optional[str]) -> bool:
+        """Record that `phone` and `lid` are the same WhatsApp account, True if anything changed."""
+        phone, lid = normalize_phone(phone), strip_jid(lid) or None
+        if not phone or not lid:
+            return False
+        entry = self._by_phone.get(phone)
+        if entry is not None and entry.lid == lid:
+            return False
+        # A LID belongs to one number, move it if it was seen elsewhere
+        previous_phone = self._by_lid.get(lid)
+        if previous_phone and previous_phone != phone:
+            previous = self._by_phone[previous_phone]
+            previous.lid = None
+            self._touch(previous)
+        entry = self._entry(phone)
+        if entry.lid:
+            self._by_lid.pop(entry.lid, None)
+            # The old LID's delivery history doesn't carry over
+            if entry.preferred == "lid":
+                entry.preferred = None
+        entry.lid = lid
+        self._by_lid[lid] = phone
+        self._touch(entry)
+        self.learned += 1
+        return True
+
+    def learn_from_message(self, msg: Dict) -> bool:
+        data = msg.get("data") or {}
+        if data.get("isGroupMsg") or data.get("fromMe"):
+            return False
+        sender = data.get("sender") or {}
+        return self.learn(sender.get("phoneNumber"), sender.get("lid"))
+
+    def link_users(self, phone: Optional[str], user_ids: Iterable[int]):
+        """Record the ORIN user ids registered on `phone`."""
+        phone = normalize_phone(phone)
+        if not phone:
+            return
+        user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        entry = self._entry(phone)
+        if user_ids <= entry.user_ids:
+            return
+        for user_id in user_ids - entry.user_ids:
+            self._by_user.setdefault(user_id, set()).add(phone)
+        entry.user_ids |= user_ids
+        self._touch(entry)
+
+    # --- lookups ---
+    def lid_for(self, phone: Optional[str]) -> Optional[str]:
+        entry = self._by_phone.get(normalize_phone(phone) or "")
+        return entry.lid if entry else None
+
+    def phone_for(self, lid: Optional[str]) -> Optional[str]:
+        return self._by_lid.get(strip_jid(lid))
+
+    def phones_for_user(self, user_id: int) -> List[str]:
+        return sorted(self._by_user.get(int(user_id), ()))
+
+    def get(self, phone: Optional[str]) -> Optional[IdentityEntry]:
+        return self._by_phone.get(normalize_phone(phone) or "")
+
+    def _entry_for_address(self, address: Optional[str]) -> Optional[IdentityEntry]:
+        if not address:
+            return None
+        if is_lid(address):
+            phone = self._by_lid.get(strip_jid(address))
+            return self._by_phone.get(phone) if phone else None
+        if not address.endswith(PHONE_SUFFIX):
+            return None
+        return self._by_phone.get(strip_jid(address))
+
+    # --- send path ---
+    def order(self, to: str, fallback: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """(first, second) address for a send, the one known to deliver goes first."""
+        entry = self._entry_for_address(to) or self._entry_for_address(fallback)
+        if entry is None or entry.preferred is None:
+            return to, fallback
+        if fallback is None and entry.preferred == "lid" and entry.lid and not is_lid(to):
+            # No fallback given but the LID is known to work
+            self.reordered += 1
+            return lid_jid(entry.lid), to
+        if fallback and is_lid(to) != (entry.preferred == "lid"):
+            self.reordered += 1
+            return fallback, to
+        return to, fallback
+
+    def record(self, delivered_to: str):
+        """The send to `delivered_to` succeeded, prefer its kind of address for this person."""
+        entry = self._entry_for_address(delivered_to)
+        if entry is None:
+            if delivered_to.endswith(PHONE_SUFFIX):
+                entry = self._entry(strip_jid(delivered_to))
+            else:
+                return
+        preferred = "lid" if is_lid(delivered_to) else "phone"
+        if entry.preferred != preferred:
+            entry.preferred = preferred
+            self._touch(entry)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "numbers": len(self._by_phone),
+            "lids": len(self._by_lid),
+            "users": len(self._by_user),
+            "prefer_lid": sum(1 for entry in self._by_phone.values() if entry.preferred == "lid"),
+            "learned": self.learned,
+            "reordered_sends": self.reordered,
+            "unsaved": len(self._dirty),
+        }
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_IDENTITY_INDEX: Optional[IdentityIndex] = None
+
+
+def get_identity_index() -> IdentityIndex:
+    """The shared index; the app loads and starts it on startup."""
+    global _IDENTITY_INDEX
+    if _IDENTITY_INDEX is None:
+        identity_config: Dict = get_config_data().get("identity") or {}
+        _IDENTITY_INDEX = IdentityIndex(flush_interval=identity_config.get("flush_interval", 5.0))
+    return _IDENTITY_INDEX
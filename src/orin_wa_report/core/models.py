@@ -1,4 +1,4 @@
-from typing import Optional, Literal, Dict
+from typing import Optional, Literal, Dict, List, Any
 
 from pydantic import BaseModel, RootModel, Field
 
@@ -7,6 +7,9 @@ class SendMessageRequest(BaseModel):
     to_fallback: Optional[str] = None
     message: str  # message text
 
+class OutboxMessageRequest(SendMessageRequest):
+    outbox_id: Optional[int] = None  # alert_outbox row to confirm once sent
+
 class SendFileRequest(BaseModel):
     to: str
     to_fallback: Optional[str] = None
@@ -326,4 +329,58 @@ put_user_alert_settings_response_500 = {
             }
         }
     }
-}
\ No newline at end of file
+}
+
+# Alert Ingest
+class IngestAlertsRequest(BaseModel):
+    alerts: List[Dict[str, Any]] = Field(
+        ...,
+        description="Rows of alert_notifications joined with users.wa_number, users.wa_lid and devices.device_name"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "alerts": [
+                    {
+                        "id": 1024,
+                        "user_id": 12,
+                        "device_id": 345,
+                        "alert_type": "notif_speed_alert",
+                        "message": "Overspeed 96.5km/h",
+                        "wa_number": "6281234567890",
+                        "wa_lid": "12816215965755",
+                        "device_name": "Truk Gesit",
+                    }
+                ]
+            }
+        }
+    }
+
+# DB query gateway
+class DBStatement(BaseModel):
+    query: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    row_model: Optional[type[BaseModel]] = Field(None, exclude=True)  # parse rows into this model
+
+class DBResult(BaseModel):
+    rows: List[Any] = Field(default_factory=list)
+    last_insert_id: Optional[int] = None
+
+    model_config = {"extra": "allow"}  # keep whatever else the gateway reports
+
+class UserIdentityRow(BaseModel):
+    user_id: int
+    parent_id: Optional[int] = None
+
+class WaKeyExistsRow(BaseModel):
+    wa_key_exists: int
+
+class AlertIdRow(BaseModel):
+    id: int
+
+class PhoneAccountRow(BaseModel):
+    id: int
+    name: Optional[str] = None
+    api_token: Optional[str] = None
+    wa_number: Optional[str] = None
@@ -1,7 +1,11 @@
+import asyncio
+import inspect
 import json
+import random
 import re
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 # import logging
 
 import requests
@@ -150,4 +154,278 @@ class SocketClient(object):
         return id
 
     def disconnect(self):
-        self.io.disconnect()
\ No newline at end of file
+        self.io.disconnect()
+
+class WATimeoutError(WAError):
+    """An OpenWA call did not answer within the facade timeout."""
+
+
+class AsyncSocketClient(object):
+    """
+    asyncio version of SocketClient on socketio.AsyncClient.
+
+    Same dynamic surface: `await client.sendText(to, text)` is an acked
+    `call`, `client.onAnyMessage(handler)` registers a listener. Acks carry
+    their own ids, so any number of calls share the one connection. Event
+    handlers run in the event loop; coroutine handlers are started as tasks.
+    Call `await client.connect()` once, dropped connections are retried with
+    jittered exponential backoff.
+    """
+    def __init__(self, url, api_key=None, sync=True, call_timeout=60, reconnect_base=1.0, reconnect_max=30.0):
+        """
+        :param url: wa-automate URL
+        :param api_key: Authentication key (required if provided on wa-automate cli initialization)
+        :param sync: Default behavior, wait for the ack (True) or fire-and-forget emit
+        :param call_timeout: Seconds to wait for an ack
+        """
+        self.handlers = {}
+        self.url = re.sub(r'\/$', '', url)
+        self.sync = sync
+        self.api_key = api_key
+        self.call_timeout = call_timeout
+        self.reconnect_base = reconnect_base
+        self.reconnect_max = reconnect_max
+        self.in_flight = 0
+        self._closing = False
+        self._reconnect_task = None
+        self._handler_tasks = set()
+
+        # Reconnects are driven by _connect_loop
+        self.io = socketio.AsyncClient(reconnection=False)
+
+        @self.io.event
+        async def connect():
+            logger.info("Connected to OpenWA Server")
+            await self.io.emit("register_ev")
+
+        @self.io.on('*')
+        async def catch_all(event, data):
+            # Clean event name if necessary
+            event_name = event.split('.')[0]
+            for handler in list(self.handlers.get(event_name, {}).values()):
+                try:
+                    result = handler(data)
+                    if inspect.isawaitable(result):
+                        # Don't hold up the receive loop on slow handlers
+                        task = asyncio.ensure_future(result)
+                        self._handler_tasks.add(task)
+                        task.add_done_callback(self._handler_done)
+                except Exception as e:
+                    logger.error(f"Error in handler for {event_name}: {e}")
+
+        @self.io.event
+        async def connect_error(data):
+            logger.error(f"Connection Error: {data}")
+
+        @self.io.event
+        async def disconnect(*args):
+            logger.info("Disconnected from OpenWA Server")
+            if not self._closing and (self._reconnect_task is None or self._reconnect_task.done()):
+                self._reconnect_task = asyncio.create_task(self._connect_loop())
+
+    def _handler_done(self, task):
+        self._handler_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error in async handler: {task.exception()}")
+
+    def _backoff(self, attempt):
+        """Equal jitter: half the exponential delay plus a random half."""
+        delay = min(self.reconnect_max, self.reconnect_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _connect_loop(self):
+        attempt = 0
+        while not self._closing:
+            try:
+                await self.io.connect(self.url, auth={'apiKey': self.api_key})
+                return
+            except (ConnectionError, Exception) as e:
+                delay = self._backoff(attempt)
+                logger.warning(f"Connection failed, retrying in {delay:.1f}s... ({e})")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def connect(self):
+        self._closing = False
+        await self._connect_loop()
+
+    def _validate_response(self, response):
+        if isinstance(response, str) and response.startswith("ERROR"):
+            logger.error(f"Command failed: {response}")
+            raise WAError(response)
+        return response
+
+    async def _call(self, item, args, timeout=None):
+        self.in_flight += 1
+        try:
+            res = await self.io.call(item, {'args': args}, timeout=timeout or self.call_timeout)
+            return self._validate_response(res)
+        except socketio.exceptions.TimeoutError:
+            logger.error(f"Timeout calling {item}")
+            raise WATimeoutError("Timeout waiting for response")
+        finally:
+            self.in_flight -= 1
+
+    async def _emit(self, item, args, callback):
+        def wrapped_callback(res):
+            if isinstance(res, str) and res.startswith("ERROR"):
+                logger.error(f"Async command {item} failed: {res}")
+            callback(res)
+
+        await self.io.emit(item, {'args': args}, callback=wrapped_callback)
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        client = self
+
+        class Func:
+            def __call__(self, *args, **kwargs):
+                if item.startswith('on'):
+                    return client.listen(item, args[0])
+                if kwargs.get('sync', client.sync):
+                    return client._call(item, args, timeout=kwargs.get('timeout'))
+                return client._emit(item, args, kwargs.get('callback', lambda _: None))
+
+        return Func()
+
+    def stop_listener(self, listener, listener_id):
+        if listener in self.handlers and listener_id in self.handlers[listener]:
+            del self.handlers[listener][listener_id]
+            return True
+        return False
+
+    def listen(self, event, handler):
+        id = str(uuid.uuid4())
+        if event not in self.handlers:
+            self.handlers[event] = {}
+        self.handlers[event][id] = handler
+        return id
+
+    async def disconnect(self):
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        await self.io.disconnect()
+
+
+class AsyncOpenWAClient(object):
+    """
+    Awaitable facade over SocketClient or AsyncSocketClient.
+
+    For the blocking SocketClient every call runs `client.io.call` on a
+    bounded thread pool, so a slow OpenWA ack only blocks a worker thread
+    instead of the event loop. At most `max_concurrency` calls are in flight;
+    a call that outlives `timeout` raises WATimeoutError to the caller but
+    keeps its slot until the thread returns, so stuck acks can't pile up
+    unbounded work. AsyncSocketClient calls are awaited directly.
+
+    `address_book` (the identity index) decides which of a send's two
+    addresses goes first and learns which one delivered.
+    """
+    def __init__(
+        self,
+        client: "SocketClient | AsyncSocketClient",
+        max_workers=8,
+        max_concurrency=8,
+        timeout=30.0,
+        address_book=None,
+    ):
+        self.client = client
+        self.address_book = address_book
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.is_async = isinstance(client, AsyncSocketClient)
+        self._executor = None if self.is_async else ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="openwa"
+        )
+        self._slots = None
+        self.in_flight = 0
+        self.timeouts = 0
+
+    def _get_slots(self):
+        # Created lazily so the semaphore binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    async def call(self, method, *args, timeout=None):
+        """Run any SocketClient command, e.g. `await wa.call("getContact", jid)`."""
+        if self.is_async:
+            async with self._get_slots():
+                try:
+                    return await getattr(self.client, method)(*args, timeout=timeout or self.timeout)
+                except WATimeoutError:
+                    self.timeouts += 1
+                    raise
+
+        loop = asyncio.get_running_loop()
+        slots = self._get_slots()
+        await slots.acquire()
+        self.in_flight += 1
+
+        def release(_):
+            self.in_flight -= 1
+            slots.release()
+
+        try:
+            future = loop.run_in_executor(self._executor, lambda: getattr(self.client, method)(*args))
+        except Exception:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"Timeout calling {method} after {timeout or self.timeout}s")
+            # the worker thread still finishes, don't leave its error unretrieved
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise WATimeoutError(f"Timeout waiting for {method}")
+
+    async def deliver(self, method, to, fallback, *args, timeout=None):
+        """
+        Run `method` on `to`, retrying on `fallback` on WAError. With an
+        address book the address known to deliver is tried first. Returns
+        (result, address used).
+        """
+        if self.address_book is not None:
+            to, fallback = self.address_book.order(to, fallback)
+        try:
+            result = await self.call(method, to, *args, timeout=timeout)
+            delivered_to = to
+        except WATimeoutError:
+            # the first send may still land, don't risk a duplicate
+            raise
+        except WAError:
+            if not fallback:
+                raise
+            result = await self.call(method, fallback, *args, timeout=timeout)
+            delivered_to = fallback
+        if self.address_book is not None:
+            self.address_book.record(delivered_to)
+        return result, delivered_to
+
+    async def _with_fallback(self, method, to, fallback, *args, timeout=None):
+        result, _ = await self.deliver(method, to, fallback, *args, timeout=timeout)
+        return result
+
+    async def send_text(self, to, content, fallback=None, timeout=None):
+        """sendText to `to`, retrying on `fallback` (e.g. the @lid) on WAError."""
+        return await self._with_fallback("sendText", to, fallback, content, timeout=timeout)
+
+    async def send_file(self, to, file, filename="file", caption="", fallback=None, timeout=None):
+        return await self._with_fallback("sendFile", to, fallback, file, filename, caption, timeout=timeout)
+
+    async def send_seen(self, chat_id, timeout=None):
+        return await self.call("sendSeen", chat_id, timeout=timeout)
+
+    async def simulate_typing(self, chat_id, on=True, timeout=None):
+        return await self.call("simulateTyping", chat_id, on, timeout=timeout)
+
+    async def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            await asyncio.to_thread(self.client.disconnect)
+        else:
+            await self.client.disconnect()
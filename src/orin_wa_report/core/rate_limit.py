@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="Agent")
+
+
+class SenderRateLimiter:
+    """
+    Token bucket per sender. Each sender may send `burst` messages at once
+    and `rate` messages per second after that; `allow(sender)` is a dict
+    lookup and some arithmetic, so floods are dropped before any DB or
+    OpenWA work. At most `max_senders` buckets are kept, least recently
+    seen senders are forgotten first (they start over with a full bucket).
+    """
+    def __init__(
+        self,
+        rate: float = 0.5,
+        burst: int = 10,
+        max_senders: int = 50000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_senders = max_senders
+        self._clock = clock
+        # sender -> (tokens, last refill time)
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.dropped = 0
+
+    def allow(self, sender: Hashable) -> bool:
+        if not sender or self.rate <= 0:
+            self.allowed += 1
+            return True
+        now = self._clock()
+        tokens, last = self._buckets.get(sender, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+            self.allowed += 1
+        else:
+            self.dropped += 1
+            # Log once per flood, not once per dropped message
+            if self._buckets.get(sender, (1.0, now))[0] >= 1.0:
+                logger.warning(f"Inbound rate limit reached for {sender}, dropping messages")
+        self._buckets[sender] = (tokens, now)
+        self._buckets.move_to_end(sender)
+        while len(self._buckets) > self.max_senders:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "senders": len(self._buckets),
+            "allowed": self.allowed,
+            "dropped": self.dropped,
+        }
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_INBOUND_RATE_LIMITER: Optional[SenderRateLimiter] = None
+
+
+def get_inbound_rate_limiter() -> SenderRateLimiter:
+    global _INBOUND_RATE_LIMITER
+    if _INBOUND_RATE_LIMITER is None:
+        rate_limit_config: Dict = get_config_data().get("inbound_rate_limit") or {}
+        _INBOUND_RATE_LIMITER = SenderRateLimiter(
+            rate=rate_limit_config.get("rate", 0.5),
+            burst=rate_limit_config.get("burst", 10),
+            max_senders=rate_limit_config.get("max_senders", 50000),
+        )
+    return _INBOUND_RATE_LIMITER
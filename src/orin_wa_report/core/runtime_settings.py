@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.db import SettingsDB, get_settings_db
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="FastAPI")
+
+
+class RuntimeSettings(BaseModel):
+    """Toggles the dashboard can flip while the app runs."""
+    enable_create_dummy_alert: bool = False
+    enable_send_alert: bool = False
+
+
+class RuntimeSettingsStore:
+    """
+    In-process runtime settings. Background loops read `settings` directly
+    and `await wait_for_change()` instead of polling; `update()` saves the
+    new values in SettingsDB (runtime_setting table) so they survive a
+    restart, then wakes every waiter.
+
+    Starting values come from config.yaml and are overridden by whatever
+    was saved last.
+    """
+    def __init__(self, settings_db: SettingsDB, config_data: Dict):
+        self._settings_db = settings_db
+        self._config_data = config_data
+        self.settings = RuntimeSettings(
+            enable_create_dummy_alert=(config_data.get("dummy") or {}).get("enable_create_alert", False),
+            enable_send_alert=(config_data.get("fastapi") or {}).get("enable_send_alert", False),
+        )
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    async def load(self):
+        saved = await self._settings_db.get_runtime_settings()
+        known = {k: v for k, v in saved.items() if k in RuntimeSettings.model_fields}
+        if known:
+            self._apply(self.settings.model_copy(update=known))
+            logger.info(f"Runtime settings restored: {self.settings.model_dump()}")
+
+    def _apply(self, settings: RuntimeSettings):
+        self.settings = settings
+        # Keep the raw config dict in step for code that still reads it
+        self._config_data.setdefault("dummy", {})["enable_create_alert"] = settings.enable_create_dummy_alert
+        self._config_data.setdefault("fastapi", {})["enable_send_alert"] = settings.enable_send_alert
+
+    async def update(self, **values: Any) -> RuntimeSettings:
+        settings = RuntimeSettings(**{**self.settings.model_dump(), **values})
+        changed = {
+            key: value for key, value in settings.model_dump().items()
+            if getattr(self.settings, key) != value
+        }
+        if not changed:
+            return self.settings
+        await self._settings_db.put_runtime_settings(changed)
+        self._apply(settings)
+        self.version += 1
+        logger.info(f"Runtime settings changed: {changed}")
+        # Wake everybody waiting on this change, later waiters get a new event
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+        return settings
+
+    async def wait_for_change(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the next update(), returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_RUNTIME_SETTINGS: Optional[RuntimeSettingsStore] = None
+_runtime_settings_lock = asyncio.Lock()
+
+
+async def get_runtime_settings() -> RuntimeSettingsStore:
+    global _RUNTIME_SETTINGS
+    async with _runtime_settings_lock:
+        if _RUNTIME_SETTINGS is None:
+            store = RuntimeSettingsStore(await get_settings_db(), get_config_data())
+            await store.load()
+            _RUNTIME_SETTINGS = store
+    return _RUNTIME_SETTINGS
@@ -0,0 +1,314 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from src.orin_wa_report.core.config import get_config_data
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="FastAPI")
+
+# Lower value is served first
+PRIORITY_CHAT = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_BULK: "bulk"}
+
+
+class TokenBucket:
+    """Classic token bucket, `rate` tokens per second up to `capacity`."""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available, 0 if it is available now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendJob:
+    __slots__ = ("recipient", "action", "priority", "enqueued_at", "future")
+
+    def __init__(
+        self,
+        recipient: str,
+        action: Callable[[], Any],
+        priority: int,
+        enqueued_at: float,
+        future: asyncio.Future,
+    ):
+        self.recipient = recipient
+        self.action = action
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class SendScheduler:
+    """
+    Outbound WhatsApp send scheduler.
+
+    - a global token bucket caps the overall send rate,
+    - a token bucket per recipient caps how fast one chat receives messages,
+    - recipients are served round-robin, so a fleet owner with hundreds of
+      queued alerts can't starve everybody else,
+    - PRIORITY_CHAT jobs (chat replies) go before PRIORITY_BULK (alerts).
+
+    Jobs are zero-argument callables (sync or async) that do the actual send,
+    e.g. `lambda: wa_client.send_text(to, text)`. Up to `max_in_flight`
+    sends run at once, so a slow or timed-out send only holds its own slot;
+    a recipient has at most one send in flight, which keeps its messages
+    in order.
+    """
+    def __init__(
+        self,
+        global_rate: float = 4.0,
+        global_burst: float = 8.0,
+        recipient_rate: float = 1.0,
+        recipient_burst: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        wait_samples: int = 1000,
+        max_in_flight: int = 8,
+    ):
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self._clock = clock
+        self._global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self._recipient_buckets: Dict[str, TokenBucket] = {}
+        # priority -> recipient -> jobs, and priority -> round-robin ring
+        self._queues: Dict[int, Dict[str, Deque[SendJob]]] = {p: {} for p in PRIORITY_NAMES}
+        self._rings: Dict[int, Deque[str]] = {p: deque() for p in PRIORITY_NAMES}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight: Set[asyncio.Task] = set()
+        self._sending: Set[str] = set()  # recipients with a send in flight
+        self._last_prune = clock()
+
+        # Metrics
+        self._wait_times: Dict[int, Deque[float]] = {
+            p: deque(maxlen=wait_samples) for p in PRIORITY_NAMES
+        }
+        self.sent = 0
+        self.failed = 0
+
+    # --- producer side ---
+    def submit(
+        self,
+        recipient: str,
+        action: Callable[[], Any | Awaitable[Any]],
+        priority: int = PRIORITY_BULK,
+    ) -> asyncio.Future:
+        """Queue a send and return a future with the action's result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        job = SendJob(recipient, action, priority, self._clock(), future)
+
+        queues = self._queues[priority]
+        if recipient not in queues:
+            queues[recipient] = deque()
+            self._rings[priority].append(recipient)
+        queues[recipient].append(job)
+        self._wakeup.set()
+        return future
+
+    async def send(
+        self,
+        recipient: str,
+        action: Callable[[], Any | Awaitable[Any]],
+        priority: int = PRIORITY_CHAT,
+    ) -> Any:
+        """Queue a send and wait for it to go out."""
+        return await self.submit(recipient, action, priority)
+
+    # --- worker side ---
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop taking jobs and wait for the sends already started."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _recipient_bucket(self, recipient: str, now: float) -> TokenBucket:
+        bucket = self._recipient_buckets.get(recipient)
+        if bucket is None:
+            bucket = TokenBucket(self.recipient_rate, self.recipient_burst, now)
+            self._recipient_buckets[recipient] = bucket
+        return bucket
+
+    def _next_ready(self):
+        """
+        Pop the next job allowed to go out now. Returns (job, None) or
+        (None, seconds until something may be ready / None if idle).
+        """
+        now = self._clock()
+        if not any(self._rings.values()):
+            return None, None
+
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        min_wait: Optional[float] = None
+        for priority in sorted(self._rings):
+            ring = self._rings[priority]
+            queues = self._queues[priority]
+            for _ in range(len(ring)):
+                recipient = ring[0]
+                ring.rotate(-1)
+                if recipient in self._sending:
+                    # woken up again when its send finishes
+                    continue
+                bucket = self._recipient_bucket(recipient, now)
+                wait = bucket.wait_time(now)
+                if wait > 0:
+                    min_wait = wait if min_wait is None else min(min_wait, wait)
+                    continue
+
+                jobs = queues[recipient]
+                job = jobs.popleft()
+                if not jobs:
+                    del queues[recipient]
+                    ring.remove(recipient)
+                bucket.take(now)
+                self._global_bucket.take(now)
+                return job, None
+        return None, min_wait
+
+    def _prune_buckets(self, now: float):
+        """Forget buckets of idle recipients, a full bucket carries no state."""
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        queued = set()
+        for queues in self._queues.values():
+            queued.update(queues)
+        for recipient in [
+            r for r, bucket in self._recipient_buckets.items()
+            if r not in queued and bucket.is_full(now)
+        ]:
+            del self._recipient_buckets[recipient]
+
+    async def _execute(self, job: SendJob):
+        self._wait_times[job.priority].append(self._clock() - job.enqueued_at)
+        try:
+            result = job.action()
+            if inspect.isawaitable(result):
+                result = await result
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Send to {job.recipient} failed: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+                # Fire-and-forget callers never read the future
+                job.future.add_done_callback(lambda f: f.exception())
+
+    async def _execute_in_slot(self, job: SendJob):
+        try:
+            await self._execute(job)
+        finally:
+            self._sending.discard(job.recipient)
+            self._slots.release()
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            # a free slot first, so rate tokens are only taken for a send that can start
+            await self._slots.acquire()
+            job, wait = self._next_ready()
+            if job is None:
+                self._slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._sending.add(job.recipient)
+            task = asyncio.create_task(self._execute_in_slot(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            self._prune_buckets(self._clock())
+
+    # --- metrics ---
+    def metrics(self) -> Dict[str, Any]:
+        def percentile(samples, q):
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+
+        queues = {}
+        for priority, name in PRIORITY_NAMES.items():
+            jobs = self._queues[priority]
+            waits = self._wait_times[priority]
+            queues[name] = {
+                "depth": sum(len(q) for q in jobs.values()),
+                "recipients": len(jobs),
+                "wait_seconds_p50": percentile(waits, 0.5),
+                "wait_seconds_p99": percentile(waits, 0.99),
+                "wait_seconds_max": round(max(waits), 3) if waits else None,
+            }
+        return {
+            "depth": sum(q["depth"] for q in queues.values()),
+            "queues": queues,
+            "sent": self.sent,
+            "failed": self.failed,
+            "in_flight": len(self._in_flight),
+            "tracked_recipients": len(self._recipient_buckets),
+        }
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_SEND_SCHEDULER: Optional[SendScheduler] = None
+
+
+def get_send_scheduler() -> SendScheduler:
+    global _SEND_SCHEDULER
+    if _SEND_SCHEDULER is None:
+        scheduler_config: Dict = get_config_data().get("send_scheduler") or {}
+        _SEND_SCHEDULER = SendScheduler(
+            global_rate=scheduler_config.get("global_rate", 4.0),
+            global_burst=scheduler_config.get("global_burst", 8.0),
+            recipient_rate=scheduler_config.get("recipient_rate", 1.0),
+            recipient_burst=scheduler_config.get("recipient_burst", 5.0),
+            # defaults to what the OpenWA client lets through at once
+            max_in_flight=scheduler_config.get(
+                "max_in_flight", (get_config_data().get("openwa") or {}).get("max_concurrency", 8)
+            ),
+        )
+    return _SEND_SCHEDULER
@@ -0,0 +1,79 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from src.orin_wa_report.core.logger import get_logger
+
+logger = get_logger(__name__, service="Agent")
+
+
+class TimerHeap:
+    """
+    Deadlines for many objects on one asyncio task.
+
+    `schedule(due, fn, *args)` pushes onto a heap (no task is created) and
+    the runner calls `fn(*args)` on the loop once `due` (a `clock()` time)
+    has passed. Callbacks must be quick and synchronous; they start tasks
+    for anything slow. There is no cancel: a callback checks whether its
+    object still cares when it fires, and a deadline that moved later
+    (e.g. on new activity) is re-armed by scheduling again from the
+    callback, so moving a deadline costs nothing at the time it moves.
+    """
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._heap: List[Tuple[float, int, Callable, Tuple[Any, ...]]] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, due: float, fn: Callable, *args):
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, next(self._seq), fn, args))
+        # Only a new earliest deadline needs the runner to look again
+        if self._wake is not None and (earliest is None or due < earliest):
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+    def run_due(self) -> int:
+        """Fire every callback whose deadline has passed, returns how many ran."""
+        now = self._clock()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, _, fn, args = heapq.heappop(self._heap)
+            fired += 1
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"Timer callback {getattr(fn, '__name__', fn)} failed")
+        self.fired += fired
+        return fired
+
+    async def _run(self):
+        while True:
+            self.run_due()
+            self._wake.clear()
+            timeout = self._heap[0][0] - self._clock() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
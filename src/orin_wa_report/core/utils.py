@@ -1,14 +1,16 @@
 import os
 import json
+import asyncio
+import hashlib
 import httpx
 import aiofiles
 from enum import Enum
-from typing import Dict, List
-
-import pandas as pd
+from typing import Dict, List, Optional
 
+from src.orin_wa_report.core.cache import AsyncTTLCache
 from src.orin_wa_report.core.logger import get_logger
-from src.orin_wa_report.core.config import DB_QUERY_ENDPOINT
+from src.orin_wa_report.core.config import DB_QUERY_ENDPOINT, get_config_data
+from src.orin_wa_report.core.models import DBResult, DBStatement, UserIdentityRow
 
 from dotenv import load_dotenv
 
@@ -27,6 +29,174 @@ def get_db_query_endpoint(db_base_url: str = vps_db_base_url, name: str = ""):
         url = url.format(db_base_url=db_base_url)
     return url
 
+
+# Answers of a gateway that doesn't know the {"statements": [...]} form
+BATCH_UNSUPPORTED_STATUS = (404, 405, 422)
+
+
+class DBGateway:
+    """
+    Application-scoped client for the DB query gateway. One pooled
+    httpx.AsyncClient is shared by every caller so queries reuse warm
+    keep-alive connections instead of paying a TCP handshake each time.
+
+    `start()` and `close()` are called from the FastAPI startup/shutdown
+    hooks; a gateway used before `start()` opens its client lazily.
+    """
+    def __init__(
+        self,
+        db_base_url: str = vps_db_base_url,
+        name: str = "",
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        http2: bool = False,
+    ):
+        self.db_base_url = db_base_url
+        self.url = get_db_query_endpoint(db_base_url=db_base_url, name=name)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+        self._batch_support: Dict[str, bool] = {}
+
+    async def start(self):
+        if self._client is not None:
+            return
+        try:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+        except ImportError:
+            # http2=True needs the optional h2 package
+            logger.warning("HTTP/2 requested for the DB gateway but h2 is not installed, using HTTP/1.1")
+            self.http2 = False
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        logger.info(f"DB gateway client started (http2={self.http2}, limits={self.limits})")
+
+    async def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    async def post(self, url: Optional[str] = None, json: Optional[Dict] = None) -> httpx.Response:
+        """POST a raw gateway payload, to `url` or this gateway's default endpoint."""
+        if self._client is None:
+            await self.start()
+        return await self._client.post(url or self.url, json=json)
+
+    async def query(
+        self,
+        query: str,
+        params: Optional[Dict] = None,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> Dict:
+        """Run one statement and return the gateway response ({"rows": [...], ...})."""
+        payload = {"query": query}
+        if params is not None:
+            payload["params"] = params
+        if api_key is not None:
+            payload["api_key"] = api_key
+        response = await self.post(url, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _result(statement: DBStatement, response_sql: Dict) -> DBResult:
+        result = DBResult(**response_sql)
+        if statement.row_model is not None:
+            result.rows = [statement.row_model(**row) for row in result.rows]
+        return result
+
+    async def execute(
+        self,
+        statement: DBStatement,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> DBResult:
+        """Run one statement, rows are parsed into `statement.row_model` when set."""
+        response_sql = await self.query(statement.query, params=statement.params, url=url, api_key=api_key)
+        return self._result(statement, response_sql)
+
+    async def batch(
+        self,
+        statements: List[DBStatement],
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        ordered: bool = False,
+    ) -> List[DBResult]:
+        """
+        Run several statements in one round trip, results come back in order.
+
+        The gateway gets {"statements": [{"query", "params"}, ...]} and
+        answers {"results": [...]}, one per statement. A gateway that rejects
+        the batch form (404/405/422 without results, before any batch went
+        through) is remembered per endpoint and the statements are sent one
+        by one instead, concurrently over the pool, or in sequence when
+        `ordered` (later statements depend on earlier writes). Any other
+        failure is raised and nothing is re-sent, the batch may have been
+        partly applied.
+        """
+        url = url or self.url
+        if self._batch_support.get(url) is not False:
+            payload = {"statements": [statement.model_dump() for statement in statements]}
+            if api_key is not None:
+                payload["api_key"] = api_key
+            response = await self.post(url, json=payload)
+            try:
+                response_json = response.json() if response.is_success else None
+            except ValueError:
+                response_json = None
+            results = response_json.get("results") if isinstance(response_json, dict) else None
+            if isinstance(results, list):
+                if len(results) != len(statements):
+                    raise RuntimeError(
+                        f"DB gateway batch returned {len(results)} results for {len(statements)} statements"
+                    )
+                self._batch_support[url] = True
+                return [self._result(statement, result) for statement, result in zip(statements, results)]
+            if results is not None or self._batch_support.get(url) or response.status_code not in BATCH_UNSUPPORTED_STATUS:
+                response.raise_for_status()
+                raise RuntimeError(f"DB gateway batch response has no results: {response.text}")
+            logger.info(f"DB gateway {url} has no batch support, sending statements separately")
+            self._batch_support[url] = False
+
+        if ordered:
+            return [await self.execute(statement, url=url, api_key=api_key) for statement in statements]
+        return list(await asyncio.gather(*[
+            self.execute(statement, url=url, api_key=api_key) for statement in statements
+        ]))
+
+
+# -----------------------------
+# Module-level singleton
+# -----------------------------
+_DB_GATEWAY: Optional[DBGateway] = None
+
+
+def get_db_gateway() -> DBGateway:
+    global _DB_GATEWAY
+    if _DB_GATEWAY is None:
+        db_gateway_config: Dict = get_config_data().get("db_gateway") or {}
+        _DB_GATEWAY = DBGateway(
+            max_connections=db_gateway_config.get("max_connections", 50),
+            max_keepalive_connections=db_gateway_config.get("max_keepalive_connections", 20),
+            keepalive_expiry=db_gateway_config.get("keepalive_expiry", 60.0),
+            timeout=db_gateway_config.get("timeout", 30.0),
+            connect_timeout=db_gateway_config.get("connect_timeout", 5.0),
+            http2=db_gateway_config.get("http2", False),
+        )
+    return _DB_GATEWAY
+
 async def log_data(file_name, data_dict):
     """
     Appends a dictionary as a single line in a .jsonl file asynchronously.
@@ -40,6 +210,78 @@ async def log_data(file_name, data_dict):
         await f.write(json_line)
         
 
+# -----------------------------
+# API token -> user identity
+# -----------------------------
+_API_TOKEN_CACHE: Optional[AsyncTTLCache] = None
+
+
+def get_api_token_cache() -> AsyncTTLCache:
+    global _API_TOKEN_CACHE
+    if _API_TOKEN_CACHE is None:
+        api_token_cache_config: Dict = get_config_data().get("api_token_cache") or {}
+        _API_TOKEN_CACHE = AsyncTTLCache(
+            max_size=api_token_cache_config.get("max_size", 10000),
+            ttl=api_token_cache_config.get("ttl", 300.0),
+            negative_ttl=api_token_cache_config.get("negative_ttl", 30.0),
+        )
+    return _API_TOKEN_CACHE
+
+
+def hash_api_token(api_token: str) -> str:
+    """Cache key for a token, so raw tokens don't sit in memory as dict keys."""
+    return hashlib.sha256(api_token.encode()).hexdigest()
+
+
+async def resolve_api_token(api_token: str, db_base_url: str = vps_db_base_url) -> Optional[UserIdentityRow]:
+    """
+    The user behind an API token, None when the token is unknown.
+
+    Looks in 'users' first and then 'user_tokens' (one batched round trip),
+    through the API token cache: concurrent lookups of the same token share
+    one query and unknown tokens are remembered for a short while.
+    Gateway errors are raised and not cached.
+    """
+    async def load() -> Optional[UserIdentityRow]:
+        url = get_db_query_endpoint(db_base_url=db_base_url)
+        
+        # users first, then user_tokens (joining users to get parent_id), both in one round trip
+        res_users, res_tokens = await get_db_gateway().batch([
+            DBStatement(
+                query="SELECT id as user_id, parent_id FROM users WHERE api_token = :token AND deleted_at IS NULL LIMIT 1",
+                params={"token": api_token},
+                row_model=UserIdentityRow,
+            ),
+            DBStatement(
+                query="""
+                    SELECT t.user_id, u.parent_id 
+                    FROM user_tokens t
+                    LEFT JOIN users u ON t.user_id = u.id
+                    WHERE t.api_token = :token 
+                    ORDER BY t.created_at DESC LIMIT 1
+                """,
+                params={"token": api_token},
+                row_model=UserIdentityRow,
+            ),
+        ], url=url)
+        data_rows: List[UserIdentityRow] = res_users.rows or res_tokens.rows
+        return data_rows[0] if data_rows else None
+
+    return await get_api_token_cache().get_or_load(hash_api_token(api_token), load)
+
+
+def invalidate_api_token(api_token: str) -> bool:
+    return get_api_token_cache().invalidate(hash_api_token(api_token))
+
+
+def invalidate_api_tokens_of_user(user_id: int) -> int:
+    """Forget every cached token that resolves to `user_id` (or has it as parent)."""
+    user_id = int(user_id)
+    return get_api_token_cache().invalidate_where(
+        lambda key, row: row is not None and user_id in (row.user_id, row.parent_id)
+    )
+
+
 async def get_user_id_from_api_token(
     db_base_url: str,
     api_token: str,
@@ -48,7 +290,8 @@ async def get_user_id_from_api_token(
     """
     Retrieves the user identity associated with a given API token.
 
-    The function checks the 'users' table first, followed by the 'user_tokens' table.
+    The function checks the 'users' table first, followed by the 'user_tokens' table
+    (see `resolve_api_token`, results are cached).
     If 'derive_parent_id' is True, it evaluates if the user is a sub-account. 
     If a valid 'parent_id' exists (not NULL and not 0), it returns the 'parent_id'; 
     otherwise, it returns the primary 'user_id'.
@@ -65,40 +308,14 @@ async def get_user_id_from_api_token(
         RuntimeError: If no user is found or a network error occurs.
     """
     try:
-        url = get_db_query_endpoint(db_base_url=db_base_url)
-        
-        async with httpx.AsyncClient() as client:
-            # 1. Try fetching from the users table (including parent_id)
-            res_users = await client.post(url, json={
-                "query": "SELECT id as user_id, parent_id FROM users WHERE api_token = :token AND deleted_at IS NULL LIMIT 1",
-                "params": {"token": api_token}
-            })
-            data_rows = res_users.json().get("rows", [])
-
-            # 2. If not found in users, try user_tokens table (joining users to get parent_id)
-            if not data_rows:
-                res_tokens = await client.post(url, json={
-                    "query": """
-                        SELECT t.user_id, u.parent_id 
-                        FROM user_tokens t
-                        LEFT JOIN users u ON t.user_id = u.id
-                        WHERE t.api_token = :token 
-                        ORDER BY t.created_at DESC LIMIT 1
-                    """,
-                    "params": {"token": api_token}
-                })
-                data_rows = res_tokens.json().get("rows", [])
+        row = await resolve_api_token(api_token, db_base_url=db_base_url)
                 
-        # Replace the Pandas logic with this:
-        if not data_rows:
+        if row is None:
             logger.error(f"No user_id found for api_token: {api_token}")
             raise RuntimeError("No user_id found from the api_token")
 
-        # data_rows is usually a list of dicts: [{"user_id": 123, "parent_id": 456}]
-        row = data_rows[0]
-
-        user_id = row.get("user_id")
-        parent_id = row.get("parent_id")
+        user_id = row.user_id
+        parent_id = row.parent_id
 
         # Logic: If derive_parent_id is True and parent_id is valid
         if derive_parent_id and parent_id and parent_id != 0:
@@ -112,4 +329,4 @@ async def get_user_id_from_api_token(
 
     except Exception as e:
         logger.error(f"Error when getting user_id from api_token: {str(e)}")
-        raise RuntimeError(f"Error when getting user_id from api_token: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Error when getting user_id from api_token: {str(e)}")